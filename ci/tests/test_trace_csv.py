@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Regression tests of trace_csv.py. data/ holds two small synthetic logs of
+# two kernels each, with the CSV the original trace_csv.py produced for them.
+
+import bz2
+import csv
+import gzip
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import importlib.util
+import lzma
+import unittest
+from unittest import mock
+
+CI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+LOG_TYPES = ["simx", "rtlsim"]
+
+sys.path.insert(0, CI_DIR)
+import trace_csv
+
+def data_file(name):
+    return os.path.join(DATA_DIR, name)
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def read_rows(filename):
+    with open(filename, newline='') as f:
+        return list(csv.reader(f))
+
+def entry_row(entry):
+    return [entry.kernel] + [entry[field] for field in trace_csv.csv_fields]
+
+def csv_column_row(row):
+    # a CSV row with its values as stored in the columnar traces
+    uuid, PC, opcode, instr, core_id, warp_id, tmask, destination, operands = row
+    return [int(uuid), int(PC, 16), opcode, int(instr or "0", 16), int(core_id), int(warp_id),
+            int(tmask[::-1], 2), destination, operands]
+
+def column_rows(columns):
+    rows = []
+    for row in range(len(columns["uuid"])):
+        rows.append([int(columns["uuid"][row]), int(columns["PC"][row]), str(columns["opcode_dict"][columns["opcode"][row]]),
+                     int(columns["instr"][row]), int(columns["core_id"][row]), int(columns["warp_id"][row]),
+                     int(columns["tmask"][row]), trace_csv.column_string(columns, "destination", row),
+                     trace_csv.column_string(columns, "operands", row)])
+    return rows
+
+def run_trace_csv(log_filename, log_type, output, *args, stdin=None):
+    command = [sys.executable, os.path.join(CI_DIR, "trace_csv.py"), "-t", log_type, "-o", output, *args, log_filename]
+    return subprocess.run(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode()
+
+class TraceCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def tmp_file(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def convert(self, log_type, *args, log_filename=None, output="trace.csv", stdin=None):
+        output = self.tmp_file(output)
+        run_trace_csv(log_filename or data_file(log_type + ".log"), log_type, output, *args, stdin=stdin)
+        return output
+
+    def test_default_matches_baseline(self):
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                output = self.convert(log_type)
+                self.assertEqual(read_bytes(output), read_bytes(data_file(log_type + ".csv")))
+
+    def test_field_fallback(self):
+        # records with an unexpected extra field miss the fused regexes and go
+        # through the generic tokenizer, which must extract the same fields
+        for log_type, anchor in (("simx", b"cid="), ("rtlsim", b"wid=")):
+            with self.subTest(log_type=log_type):
+                log_filename = self.tmp_file(log_type + ".log")
+                with open(log_filename, 'wb') as f:
+                    f.write(read_bytes(data_file(log_type + ".log")).replace(anchor, b"extra=1, " + anchor))
+                output = self.convert(log_type, log_filename=log_filename)
+                self.assertEqual(read_bytes(output), read_bytes(data_file(log_type + ".csv")))
+
+    def test_jobs_matches_baseline(self):
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                output = self.convert(log_type, "--jobs", "2")
+                self.assertEqual(read_bytes(output), read_bytes(data_file(log_type + ".csv")))
+
+    def test_jobs_chunk_boundaries(self):
+        # place the chunk boundaries on a record start, on the newline before
+        # it and just past it, so that records and sublogs get split across
+        # chunks in every possible way
+        for log_type in LOG_TYPES:
+            log_filename = data_file(log_type + ".log")
+            trace_csv.configs = trace_csv.load_config(log_filename)
+            expected = [entry_row(entry) for entry in
+                        trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type)]
+            log_data = read_bytes(log_filename)
+            _, start, _ = trace_csv.find_sublogs(log_filename)[0]
+            marker = b"\nDEBUG Fetch:" if log_type == "simx" else b"-decode: "
+            record_start = log_data.rfind(b"\n", 0, log_data.find(marker, log_data.find(marker, start) + 1)) + 1
+            for chunk_size in (record_start - start - 1, record_start - start, record_start - start + 1, 97):
+                with self.subTest(log_type=log_type, chunk_size=chunk_size):
+                    entries = trace_csv.iter_entries_parallel(log_filename, log_type, 2, chunk_size)
+                    self.assertEqual([entry_row(entry) for entry in entries], expected)
+
+    def test_jobs_in_flight(self):
+        # chunks are submitted as the merge goes, and their spill files are
+        # removed once merged
+        class SerialPool:
+            def __init__(self, jobs, initializer, initargs):
+                initializer(*initargs)
+                self.in_flight = 0
+                self.max_in_flight = 0
+                pools.append(self)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                pass
+
+            def apply_async(self, func, args):
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                pool = self
+                class Result:
+                    def get(self):
+                        pool.in_flight -= 1
+                        chunk_filename = func(*args)
+                        chunk_files.append(chunk_filename)
+                        return chunk_filename
+                return Result()
+
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                log_filename = data_file(log_type + ".log")
+                trace_csv.configs = trace_csv.load_config(log_filename)
+                expected = [entry_row(entry) for entry in
+                            trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type)]
+                pools = []
+                chunk_files = []
+                chunk_size = 512
+                with mock.patch.object(trace_csv.multiprocessing, "Pool", SerialPool):
+                    entries = trace_csv.iter_entries_parallel(log_filename, log_type, 2, chunk_size, sort_buffer=4)
+                    self.assertEqual([entry_row(entry) for entry in entries], expected)
+                max_chunks = max((end - start + chunk_size - 1) // chunk_size for _, start, end in trace_csv.find_sublogs(log_filename))
+                self.assertLessEqual(pools[0].max_in_flight, max_chunks + 2)
+                self.assertGreater(len(chunk_files), max_chunks + 2)
+                self.assertFalse([name for name in chunk_files if os.path.exists(name)])
+
+    def test_unmapped_log(self):
+        # logs that cannot be memory-mapped are read through the file object
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                log_filename = data_file(log_type + ".log")
+                trace_csv.configs = trace_csv.load_config(log_filename)
+                expected = [entry_row(entry) for entry in
+                            trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type)]
+                with mock.patch.object(trace_csv, "map_log_file", return_value=None):
+                    self.assertEqual(list(trace_csv.read_log_lines(log_filename)), read_bytes(log_filename).splitlines(True))
+                    entries = trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type)
+                    self.assertEqual([entry_row(entry) for entry in entries], expected)
+
+    def test_log_without_start_marker(self):
+        # without any START marker the whole log is a single kernel 0
+        for log_type in LOG_TYPES:
+            log_filename = self.tmp_file(log_type + ".log")
+            with open(log_filename, 'wb') as f:
+                f.writelines(line for line in read_bytes(data_file(log_type + ".log")).splitlines(True)
+                             if not line.startswith(b"[VXDRV] START"))
+            trace_csv.configs = trace_csv.load_config(log_filename)
+            for jobs in (1, 2):
+                with self.subTest(log_type=log_type, jobs=jobs):
+                    if jobs > 1:
+                        entries = list(trace_csv.iter_entries_parallel(log_filename, log_type, jobs, 1024))
+                    else:
+                        entries = list(trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type))
+                    self.assertEqual({entry.kernel for entry in entries}, {0})
+                    self.assertEqual(len(entries), len(read_rows(data_file(log_type + ".csv"))) - 1)
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_columnar_round_trip(self):
+        formats = ["npz"] + (["parquet"] if importlib.util.find_spec("pyarrow") else [])
+        for log_type in LOG_TYPES:
+            log_filename = data_file(log_type + ".log")
+            trace_csv.configs = trace_csv.load_config(log_filename)
+            kernels = [entry.kernel for entry in trace_csv.iter_entries(trace_csv.split_log_file(log_filename), log_type)]
+            expected = [csv_column_row(row) for row in read_rows(data_file(log_type + ".csv"))[1:]]
+            for output_format in formats:
+                with self.subTest(log_type=log_type, format=output_format):
+                    output = self.convert(log_type, "-f", output_format, output="trace." + output_format)
+                    columns = trace_csv.load_columns(output)
+                    self.assertEqual(column_rows(columns), expected)
+                    self.assertEqual(columns["kernel"].tolist(), kernels)
+                    self.assertEqual(sorted(set(kernels)), [0, 1])
+
+    def test_external_sort(self):
+        # nearly ordered warps with late arrivals, duplicated uuids and a
+        # buffer small enough to spill both the warp runs and the overflow
+        rng = random.Random(1)
+        entries = []
+        for warp in range(6):
+            for counter in range(300):
+                entries.append({'uuid': (warp << 32) | (counter // 2), 'seq': len(entries)})
+        for i in range(len(entries) - 1, 0, -1):
+            j = max(0, i - rng.randrange(100))
+            entries[i], entries[j] = entries[j], entries[i]
+        expected = sorted(entries, key=lambda entry: entry['uuid'])
+        for buffer_size in (4, 50, 1 << 18):
+            with self.subTest(buffer_size=buffer_size):
+                sorter = trace_csv.UuidSorter(window=8, buffer_size=buffer_size)
+                for entry in entries:
+                    sorter.push(entry)
+                self.assertEqual(sorter.spill_file is not None, buffer_size < len(entries))
+                self.assertTrue(sorter.overflow or sorter.overflow_runs)
+                self.assertEqual(list(sorter.drain()), expected)
+                self.assertIsNone(sorter.spill_file)
+
+    def test_external_sort_blocks(self):
+        # many spilled overflow runs are merged reading one small block of
+        # each run at a time
+        rng = random.Random(2)
+        entries = [{'uuid': rng.randrange(1000), 'seq': seq} for seq in range(5000)]
+        expected = sorted(entries, key=lambda entry: entry['uuid'])
+        sorter = trace_csv.UuidSorter(window=8, buffer_size=64, block_size=16)
+        for entry in entries:
+            sorter.push(entry)
+        self.assertGreater(len(sorter.overflow_runs), 50)
+        load = trace_csv.pickle.load
+        loaded = []
+        def load_block(file):
+            block = load(file)
+            loaded.append(len(block))
+            return block
+        with mock.patch.object(trace_csv.pickle, "load", side_effect=load_block):
+            self.assertEqual(list(sorter.drain()), expected)
+        self.assertEqual(max(loaded), 16)
+
+    def test_sort_buffer_matches_baseline(self):
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                output = self.convert(log_type, "--sort-buffer", "2")
+                self.assertEqual(read_bytes(output), read_bytes(data_file(log_type + ".csv")))
+
+    def test_entry_mapping(self):
+        # records are read by csv.DictWriter and the tools as field mappings
+        entry = trace_csv.SimxEntry()
+        entry.uuid = 7
+        self.assertEqual(entry['uuid'], 7)
+        self.assertEqual(entry.get('operands'), "")
+        self.assertIsNone(entry.get('opcode'))
+        with self.assertRaises(KeyError):
+            entry['opcode']
+        self.assertFalse(hasattr(entry, '__dict__'))
+
+    def test_live_conversion(self):
+        # live conversions write entries in completion order
+        for log_type in LOG_TYPES:
+            expected = read_rows(data_file(log_type + ".csv"))
+            for args in (["-"], ["--follow", "--idle-timeout", "0.2", data_file(log_type + ".log")]):
+                with self.subTest(log_type=log_type, args=args[0]):
+                    output = self.tmp_file("live.csv")
+                    with open(data_file(log_type + ".log"), 'rb') as log_file:
+                        run_trace_csv(args[-1], log_type, output, *args[:-1], stdin=log_file)
+                    rows = read_rows(output)
+                    self.assertEqual(rows[0], expected[0])
+                    self.assertEqual(sorted(rows[1:]), sorted(expected[1:]))
+
+    def test_live_orphans(self):
+        # a log cut after its last decode reports the uncommitted instructions
+        # of the last kernel
+        log_data = read_bytes(data_file("rtlsim.log"))
+        cut = log_data.rfind(b"-decode: ")
+        log_filename = self.tmp_file("cut.log")
+        with open(log_filename, 'wb') as f:
+            f.write(log_data[:log_data.find(b"\n", cut) + 1])
+        with open(log_filename, 'rb') as log_file:
+            output = run_trace_csv("-", "rtlsim", self.tmp_file("live.csv"), stdin=log_file)
+        self.assertRegex(output, r"Warning: kernel 1: [1-9]\d* orphaned uuids")
+
+    def test_live_config_wait(self):
+        # lines are held back until the CONFIGS header, or the first record of
+        # a log without one
+        lines = read_bytes(data_file("simx.log")).splitlines(True)
+        trace_csv.configs = None
+        held = []
+        def read_lines(log_lines):
+            for line in log_lines:
+                held.append(line)
+                yield line
+        self.assertEqual(list(trace_csv.wait_config(read_lines(lines), "simx")), lines)
+        self.assertEqual(trace_csv.configs, trace_csv.load_config(data_file("simx.log")))
+        for log_lines, max_held, num_held in ((lines[1:], 1 << 10, 3), (lines[1:2] * 100 + lines[1:], 10, 10)):
+            with self.subTest(num_held=num_held):
+                trace_csv.configs = None
+                held = []
+                log_lines = trace_csv.wait_config(read_lines(log_lines), "simx", max_held)
+                self.assertEqual(len(held), num_held)
+                self.assertIsNone(trace_csv.configs)
+                self.assertEqual(next(log_lines), lines[1])
+        no_config = self.tmp_file("simx.log")
+        with open(no_config, 'wb') as f:
+            f.writelines(lines[1:])
+        with open(no_config, 'rb') as log_file:
+            rows = read_rows(self.convert("simx", log_filename="-", stdin=log_file))
+        self.assertEqual(sorted(rows), sorted(read_rows(data_file("simx.csv"))))
+
+    def test_filters_match_baseline(self):
+        # filtered conversions keep the baseline rows they select
+        filters = [
+            (["--core", "1"], lambda row: row[4] == "1"),
+            (["--warp", "0,2"], lambda row: row[5] in ("0", "2")),
+            (["--pc-range", "0x80000040:0x80000080"], lambda row: 0x80000040 <= int(row[1], 16) <= 0x80000080),
+            (["--uuid-range", ":4294967296"], lambda row: int(row[0]) <= 4294967296),
+            (["--opcode", "lw,FADD.S"], lambda row: row[2] in ("LW", "FADD.S")),
+            (["--core", "0", "--warp", "1", "--opcode", "ADD,LW"], lambda row: row[4:6] == ["0", "1"] and row[2] in ("ADD", "LW")),
+        ]
+        for log_type in LOG_TYPES:
+            header, *rows = read_rows(data_file(log_type + ".csv"))
+            for args, selected in filters:
+                expected = [header] + [row for row in rows if selected(row)]
+                self.assertGreater(len(expected), 1)
+                for jobs in ("1", "2"):
+                    with self.subTest(log_type=log_type, filter=args, jobs=jobs):
+                        self.assertEqual(read_rows(self.convert(log_type, "--jobs", jobs, *args)), expected)
+
+    def test_compressed_logs(self):
+        for log_type in LOG_TYPES:
+            log_data = read_bytes(data_file(log_type + ".log"))
+            expected = read_bytes(data_file(log_type + ".csv"))
+            for module in (gzip, lzma, bz2):
+                log_filename = self.tmp_file(log_type + ".log." + module.__name__)
+                with open(log_filename, 'wb') as f:
+                    f.write(module.compress(log_data))
+                with self.subTest(log_type=log_type, compression=module.__name__):
+                    self.assertEqual(read_bytes(self.convert(log_type, log_filename=log_filename)), expected)
+                    # byte ranges cannot be split, --jobs falls back to a serial conversion
+                    output = run_trace_csv(log_filename, log_type, self.tmp_file("jobs.csv"), "--jobs", "2")
+                    self.assertIn("Warning: --jobs is ignored for compressed logs", output)
+                    self.assertEqual(read_bytes(self.tmp_file("jobs.csv")), expected)
+                    with open(log_filename, 'rb') as log_file:
+                        rows = read_rows(self.convert(log_type, log_filename="-", stdin=log_file))
+                    self.assertEqual(sorted(rows), sorted(read_rows(data_file(log_type + ".csv"))))
+
+    def test_compressed_pipe(self):
+        # pipes may deliver the magic bytes of a compressed log one at a time
+        class TrickleStream(io.RawIOBase):
+            def __init__(self, data):
+                self.data = data
+
+            def readable(self):
+                return True
+
+            def readinto(self, buffer):
+                data, self.data = self.data[:1], self.data[1:]
+                buffer[:len(data)] = data
+                return len(data)
+
+        log_data = read_bytes(data_file("simx.log"))
+        for module in (None, gzip, lzma, bz2):
+            with self.subTest(compression=module and module.__name__):
+                data = module.compress(log_data) if module else log_data
+                stream = io.BufferedReader(TrickleStream(data))
+                self.assertLess(len(stream.peek(6)), 6)
+                compression, stream = trace_csv.log_compression(stream)
+                self.assertEqual(compression, module and module.__name__)
+                if compression is not None:
+                    stream = trace_csv.open_compressed(stream, compression)
+                self.assertEqual(stream.read(), log_data)
+
+        command = [sys.executable, os.path.join(CI_DIR, "trace_csv.py"), "-t", "simx", "-o", self.tmp_file("pipe.csv"), "-"]
+        compressed = gzip.compress(log_data)
+        with subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL) as process:
+            process.stdin.write(compressed[:1])
+            process.stdin.flush()
+            time.sleep(0.2)
+            process.stdin.write(compressed[1:])
+            process.stdin.close()
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(sorted(read_rows(self.tmp_file("pipe.csv"))), sorted(read_rows(data_file("simx.csv"))))
+
+    def test_stream_keeps_entries(self):
+        # streaming only changes the order, to completion order within each kernel
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                rows = read_rows(self.convert(log_type, "--stream"))
+                expected = read_rows(data_file(log_type + ".csv"))
+                self.assertEqual(rows[0], expected[0])
+                self.assertEqual(sorted(rows[1:]), sorted(expected[1:]))
+
+    def test_stream_prelude(self):
+        # instructions before the first START marker are dropped in both modes
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                lines = read_bytes(data_file(log_type + ".log")).splitlines(True)
+                last_start = max(i for i, line in enumerate(lines) if line.startswith(b"[VXDRV] START"))
+                log_filename = self.tmp_file(log_type + ".log")
+                with open(log_filename, 'wb') as f:
+                    f.writelines(lines[:2] + lines[last_start + 1:] + lines[2:])
+                expected = read_rows(self.convert(log_type, log_filename=log_filename))
+                self.assertEqual(expected, read_rows(data_file(log_type + ".csv")))
+                rows = read_rows(self.convert(log_type, "--stream", log_filename=log_filename, output="stream.csv"))
+                self.assertEqual(rows[0], expected[0])
+                self.assertEqual(sorted(rows[1:]), sorted(expected[1:]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Regression tests of the trace analysis tools, run on the logs of data/.
+
+import csv
+import importlib.util
+import io
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+LOG_TYPES = ["simx", "rtlsim"]
+
+def data_file(name):
+    return os.path.join(DATA_DIR, name)
+
+sys.path.insert(0, CI_DIR)
+import trace_csv
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def read_rows(filename):
+    with open(filename, newline='') as f:
+        return list(csv.reader(f))
+
+def run_tool(script, *args):
+    # (exit code, output) of a ci/ script
+    command = [sys.executable, os.path.join(CI_DIR, script), *args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return result.returncode, result.stdout.decode()
+
+class TraceToolsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def tmp_file(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_diff_identical_logs(self):
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                log_filename = data_file(log_type + ".log")
+                returncode, output = run_tool("trace_diff.py", "-a", log_type, "-b", log_type, log_filename, log_filename)
+                self.assertEqual(returncode, 0, output)
+                self.assertEqual(output, "0 diverging instructions (80 compared)\n")
+
+    def test_diff_reports_divergence(self):
+        # change the opcode of the first instruction and drop the second one
+        lines = read_bytes(data_file("simx.log")).splitlines(True)
+        self.assertTrue(lines[4].startswith(b"DEBUG Instr") and lines[7].startswith(b"DEBUG Fetch"))
+        lines[4] = lines[4].replace(b": LW ", b": SW ")
+        del lines[7:11]
+        log_filename = self.tmp_file("simx.log")
+        with open(log_filename, 'wb') as f:
+            f.writelines(lines)
+        returncode, output = run_tool("trace_diff.py", "-a", "simx", "-b", "simx", "-n", "0", data_file("simx.log"), log_filename)
+        self.assertEqual(returncode, 1)
+        self.assertEqual(output.splitlines(), [
+            "sublog 0: mismatch: uuid=21474836480, core=1, warp=1, PC=0x800000c8, opcode=LW",
+            "  opcode: A=LW B=SW",
+            "sublog 0: only in A: uuid=30064771072, core=1, warp=3, PC=0x80000020, opcode=VX_TMC",
+            "2 diverging instructions (80 compared)",
+        ])
+        returncode, output = run_tool("trace_diff.py", "-a", "simx", "-b", "simx", "-i", "opcode", data_file("simx.log"), log_filename)
+        self.assertEqual(returncode, 1)
+        self.assertNotIn("mismatch", output)
+
+    def test_index_queries(self):
+        # each query returns the records of the full conversion it selects
+        for log_type in LOG_TYPES:
+            index_filename = self.tmp_file(log_type + ".tidx")
+            log_filename = data_file(log_type + ".log")
+            returncode, output = run_tool("trace_index.py", "build", "-t", log_type, "-x", index_filename, log_filename)
+            self.assertEqual(returncode, 0, output)
+            self.assertEqual(output, "indexed 80 records in {}\n".format(index_filename))
+            # fixed-width layout: 40 bytes of columns and 3 uint32 orders per record
+            index_data = read_bytes(index_filename)
+            magic, type_id, log_size, _, num_records = struct.unpack_from("<8sB7xQQQ", index_data)
+            self.assertEqual((magic, type_id, log_size, num_records), (b"VXTRIDX2", LOG_TYPES.index(log_type), os.path.getsize(log_filename), 80))
+            self.assertEqual(len(index_data), 40 + 80 * (40 + 3 * 4))
+            header, *rows = read_rows(data_file(log_type + ".csv"))
+            uuid, PC = rows[5][0], rows[5][1]
+            queries = [
+                (["--uuid", uuid], lambda row: row[0] == uuid),
+                (["--pc", PC], lambda row: row[1] == PC),
+                (["--core", "1"], lambda row: row[4] == "1"),
+                (["--core", "1", "--warp", "2"], lambda row: row[4:6] == ["1", "2"]),
+                ([], lambda row: True),
+            ]
+            for query, selected in queries:
+                with self.subTest(log_type=log_type, query=query):
+                    returncode, output = run_tool("trace_index.py", "query", "-t", log_type, "-x", index_filename, *query, log_filename)
+                    self.assertEqual(returncode, 0, output)
+                    expected = [header] + [row for row in rows if selected(row)]
+                    self.assertGreater(len(expected), 1)
+                    self.assertEqual(list(csv.reader(io.StringIO(output, newline=''))), expected)
+
+    def test_index_stale(self):
+        log_filename = self.tmp_file("simx.log")
+        shutil.copy(data_file("simx.log"), log_filename)
+        returncode, output = run_tool("trace_index.py", "build", log_filename)
+        self.assertEqual(returncode, 0, output)
+        with open(log_filename, 'ab') as f:
+            f.write(b"more\n")
+        returncode, output = run_tool("trace_index.py", "query", "--core", "0", log_filename)
+        self.assertEqual(returncode, 1)
+        self.assertEqual(output, "Error: stale index {}.tidx, rebuild it\n".format(log_filename))
+        returncode, output = run_tool("trace_index.py", "query", "-t", "rtlsim", "--core", "0", log_filename)
+        self.assertEqual(returncode, 1)
+
+    def test_index_overflow(self):
+        # a field too wide for its column fails the build, no index is written
+        log_data = read_bytes(data_file("simx.log"))
+        log_filename = self.tmp_file("simx.log")
+        with open(log_filename, 'wb') as f:
+            f.write(log_data.replace(b"cid=1, ", b"cid=70000, ", 1))
+        returncode, output = run_tool("trace_index.py", "build", log_filename)
+        self.assertEqual(returncode, 1)
+        offset = log_data.find(b"DEBUG Fetch: cid=1, ")
+        self.assertEqual(output, "Error: core_id 70000 of the record at offset {} does not fit the index\n".format(offset))
+        self.assertFalse(os.path.exists(log_filename + ".tidx"))
+
+    def columnar_traces(self, log_type):
+        # the log itself and its npz/parquet conversions
+        traces = [data_file(log_type + ".log")]
+        for output_format in ["npz", "parquet"] if importlib.util.find_spec("pyarrow") else ["npz"]:
+            trace = self.tmp_file("{}.{}".format(log_type, output_format))
+            returncode, output = run_tool("trace_csv.py", "-t", log_type, "-f", output_format, "-o", trace, traces[0])
+            self.assertEqual(returncode, 0, output)
+            traces.append(trace)
+        return traces
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_profile_formats(self):
+        # the reports of a log and of its columnar conversions are the same
+        for script in ["trace_profile.py", "trace_divergence.py"]:
+            for log_type in LOG_TYPES:
+                log_filename, *traces = self.columnar_traces(log_type)
+                returncode, expected = run_tool(script, "-t", log_type, "--threads", "4", "-n", "0", log_filename)
+                self.assertEqual(returncode, 0, expected)
+                for trace in traces:
+                    with self.subTest(script=script, log_type=log_type, trace=os.path.basename(trace)):
+                        self.assertEqual(run_tool(script, "--threads", "4", "-n", "0", trace), (0, expected))
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_profile_kernels(self):
+        # kernels follow the START markers, even when uuids keep rising across them
+        log_data = read_bytes(data_file("simx.log"))
+        second = log_data.find(b"[VXDRV] START: kernel 1")
+        log_data = log_data[:second] + re.sub(rb"\(#(\d+)\)", lambda m: b"(#%d)" % (int(m.group(1)) + 1000), log_data[second:])
+        log_filename = self.tmp_file("simx.log")
+        with open(log_filename, 'wb') as f:
+            f.write(log_data)
+        returncode, output = run_tool("trace_profile.py", log_filename)
+        self.assertEqual(returncode, 0, output)
+        self.assertIn("kernels: 2\n", output)
+        self.assertRegex(output, r"\n +0 +40 .*\n +1 +40 ")
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_divergence_transitions(self):
+        # tmask changes are only compared within a warp of the same kernel
+        import numpy as np
+        import trace_divergence
+        warp = 5 << 32
+        columns = {
+            "uuid": np.array([warp, warp + 1, warp + 2, warp + 3, warp, warp + 1], dtype=np.uint64),
+            "tmask": np.array([0b1111, 0b0011, 0b1100, 0b1111, 0b0001, 0b0001], dtype=np.uint64),
+            "kernel": np.array([0, 0, 0, 0, 1, 1], dtype=np.uint32),
+        }
+        same_warp, diverge, reconverge = trace_divergence.warp_transitions(columns)
+        self.assertEqual(same_warp.tolist(), [False, True, True, True, False, True])
+        self.assertEqual(diverge.tolist(), [False, True, True, False, False, False])
+        self.assertEqual(reconverge.tolist(), [False, False, False, True, False, False])
+
+    def test_bench_baseline(self):
+        # the vendored original parsers yield the entries of the new ones
+        import trace_csv_bench
+        for log_type in LOG_TYPES:
+            with self.subTest(log_type=log_type):
+                log_filename = data_file(log_type + ".log")
+                trace_csv.configs = trace_csv.load_config(log_filename)
+                lines = read_bytes(log_filename).splitlines(True)
+                if log_type == "rtlsim":
+                    legacy = trace_csv_bench.legacy_parse_rtlsim([line.decode() for line in lines], trace_csv.configs)
+                else:
+                    legacy = trace_csv_bench.legacy_parse_simx([line.decode() for line in lines])
+                entries = trace_csv.parse_log(lines, log_type)
+                self.assertEqual([[entry.get(field, "") for field in trace_csv.csv_fields] for entry in legacy],
+                                 [[entry[field] for field in trace_csv.csv_fields] for entry in entries])
+                returncode, output = run_tool("trace_csv_bench.py", "-t", log_type, "-r", "1", log_filename)
+                self.assertEqual(returncode, 0, output)
+                self.assertRegex(output, r"parse_{}: \d+ lines/sec \(\d+\.\d+x\)".format(log_type))
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_latency_timings(self):
+        # stage timestamps match the decode, issue and last commit lines of
+        # each instruction, uuids restart with every kernel
+        import trace_latency
+        log_filename = data_file("rtlsim.log")
+        expected = {}
+        kernel = 0
+        for line in read_bytes(log_filename).decode().splitlines():
+            kernel += line.startswith("[VXDRV] START")
+            line_match = re.match(r" *(\d+): cluster\d+-socket\d+-core\d+-(decode|issue|commit)\d*: .*\(#(\d+)\)$", line)
+            if line_match:
+                time, stage, uuid = line_match.groups()
+                expected.setdefault((kernel, int(uuid)), {})[stage] = int(time)
+        trace_csv.configs = trace_csv.load_config(log_filename)
+        timings = trace_latency.load_timings(log_filename)
+        self.assertEqual(len(timings["opcode"]), len(expected))
+        stage_times = sorted(zip(timings["decode_time"].tolist(), timings["issue_time"].tolist(), timings["commit_time"].tolist()))
+        self.assertEqual(stage_times, sorted((times["decode"], times["issue"], times["commit"]) for times in expected.values()))
+        returncode, output = run_tool("trace_latency.py", log_filename)
+        self.assertEqual(returncode, 0, output)
+        self.assertTrue(output.startswith("instructions: 80\n"))
+        # kernels are numbered like the kernel column of the conversions
+        self.assertEqual(sorted(set(timings["kernel"].tolist())), [0, 1])
+        self.assertEqual(re.findall(r"Commit IPC \((kernel \d+), 1000 cycle windows\):", output), ["kernel 0", "kernel 1"])
+
+if __name__ == "__main__":
+    unittest.main()
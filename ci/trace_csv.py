@@ -14,77 +14,249 @@
 # limitations under the License.
 
 import sys
+import os
+import time
 import argparse
 import csv
+import io
 import re
-import inspect
+import itertools
+import heapq
+import collections
+import multiprocessing
+import mmap
+import array
+import importlib
+import pickle
+import tempfile
 
 configs = None
+trace_filter = None
+
+csv_fields = ["uuid", "PC", "opcode", "instr", "core_id", "warp_id", "tmask", "destination", "operands"]
+
+# columnar trace layout: integer columns with their array typecode, opcodes are
+# dictionary-encoded and strings are kept as utf-8 data with row offsets.
+# kernel is the index of the "[VXDRV] START" sublog of each instruction.
+int_columns = [("uuid", "Q"), ("PC", "Q"), ("instr", "I"), ("core_id", "I"), ("warp_id", "I"), ("tmask", "Q"), ("kernel", "I")]
+string_columns = ["destination", "operands"]
+
+def int_list(value):
+    return [int(item, 0) for item in value.split(',')]
+
+def int_range(value):
+    # "START:END" with either bound optional, e.g. "0x80000000:0x80001000"
+    start, sep, end = value.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError("expected START:END")
+    return (int(start, 0) if start else 0, int(end, 0) if end else (1 << 64) - 1)
 
 def parse_args():
     parser = argparse.ArgumentParser(description='CPU trace log to CSV format converter.')
     parser.add_argument('-t', '--type', default='simx', help='log type (rtlsim or simx)')
-    parser.add_argument('-o', '--csv', default='trace.csv', help='Output CSV file')
-    parser.add_argument('log', help='Input log file')
+    parser.add_argument('-o', '--csv', default='trace.csv', help='Output file')
+    parser.add_argument('-f', '--format', default='csv', choices=['csv', 'npz', 'parquet'], help='Output format')
+    parser.add_argument('-s', '--stream', action='store_true', help='Stream entries in completion order instead of sorting each sublog by uuid (memory bounded by in-flight instructions)')
+    parser.add_argument('--sort-buffer', type=int, default=1 << 18, help='Number of entries sorted in memory before spilling sorted runs to disk')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of parallel parsing processes')
+    parser.add_argument('-F', '--follow', action='store_true', help='Follow a log that is still being written, writing entries as they complete')
+    parser.add_argument('--idle-timeout', type=float, default=30, help='Seconds without log growth before --follow stops')
+    parser.add_argument('--max-pending', type=int, default=1 << 16, help='Maximum number of in-flight rtlsim instructions kept when following a log')
+    parser.add_argument('--core', type=int_list, help='Only keep instructions of these cores (comma-separated)')
+    parser.add_argument('--warp', type=int_list, help='Only keep instructions of these warps (comma-separated)')
+    parser.add_argument('--pc-range', type=int_range, help='Only keep instructions with a PC within START:END (inclusive)')
+    parser.add_argument('--uuid-range', type=int_range, help='Only keep instructions with a uuid within START:END (inclusive)')
+    parser.add_argument('--opcode', type=lambda x: x.upper().split(','), help='Only keep these opcodes (comma-separated)')
+    parser.add_argument('log', help='Input log file ("-" to convert a log piped to stdin as it is written)')
     return parser.parse_args()
 
+config_re = re.compile(r"CONFIGS: num_threads=(\d+), num_warps=(\d+), num_cores=(\d+), num_clusters=(\d+), socket_size=(\d+), local_mem_base=0x([0-9a-fA-F]+), num_barriers=(\d+)")
+
+def match_config(line):
+    config_match = config_re.search(line)
+    if config_match:
+        config = {
+            'num_threads': int(config_match.group(1)),
+            'num_warps': int(config_match.group(2)),
+            'num_cores': int(config_match.group(3)),
+            'num_clusters': int(config_match.group(4)),
+            'socket_size': int(config_match.group(5)),
+            'local_mem_base': int(config_match.group(6), 16),
+            'num_barriers': int(config_match.group(7)),
+        }
+        return config
+    return None
+
 def load_config(filename):
-    config_pattern = r"CONFIGS: num_threads=(\d+), num_warps=(\d+), num_cores=(\d+), num_clusters=(\d+), socket_size=(\d+), local_mem_base=0x([0-9a-fA-F]+), num_barriers=(\d+)"
-    with open(filename, 'r') as file:
-        for line in file:
-            config_match = re.search(config_pattern, line)
-            if config_match:
-                config = {
-                    'num_threads': int(config_match.group(1)),
-                    'num_warps': int(config_match.group(2)),
-                    'num_cores': int(config_match.group(3)),
-                    'num_clusters': int(config_match.group(4)),
-                    'socket_size': int(config_match.group(5)),
-                    'local_mem_base': int(config_match.group(6), 16),
-                    'num_barriers': int(config_match.group(7)),
-                }
+    for line in read_log_lines(filename):
+        if b"CONFIGS:" in line:
+            config = match_config(line.decode(errors='replace'))
+            if config:
                 return config
     print("Error: missing CONFIGS: header")
     sys.exit(1)
 
+# precompiled single-pass field extraction: each trace record kind has a fused
+# regex matching all its "key=value" fields at once, lines whose layout differ
+# fall back to a generic tokenizer. Array values keep their braces.
+# Log lines are matched as raw bytes, only the fields written out get decoded.
+hex_value = rb"0x[0-9a-fA-F]+"
+array_value = rb"\{[^}]*\}"
+uuid_suffix = rb"[^(]*\(#(?P<uuid>\d+)\)"
+field_re = re.compile(rb"(\w+)=(\{[^}]*\}|[^,\s]*)")
+uuid_re = re.compile(rb"\(#(\d+)\)")
+rtlsim_line_re = re.compile(rb"(?P<time>\d+): cluster(?P<cluster>\d+)-socket(?P<socket>\d+)-core(?P<core>\d+)-(?P<stage>decode|issue|commit)\d*: ")
+rtlsim_fields_re = {
+    b"decode": re.compile(rb"wid=(?P<wid>\d+), PC=(?P<PC>" + hex_value + rb"), instr=(?P<instr>" + hex_value + rb"), ex=[^,]*, op=(?P<op>[^,]*), "
+                         rb"tmask=(?P<tmask>\d+), wb=(?P<wb>\d+), rd=(?P<rd>\d+), rs1=(?P<rs1>\d+), rs2=(?P<rs2>\d+), rs3=(?P<rs3>\d+), opds=(?P<opds>\d+)" + uuid_suffix),
+    b"issue":  re.compile(rb"wid=(?P<wid>\d+), PC=(?P<PC>" + hex_value + rb"), ex=[^,]*, op=[^,]*, tmask=(?P<tmask>\d+), wb=\d+, rd=\d+, "
+                         rb"rs1_data=(?P<rs1_data>" + array_value + rb"), rs2_data=(?P<rs2_data>" + array_value + rb"), rs3_data=(?P<rs3_data>" + array_value + rb")" + uuid_suffix),
+    b"commit": re.compile(rb"wid=(?P<wid>\d+), PC=(?P<PC>" + hex_value + rb"), ex=[^,]*, tmask=(?P<tmask>\d+), wb=(?P<wb>\d+), rd=\d+, "
+                         rb"sop=\d+, eop=(?P<eop>\d+), data=(?P<data>" + array_value + rb")" + uuid_suffix),
+}
+simx_fetch_re = re.compile(rb"cid=(?P<cid>\d+), wid=(?P<wid>\d+), tmask=(?P<tmask>\d+), PC=(?P<PC>" + hex_value + rb")" + uuid_suffix)
+simx_instr_re = re.compile(rb"DEBUG Instr (0x[0-9a-fA-F]+): ([0-9a-zA-Z_\.]+)")
+simx_reg_re = re.compile(rb"Reg: (.+)")
+
+def parse_fields(line, pos, fused_re):
+    fields = fused_re.match(line, pos)
+    if fields:
+        return fields
+    fields = {key.decode(): value for key, value in field_re.findall(line, pos)}
+    fields["uuid"] = uuid_re.search(line, pos).group(1)
+    return fields
+
+class TraceFilter:
+    # instruction selection, checked by the parsers as soon as each field is
+    # read so that dropped records skip the remaining field extraction
+    __slots__ = ("cores", "warps", "pc_range", "uuid_range", "opcodes")
+
+    def __init__(self, cores=None, warps=None, pc_range=None, uuid_range=None, opcodes=None):
+        self.cores = None if cores is None else frozenset(cores)
+        self.warps = None if warps is None else frozenset(warps)
+        self.pc_range = pc_range
+        self.uuid_range = uuid_range
+        self.opcodes = None if opcodes is None else frozenset(opcodes)
+
+    def match_core(self, core_id):
+        return self.cores is None or core_id in self.cores
+
+    def match_header(self, warp_id, PC, uuid):
+        if self.warps is not None and warp_id not in self.warps:
+            return False
+        if self.uuid_range is not None and not (self.uuid_range[0] <= uuid <= self.uuid_range[1]):
+            return False
+        if self.pc_range is not None and not (self.pc_range[0] <= int(PC, 16) <= self.pc_range[1]):
+            return False
+        return True
+
+    def match_opcode(self, opcode):
+        return self.opcodes is None or opcode in self.opcodes
+
+class TraceEntry:
+    # compact instruction record, readable as a mapping of its CSV fields
+    __slots__ = ("uuid", "PC", "opcode", "instr", "core_id", "warp_id", "tmask", "lineno", "kernel")
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+class SimxEntry(TraceEntry):
+    __slots__ = ("destination", "operands")
+
+    def __init__(self):
+        self.destination = ""
+        self.operands = ""
+
+class RtlsimEntry(TraceEntry):
+    # register ids are None for unused source operands, and register lanes are
+    # integer arrays formatted into destination/operands strings on access.
+    # The *_time fields keep the simulation timestamps of the pipeline stages.
+    __slots__ = ("rd", "rs1", "rs2", "rs3", "rs1_data", "rs2_data", "rs3_data", "rd_data", "wb", "issued",
+                 "decode_time", "issue_time", "commit_time")
+
+    def __init__(self):
+        self.rd_data = None
+        self.wb = False
+        self.issued = False
+
+    @property
+    def destination(self):
+        if not self.wb:
+            return ''
+        destination, sep = append_value('', self.rd, self.rd_data, bin_to_array(self.tmask), False)
+        return destination
+
+    @property
+    def operands(self):
+        tmask_arr = bin_to_array(self.tmask)
+        operands = ''
+        sep = False
+        if self.rs1 is not None:
+            operands, sep = append_value(operands, self.rs1, self.rs1_data, tmask_arr, sep)
+        if self.rs2 is not None:
+            operands, sep = append_value(operands, self.rs2, self.rs2_data, tmask_arr, sep)
+        if self.rs3 is not None:
+            operands, sep = append_value(operands, self.rs3, self.rs3_data, tmask_arr, sep)
+        return operands
+
+def parse_lanes(value):
+    # lane values of an array field, lane 0 first; lanes that are not plain
+    # hex numbers (e.g. undefined 'x' values) keep their text
+    lanes = value[1:-1].split(b', ')
+    lanes.reverse()
+    try:
+        return array.array('Q', [int(lane, 16) for lane in lanes])
+    except ValueError:
+        return [lane.decode() for lane in lanes]
+
+def lane_strings(lanes):
+    return [lane if isinstance(lane, str) else hex(lane) for lane in lanes]
+
 def parse_simx(log_lines):
-    pc_pattern = r"PC=(0x[0-9a-fA-F]+)"
-    instr_pattern = r"Instr (0x[0-9a-fA-F]+):"
-    opcode_pattern = r"Instr 0x[0-9a-fA-F]+: ([0-9a-zA-Z_\.]+)"
-    core_id_pattern = r"cid=(\d+)"
-    warp_id_pattern = r"wid=(\d+)"
-    tmask_pattern = r"tmask=(\d+)"
-    operands_pattern = r"Src\d+ Reg: (.+)"
-    destination_pattern = r"Dest Reg: (.+)"
-    uuid_pattern = r"#(\d+)"
-    entries = []
+    filters = trace_filter
     instr_data = None
     for lineno, line in enumerate(log_lines, start=1):
         try:
-            if line.startswith("DEBUG Fetch:"):
+            if line.startswith(b"DEBUG Fetch:"):
                 if instr_data:
-                    entries.append(instr_data)
-                instr_data = {}
-                instr_data["lineno"] = lineno
-                instr_data["PC"] = re.search(pc_pattern, line).group(1)
-                instr_data["core_id"] = int(re.search(core_id_pattern, line).group(1))
-                instr_data["warp_id"] = int(re.search(warp_id_pattern, line).group(1))
-                instr_data["tmask"] = re.search(tmask_pattern, line).group(1)
-                instr_data["uuid"] = int(re.search(uuid_pattern, line).group(1))
-            elif line.startswith("DEBUG Instr"):
-                instr_data["instr"] = re.search(instr_pattern, line).group(1)
-                instr_data["opcode"] = re.search(opcode_pattern, line).group(1)
-            elif line.startswith("DEBUG Src"):
-                src_reg = re.search(operands_pattern, line).group(1)
-                instr_data["operands"] = (instr_data["operands"] + ', ' + src_reg) if 'operands' in instr_data else src_reg
-            elif line.startswith("DEBUG Dest"):
-                instr_data["destination"] = re.search(destination_pattern, line).group(1)
+                    yield instr_data
+                instr_data = None
+                fields = parse_fields(line, 13, simx_fetch_re)
+                if filters is not None and not (filters.match_core(int(fields["cid"]))
+                                                and filters.match_header(int(fields["wid"]), fields["PC"], int(fields["uuid"]))):
+                    continue
+                instr_data = SimxEntry()
+                instr_data.lineno = lineno
+                instr_data.PC = fields["PC"].decode()
+                instr_data.core_id = int(fields["cid"])
+                instr_data.warp_id = int(fields["wid"])
+                instr_data.tmask = fields["tmask"].decode()
+                instr_data.uuid = int(fields["uuid"])
+            elif instr_data is None:
+                # lines of a filtered out record
+                continue
+            elif line.startswith(b"DEBUG Instr"):
+                instr_match = simx_instr_re.match(line)
+                instr_data.instr = instr_match.group(1).decode()
+                instr_data.opcode = instr_match.group(2).decode()
+                if filters is not None and not filters.match_opcode(instr_data.opcode):
+                    instr_data = None
+            elif line.startswith(b"DEBUG Src"):
+                src_reg = simx_reg_re.search(line, 10).group(1).decode()
+                instr_data.operands = (instr_data.operands + ', ' + src_reg) if instr_data.operands else src_reg
+            elif line.startswith(b"DEBUG Dest"):
+                instr_data.destination = simx_reg_re.search(line, 10).group(1).decode()
         except Exception as e:
             print("Error at line {}: {}".format(lineno, e))
             instr_data = None
     if instr_data:
-        entries.append(instr_data)
-    return entries
+        yield instr_data
 
 def reverse_binary(bin_str):
     return bin_str[::-1]
@@ -99,7 +271,7 @@ def append_reg(text, value, sep):
     if (ivalue >= 32):
         text += "f" + str(ivalue % 32)
     else:
-        text += "x" + value
+        text += "x" + str(ivalue)
     sep = True
     return text, sep
 
@@ -110,182 +282,723 @@ def append_value(text, reg, value, tmask_arr, sep):
         if i != 0:
             text += ", "
         if tmask_arr[i]:
-            text += value[i]
+            text += value[i] if isinstance(value[i], str) else hex(value[i])
         else:
             text +="-"
     text += "}"
     return text, sep
 
-def parse_rtlsim(log_lines):
+def parse_rtlsim(log_lines, instr_data=None):
     global configs
-    line_pattern = r"\d+: cluster(\d+)-socket(\d+)-core(\d+)-(decode|issue|commit)"
-    pc_pattern = r"PC=(0x[0-9a-fA-F]+)"
-    instr_pattern = r"instr=(0x[0-9a-fA-F]+)"
-    ex_pattern = r"ex=([a-zA-Z]+)"
-    op_pattern = r"op=([\?0-9a-zA-Z_\.]+)"
-    warp_id_pattern = r"wid=(\d+)"
-    tmask_pattern = r"tmask=(\d+)"
-    wb_pattern = r"wb=(\d)"
-    opds_pattern = r"opds=(\d+)"
-    rd_pattern = r"rd=(\d+)"
-    rs1_pattern = r"rs1=(\d+)"
-    rs2_pattern = r"rs2=(\d+)"
-    rs3_pattern = r"rs3=(\d+)"
-    rs1_data_pattern = r"rs1_data=\{(.+?)\}"
-    rs2_data_pattern = r"rs2_data=\{(.+?)\}"
-    rs3_data_pattern = r"rs3_data=\{(.+?)\}"
-    rd_data_pattern = r"data=\{(.+?)\}"
-    eop_pattern = r"eop=(\d)"
-    uuid_pattern = r"#(\d+)"
-    entries = []
-    instr_data = {}
+    if instr_data is None:
+        instr_data = {}
+    filters = trace_filter
     num_cores = configs['num_cores']
     socket_size = configs['socket_size']
     num_sockets = (num_cores + socket_size - 1) // socket_size
     for lineno, line in enumerate(log_lines, start=1):
         try:
-            line_match = re.search(line_pattern, line)
+            line_match = rtlsim_line_re.search(line)
             if line_match:
-                PC = re.search(pc_pattern, line).group(1)
-                warp_id = int(re.search(warp_id_pattern, line).group(1))
-                tmask = re.search(tmask_pattern, line).group(1)
-                uuid = int(re.search(uuid_pattern, line).group(1))
-                cluster_id = int(line_match.group(1))
-                socket_id = int(line_match.group(2))
-                core_id = int(line_match.group(3))
-                stage = line_match.group(4)
-                if stage == "decode":
-                    trace = {}
-                    trace["uuid"] = uuid
-                    trace["PC"] = PC
-                    trace["core_id"] = ((((cluster_id * num_sockets) + socket_id) * socket_size) + core_id)
-                    trace["warp_id"] = warp_id
-                    trace["tmask"] = reverse_binary(tmask)
-                    trace["instr"] = re.search(instr_pattern, line).group(1)
-                    trace["opcode"] = re.search(op_pattern, line).group(1)
-                    trace["opds"] = bin_to_array(re.search(opds_pattern, line).group(1))
-                    trace["rd"] = re.search(rd_pattern, line).group(1)
-                    trace["rs1"] = re.search(rs1_pattern, line).group(1)
-                    trace["rs2"] = re.search(rs2_pattern, line).group(1)
-                    trace["rs3"] = re.search(rs3_pattern, line).group(1)
+                stage = line_match.group("stage")
+                cluster_id = int(line_match.group("cluster"))
+                socket_id = int(line_match.group("socket"))
+                core_id = ((((cluster_id * num_sockets) + socket_id) * socket_size) + int(line_match.group("core")))
+                if filters is not None:
+                    # drop other cores from the line prefix, and the issue/commit
+                    # lines of filtered out instructions from their uuid suffix
+                    if not filters.match_core(core_id):
+                        continue
+                    if stage != b"decode" and int(uuid_re.search(line, line_match.end()).group(1)) not in instr_data:
+                        continue
+                fields = parse_fields(line, line_match.end(), rtlsim_fields_re[stage])
+                PC = fields["PC"]
+                warp_id = int(fields["wid"])
+                tmask = fields["tmask"].decode()
+                uuid = int(fields["uuid"])
+                if stage == b"decode":
+                    if filters is not None and not (filters.match_header(warp_id, PC, uuid)
+                                                    and filters.match_opcode(fields["op"].decode())):
+                        continue
+                    trace = RtlsimEntry()
+                    trace.decode_time = int(line_match.group("time"))
+                    trace.uuid = uuid
+                    trace.PC = PC.decode()
+                    trace.core_id = core_id
+                    trace.warp_id = warp_id
+                    trace.tmask = sys.intern(reverse_binary(tmask))
+                    trace.instr = fields["instr"].decode()
+                    trace.opcode = sys.intern(fields["op"].decode())
+                    opds = bin_to_array(fields["opds"].decode())
+                    trace.rd = int(fields["rd"])
+                    trace.rs1 = int(fields["rs1"]) if opds[1] else None
+                    trace.rs2 = int(fields["rs2"]) if opds[2] else None
+                    trace.rs3 = int(fields["rs3"]) if opds[3] else None
                     instr_data[uuid] = trace
-                elif stage == "issue":
+                elif stage == b"issue":
                     if uuid in instr_data:
                         trace = instr_data[uuid]
-                        trace["lineno"] = lineno
-                        opds = trace["opds"]
-                        if opds[1]:
-                            trace["rs1_data"] = re.search(rs1_data_pattern, line).group(1).split(', ')[::-1]
-                        if opds[2]:
-                            trace["rs2_data"] = re.search(rs2_data_pattern, line).group(1).split(', ')[::-1]
-                        if opds[3]:
-                            trace["rs3_data"] = re.search(rs3_data_pattern, line).group(1).split(', ')[::-1]
-                        trace["issued"] = True
-                        instr_data[uuid] = trace
-                elif stage == "commit":
+                        trace.lineno = lineno
+                        if trace.rs1 is not None:
+                            trace.rs1_data = parse_lanes(fields["rs1_data"])
+                        if trace.rs2 is not None:
+                            trace.rs2_data = parse_lanes(fields["rs2_data"])
+                        if trace.rs3 is not None:
+                            trace.rs3_data = parse_lanes(fields["rs3_data"])
+                        trace.issue_time = int(line_match.group("time"))
+                        trace.issued = True
+                elif stage == b"commit":
                     if uuid in instr_data:
                         trace = instr_data[uuid]
-                        if "issued" in trace:
-                            opds = trace["opds"]
+                        if trace.issued:
                             dst_tmask_arr = bin_to_array(tmask)[::-1]
-                            wb = re.search(wb_pattern, line).group(1) == "1"
+                            wb = fields["wb"] == b"1"
                             if wb:
-                                rd_data = re.search(rd_data_pattern, line).group(1).split(', ')[::-1]
-                                if 'rd_data' in trace:
-                                    merged_rd_data = trace['rd_data']
+                                rd_data = parse_lanes(fields["data"])
+                                if trace.rd_data is not None:
+                                    merged_rd_data = trace.rd_data
+                                    if type(merged_rd_data) is not type(rd_data):
+                                        merged_rd_data = lane_strings(merged_rd_data)
+                                        rd_data = lane_strings(rd_data)
                                     for i in range(len(dst_tmask_arr)):
                                         if dst_tmask_arr[i] == 1:
                                             merged_rd_data[i] = rd_data[i]
-                                    trace['rd_data'] = merged_rd_data
+                                    trace.rd_data = merged_rd_data
                                 else:
-                                    trace['rd_data'] = rd_data
-                            instr_data[uuid] = trace
-                            eop = re.search(eop_pattern, line).group(1) == "1"
+                                    trace.rd_data = rd_data
+                            eop = fields["eop"] == b"1"
                             if eop:
-                                tmask_arr = bin_to_array(trace["tmask"])
-                                destination = ''
-                                if wb:
-                                    destination, sep = append_value(destination, trace["rd"], trace['rd_data'], tmask_arr, False)
-                                    del trace['rd_data']
-                                trace["destination"] = destination
-                                operands = ''
-                                sep = False
-                                if opds[1]:
-                                    operands, sep = append_value(operands, trace["rs1"], trace["rs1_data"], tmask_arr, sep)
-                                    del trace["rs1_data"]
-                                if opds[2]:
-                                    operands, sep = append_value(operands, trace["rs2"], trace["rs2_data"], tmask_arr, sep)
-                                    del trace["rs2_data"]
-                                if opds[3]:
-                                    operands, sep = append_value(operands, trace["rs3"], trace["rs3_data"], tmask_arr, sep)
-                                    del trace["rs3_data"]
-                                trace["operands"] = operands
-                                del trace["opds"]
-                                del trace["rd"]
-                                del trace["rs1"]
-                                del trace["rs2"]
-                                del trace["rs3"]
-                                del trace["issued"]
+                                trace.commit_time = int(line_match.group("time"))
+                                trace.wb = wb
                                 del instr_data[uuid]
-                                entries.append(trace)
+                                yield trace
         except Exception as e:
             print("Error at line {}: {}".format(lineno, e))
-    return entries
 
-def write_csv(sublogs, csv_filename, log_type):
-    with open(csv_filename, 'w', newline='') as csv_file:
-        fieldnames = ["uuid", "PC", "opcode", "instr", "core_id", "warp_id", "tmask", "destination", "operands"]
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+class PendingTable(dict):
+    # bounded uuid -> in-flight rtlsim instruction table: once max_size entries
+    # are pending, the oldest decoded instruction is evicted as an orphan
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+        self.orphans = []
+
+    def __setitem__(self, uuid, entry):
+        if uuid not in self and len(self) >= self.max_size:
+            orphan = next(iter(self))
+            del self[orphan]
+            self.orphans.append(orphan)
+        super().__setitem__(uuid, entry)
+
+def parse_log(log_lines, log_type, instr_data=None):
+    if log_type == "rtlsim":
+        return parse_rtlsim(log_lines, instr_data)
+    elif log_type == "simx":
+        return parse_simx(log_lines)
+    else:
+        print('Error: invalid log type')
+        sys.exit()
+
+def dump_blocks(items, file, block_size):
+    # pickle items by blocks of block_size, return the number of blocks
+    items = iter(items)
+    num_blocks = 0
+    while True:
+        block = list(itertools.islice(items, block_size))
+        if not block:
+            return num_blocks
+        pickle.dump(block, file, pickle.HIGHEST_PROTOCOL)
+        num_blocks += 1
+
+class UuidSorter:
+    # Bounded-memory stable uuid sort of trace entries. uuids are made of the
+    # global warp id (upper 32 bits) and a per-warp counter, and each warp's
+    # entries arrive nearly in order: they go through a small per-warp reorder
+    # window whose output is appended to that warp's sorted run. Entries falling
+    # behind their window are sorted separately. Whenever more than buffer_size
+    # entries are held, blocks are spilled to a temporary file, and draining
+    # k-way merges the warp runs with the spilled sorted runs. Spilled runs are
+    # pickled by blocks of block_size entries and read back one block at a time.
+
+    def __init__(self, window=64, buffer_size=1 << 18, block_size=1 << 10):
+        self.window = window
+        self.buffer_size = buffer_size
+        self.block_size = block_size
+        self.seq = 0
+        self.warps = {}
+        self.num_buffered = 0
+        self.overflow = []
+        self.overflow_runs = []
+        self.spill_file = None
+
+    def spill(self, items):
+        # (offset, number of blocks) of the spilled run
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.seek(0, 2)
+        offset = self.spill_file.tell()
+        return offset, dump_blocks(items, self.spill_file, self.block_size)
+
+    def read_run(self, runs, block):
+        # runs are read concurrently by the merge, each block is looked up
+        # from the position where the previous one ended
+        for offset, num_blocks in runs:
+            for _ in range(num_blocks):
+                self.spill_file.seek(offset)
+                items = pickle.load(self.spill_file)
+                offset = self.spill_file.tell()
+                yield from items
+        yield from block
+
+    def spill_warps(self):
+        for warp in self.warps.values():
+            if warp[3]:
+                warp[2].append(self.spill(warp[3]))
+                warp[3] = []
+        self.num_buffered = 0
+
+    def push(self, entry):
+        uuid = entry['uuid']
+        item = (uuid, self.seq, entry)
+        self.seq += 1
+        # warp: [reorder heap, last emitted item key, spilled runs, block]
+        warp = self.warps.get(uuid >> 32)
+        if warp is None:
+            warp = self.warps[uuid >> 32] = [[], None, [], []]
+        if warp[1] is not None and item[:2] < warp[1]:
+            self.overflow.append(item)
+            if len(self.overflow) >= self.buffer_size:
+                self.overflow.sort()
+                self.overflow_runs.append(self.spill(self.overflow))
+                self.overflow = []
+            return
+        heapq.heappush(warp[0], item)
+        if len(warp[0]) > self.window:
+            item = heapq.heappop(warp[0])
+            warp[1] = item[:2]
+            warp[3].append(item)
+            self.num_buffered += 1
+            if self.num_buffered >= self.buffer_size:
+                self.spill_warps()
+
+    def drain(self):
+        runs = []
+        for key in sorted(self.warps):
+            heap, _, spilled, block = self.warps[key]
+            while heap:
+                block.append(heapq.heappop(heap))
+            runs.append(self.read_run(spilled, block))
+        self.overflow.sort()
+        merged = heapq.merge(itertools.chain(*runs),
+                             *[self.read_run([run], []) for run in self.overflow_runs],
+                             self.overflow)
+        try:
+            for item in merged:
+                yield item[2]
+        finally:
+            self.close()
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+def sort_entries(entries, buffer_size=1 << 18):
+    sorter = UuidSorter(buffer_size=buffer_size)
+    for entry in entries:
+        sorter.push(entry)
+    return sorter.drain()
+
+def iter_kernel_entries(sublogs, log_type, stream=False, sort_buffer=1 << 18):
+    # yield the (kernel, entry stream) of each sublog, sorted by uuid unless
+    # streaming; kernels count the START markers, the prelude is kernel 0
+    prelude = None
+    kernel = -1
+    for started, sublog in sublogs:
+        if started:
+            kernel += 1
+        elif stream:
+            # the prelude only counts when the log has no START marker, its
+            # lines are held back (spilled to disk when large) until that is known
+            prelude = tempfile.SpooledTemporaryFile(max_size=1 << 24)
+            prelude.writelines(sublog)
+            continue
+
+        # parse sublog
+        entries = parse_log(sublog, log_type)
+
+        if stream:
+            if prelude is not None:
+                prelude.close()
+                prelude = None
+            yield kernel, entries
+            continue
+
+        # sort entries by uuid
+        entries = sort_entries(entries, sort_buffer)
+
+        # the prelude only counts when the log has no START marker
+        if not started:
+            prelude = entries
+            continue
+        prelude = None
+
+        yield kernel, entries
+
+    if stream and prelude is not None:
+        yield 0, parse_log(iter_held_lines(prelude), log_type)
+    elif prelude is not None:
+        yield 0, prelude
+
+def iter_held_lines(held):
+    with held:
+        held.seek(0)
+        yield from held
+
+def iter_sublog_entries(sublogs, log_type, stream=False, sort_buffer=1 << 18):
+    for _, entries in iter_kernel_entries(sublogs, log_type, stream, sort_buffer):
+        yield entries
+
+def iter_entries(sublogs, log_type, stream=False, sort_buffer=1 << 18):
+    for kernel, entries in iter_kernel_entries(sublogs, log_type, stream, sort_buffer):
+        for entry in entries:
+            entry.kernel = kernel
+            yield entry
+
+def iter_live_entries(lines, log_type, max_pending):
+    # yield the entries of a log as it is being read, in completion order,
+    # reporting the instructions that never reached their eop
+    kernel = -1
+    for started, sublog_lines in split_log_lines(lines):
+        pending = PendingTable(max_pending)
+        if started:
+            kernel += 1
+        for entry in parse_log(sublog_lines, log_type, pending):
+            entry.kernel = max(kernel, 0)
+            yield entry
+        orphans = pending.orphans + list(pending)
+        if orphans:
+            shown = ", ".join(str(uuid) for uuid in orphans[:10])
+            print("Warning: kernel {}: {} orphaned uuids (decoded, never committed): {}{}".format(
+                max(kernel, 0), len(orphans), shown, ", ..." if len(orphans) > 10 else ""))
+
+def write_csv(entries, csv_filename, line_buffered=False):
+    with open(csv_filename, 'w', newline='', buffering=1 if line_buffered else -1) as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=csv_fields, extrasaction='ignore')
         writer.writeheader()
+        writer.writerows(entries)
 
-        for sublog in sublogs:
-            entries = None
+def collect_columns(entries, opcodes, strings=True):
+    # pack entries into compact column buffers, opcodes maps names to codes
+    columns = {name: array.array(typecode) for name, typecode in int_columns}
+    columns["opcode"] = array.array('i')
+    string_names = string_columns if strings else []
+    for name in string_names:
+        columns[name] = bytearray()
+        columns[name + "_offsets"] = array.array('q', [0])
+    for entry in entries:
+        columns["uuid"].append(entry["uuid"])
+        columns["PC"].append(int(entry["PC"], 16))
+        columns["instr"].append(int(entry.get("instr") or "0", 16))
+        columns["core_id"].append(entry["core_id"])
+        columns["warp_id"].append(entry["warp_id"])
+        columns["tmask"].append(int(entry["tmask"][::-1], 2))
+        columns["kernel"].append(entry.get("kernel", 0))
+        opcode = entry.get("opcode", "")
+        code = opcodes.get(opcode)
+        if code is None:
+            code = opcodes[opcode] = len(opcodes)
+        columns["opcode"].append(code)
+        for name in string_names:
+            data = columns[name]
+            data += entry.get(name, "").encode()
+            columns[name + "_offsets"].append(len(data))
+    return columns
 
-            # parse sublog
-            if log_type == "rtlsim":
-                entries = parse_rtlsim(sublog)
-            elif log_type == "simx":
-                entries = parse_simx(sublog)
-            else:
-                print('Error: invalid log type')
-                sys.exit()
+def write_npz(entries, npz_filename):
+    try:
+        import numpy as np
+    except ImportError:
+        print("Error: numpy is required for npz output")
+        sys.exit(1)
+    opcodes = {}
+    columns = collect_columns(entries, opcodes)
+    arrays = {}
+    for name, typecode in int_columns:
+        arrays[name] = np.frombuffer(columns[name], dtype=np.dtype(typecode))
+    arrays["opcode"] = np.frombuffer(columns["opcode"], dtype=np.int32)
+    arrays["opcode_dict"] = np.array(list(opcodes), dtype=str)
+    for name in string_columns:
+        arrays[name] = np.frombuffer(bytes(columns[name]), dtype=np.uint8)
+        arrays[name + "_offsets"] = np.frombuffer(columns[name + "_offsets"], dtype=np.int64)
+    with open(npz_filename, 'wb') as npz_file:
+        np.savez(npz_file, **arrays)
+
+def write_parquet(entries, parquet_filename, batch_size=1 << 20):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: pyarrow is required for parquet output")
+        sys.exit(1)
+    int_types = {'Q': pa.uint64(), 'I': pa.uint32()}
+    fields = [pa.field(name, int_types[typecode]) for name, typecode in int_columns]
+    fields.append(pa.field("opcode", pa.dictionary(pa.int32(), pa.string())))
+    fields += [pa.field(name, pa.large_string()) for name in string_columns]
+    schema = pa.schema(fields)
+    opcodes = {}
+    with pq.ParquetWriter(parquet_filename, schema) as writer:
+        while True:
+            columns = collect_columns(itertools.islice(entries, batch_size), opcodes)
+            num_rows = len(columns["uuid"])
+            if num_rows == 0:
+                break
+            arrays = []
+            for name, typecode in int_columns:
+                arrays.append(pa.Array.from_buffers(int_types[typecode], num_rows, [None, pa.py_buffer(columns[name])]))
+            indices = pa.Array.from_buffers(pa.int32(), num_rows, [None, pa.py_buffer(columns["opcode"])])
+            arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(list(opcodes), pa.string())))
+            for name in string_columns:
+                arrays.append(pa.Array.from_buffers(pa.large_string(), num_rows, [None, pa.py_buffer(columns[name + "_offsets"]), pa.py_buffer(columns[name])]))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+def load_columns(filename):
+    # load a npz or parquet trace as numpy columns, strings are decoded on demand
+    # from their "<name>" utf-8 data and "<name>_offsets" arrays.
+    import numpy as np
+    if filename.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename)
+        columns = {name: table.column(name).to_numpy() for name, _ in int_columns if name in table.column_names}
+        opcode = table.column("opcode").unify_dictionaries().combine_chunks()
+        columns["opcode"] = opcode.indices.to_numpy()
+        columns["opcode_dict"] = np.array(opcode.dictionary.to_pylist(), dtype=str)
+        for name in string_columns:
+            strings = table.column(name).combine_chunks()
+            offsets, data = strings.buffers()[1:]
+            columns[name + "_offsets"] = np.frombuffer(offsets, dtype=np.int64)[strings.offset:strings.offset + len(strings) + 1]
+            columns[name] = np.frombuffer(data, dtype=np.uint8)
+        return columns
+    with np.load(filename) as npz:
+        return {name: npz[name] for name in npz.files}
+
+def column_string(columns, name, row):
+    offsets = columns[name + "_offsets"]
+    return columns[name][offsets[row]:offsets[row + 1]].tobytes().decode()
+
+def map_log_file(log_file):
+    # read-only memory map of the log, None when it cannot be mapped
+    try:
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        return None
+    if hasattr(log_map, 'madvise'):
+        log_map.madvise(mmap.MADV_SEQUENTIAL)
+    return log_map
+
+# compressed logs are detected from their magic bytes and decompressed on the
+# fly by the named module
+compressed_magics = [(b"\x1f\x8b", "gzip"), (b"\xfd7zXZ\x00", "lzma"), (b"BZh", "bz2")]
+
+class PrefixedStream(io.RawIOBase):
+    # raw stream reading prefix, then the rest of a buffered binary stream
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            data = self.prefix[:len(buffer)]
+            self.prefix = self.prefix[len(data):]
+        else:
+            data = self.stream.read1(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def log_compression(log_file):
+    # (decompression module or None when plain, stream) of a buffered binary
+    # log. A pipe may not have all the magic bytes buffered yet: they are then
+    # read until complete or EOF, and served again by the returned stream.
+    magic = log_file.peek(6)[:6]
+    if len(magic) < 6:
+        magic = log_file.read(6)
+        log_file = io.BufferedReader(PrefixedStream(magic, log_file))
+    for prefix, module in compressed_magics:
+        if magic.startswith(prefix):
+            return module, log_file
+    return None, log_file
+
+def is_compressed(log_filename):
+    with open(log_filename, 'rb') as log_file:
+        return log_compression(log_file)[0] is not None
+
+def open_compressed(log_file, compression):
+    try:
+        module = importlib.import_module(compression)
+    except ImportError:
+        print("Error: {} decompression is not available".format(compression))
+        sys.exit(1)
+    return module.open(log_file, 'rb')
+
+def iter_stream_lines(stream, block_size=1 << 20):
+    # split a decompressed stream into lines by large blocks, which avoids the
+    # per-line overhead of the decompressor readline()
+    partial = b""
+    for block in iter(lambda: stream.read(block_size), b""):
+        lines = (partial + block).split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if partial:
+        yield partial
 
-            # sort entries by uuid
-            entries.sort(key=lambda x: (int(x['uuid'])))
-            for entry in entries:
-                del entry['lineno']
+def read_log_lines(log_filename):
+    # yield the raw lines of a log, served from a memory map of the file or
+    # decompressed on the fly
+    with open(log_filename, 'rb') as log_file:
+        compression, log_file = log_compression(log_file)
+        if compression is not None:
+            with open_compressed(log_file, compression) as stream:
+                yield from iter_stream_lines(stream)
+            return
+        log_map = map_log_file(log_file)
+        if log_map is None:
+            yield from log_file
+            return
+        with log_map:
+            yield from iter(log_map.readline, b"")
 
-            for entry in entries:
-                writer.writerow(entry)
+def follow_log_lines(log_filename, idle_timeout, poll_interval=0.1):
+    # yield the lines of a log that is still being written, waiting for the
+    # file to appear and stopping once it has not grown for idle_timeout seconds
+    last_read = time.monotonic()
+    while not os.path.exists(log_filename):
+        if time.monotonic() - last_read > idle_timeout:
+            print("Error: {} not found".format(log_filename))
+            sys.exit(1)
+        time.sleep(poll_interval)
+    with open(log_filename, 'rb') as log_file:
+        partial = b""
+        last_read = time.monotonic()
+        while True:
+            line = log_file.readline()
+            if line:
+                last_read = time.monotonic()
+                if line.endswith(b"\n"):
+                    yield partial + line
+                    partial = b""
+                else:
+                    partial += line
+            elif time.monotonic() - last_read > idle_timeout:
+                break
+            else:
+                time.sleep(poll_interval)
+        if partial:
+            yield partial
+
+def wait_config(lines, log_type, max_held=1 << 10):
+    # hold back the lines of a live log until its CONFIGS header shows up, the
+    # header comes first: stop looking at the first record or after max_held
+    # lines, leaving the configs unset
+    global configs
+    held = []
+    for line in lines:
+        held.append(line)
+        if b"CONFIGS:" in line:
+            config = match_config(line.decode(errors='replace'))
+            if config:
+                configs = config
+                break
+        if len(held) >= max_held or is_record_start(line, log_type):
+            break
+    return itertools.chain(held, lines)
 
 def split_log_file(log_filename):
-    with open(log_filename, 'r') as log_file:
-        log_lines = log_file.readlines()
-
-    sublogs = []
-    current_sublog = None
-
-    for line in log_lines:
-        if line.startswith("[VXDRV] START"):
-            if current_sublog is not None:
-                sublogs.append(current_sublog)
-            current_sublog = [line]
-        elif current_sublog is not None:
-            current_sublog.append(line)
-
-    if current_sublog is not None:
-        sublogs.append(current_sublog)
-    else:
-        sublogs.append(log_lines)
+    return split_log_lines(read_log_lines(log_filename))
+
+def split_log_lines(lines):
+    # lazily yield (started, lines) for each "[VXDRV] START" sublog,
+    # started is False for the lines preceding the first START marker.
+    sublog_id = 0
+    def sublog_of(line):
+        nonlocal sublog_id
+        if line.startswith(b"[VXDRV] START"):
+            sublog_id += 1
+        return sublog_id
+
+    for key, sublog_lines in itertools.groupby(lines, key=sublog_of):
+        yield key != 0, sublog_lines
+
+def find_sublogs(log_filename):
+    # byte ranges (started, start, end) of the "[VXDRV] START" sublogs,
+    # the lines preceding the first START marker only count when there is none.
+    marker = b"\n[VXDRV] START"
+    starts = []
+    with open(log_filename, 'rb') as log_file:
+        log_map = map_log_file(log_file)
+        if log_map is None:
+            return [(False, 0, 0)]
+        with log_map:
+            size = len(log_map)
+            if log_map[:len(marker) - 1] == marker[1:]:
+                starts.append(0)
+            pos = log_map.find(marker)
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = log_map.find(marker, pos + 1)
+    if not starts:
+        return [(False, 0, size)]
+    ends = starts[1:] + [size]
+    return [(True, start, end) for start, end in zip(starts, ends)]
+
+def is_record_start(line, log_type):
+    if log_type == "rtlsim":
+        line_match = rtlsim_line_re.search(line)
+        return line_match is not None and line_match.group("stage") == b"decode"
+    return line.startswith(b"DEBUG Fetch:")
+
+def read_chunk(log_file, log_type, start, end, limit, pending=None):
+    # yield the lines of the records starting within [start, end), resyncing on
+    # the first record boundary at or after start. simx records end at the next
+    # fetch, rtlsim ones are followed past end until no decoded instruction is
+    # pending; nothing is read beyond limit, the end of the sublog.
+    if start > 0:
+        log_file.seek(start - 1)
+        log_file.readline()
+    offset = log_file.tell()
+    synced = False
+    for line in iter(log_file.readline, b""):
+        line_offset = offset
+        offset += len(line)
+        if line_offset >= limit:
+            break
+        if line_offset >= end:
+            if log_type == "rtlsim":
+                if not pending:
+                    break
+                if is_record_start(line, log_type):
+                    continue
+            elif is_record_start(line, log_type):
+                break
+        elif not synced:
+            if not is_record_start(line, log_type):
+                continue
+            synced = True
+        yield line
+
+def init_worker(worker_configs, worker_filter):
+    global configs, trace_filter
+    configs = worker_configs
+    trace_filter = worker_filter
 
-    return sublogs
+def parse_chunk(task):
+    # parse and sort a chunk, spilling the sorted entries to a file of spill_dir
+    log_filename, log_type, start, end, limit, sort_buffer, spill_dir = task
+    with open(log_filename, 'rb') as log_file, map_log_file(log_file) as log_map:
+        if log_type == "rtlsim":
+            pending = {}
+            entries = parse_rtlsim(read_chunk(log_map, log_type, start, end, limit, pending), pending)
+        else:
+            entries = parse_log(read_chunk(log_map, log_type, start, end, limit), log_type)
+        entries = sort_entries(entries, sort_buffer)
+        with tempfile.NamedTemporaryFile(dir=spill_dir, suffix=".chunk", delete=False) as chunk_file:
+            dump_blocks(entries, chunk_file, 1 << 10)
+        return chunk_file.name
+
+def load_chunk(chunk_filename):
+    # yield the entries of a spilled chunk block by block, then remove it
+    try:
+        with open(chunk_filename, 'rb') as chunk_file:
+            while True:
+                try:
+                    block = pickle.load(chunk_file)
+                except EOFError:
+                    break
+                yield from block
+    finally:
+        os.remove(chunk_filename)
+
+def iter_entries_parallel(log_filename, log_type, jobs, chunk_size=None, sort_buffer=1 << 18):
+    # split every sublog into byte-range chunks parsed in a process pool, then
+    # merge each sublog's sorted chunks back into uuid order. Workers spill
+    # their chunks to disk, and only the chunks of the sublog being merged plus
+    # about jobs more are in flight at any time.
+    if log_type not in ["rtlsim", "simx"]:
+        print('Error: invalid log type')
+        sys.exit()
+    sublogs = find_sublogs(log_filename)
+    if chunk_size is None:
+        total_size = sum(end - start for _, start, end in sublogs)
+        chunk_size = max(1 << 20, total_size // (jobs * 4))
+    tasks = []
+    sublog_chunks = []
+    for _, start, end in sublogs:
+        num_chunks = 0
+        for chunk_start in range(start, end, chunk_size):
+            tasks.append((log_filename, log_type, chunk_start, min(chunk_start + chunk_size, end), end))
+            num_chunks += 1
+        sublog_chunks.append(num_chunks)
+
+    with tempfile.TemporaryDirectory() as spill_dir, \
+         multiprocessing.Pool(jobs, initializer=init_worker, initargs=(configs, trace_filter)) as pool:
+        tasks = iter(tasks)
+        submitted = collections.deque()
+
+        def submit(count):
+            for task in itertools.islice(tasks, max(count, 0)):
+                submitted.append(pool.apply_async(parse_chunk, (task + (sort_buffer, spill_dir),)))
+
+        submit(jobs)
+        for kernel, num_chunks in enumerate(sublog_chunks):
+            submit(num_chunks - len(submitted))
+            chunk_files = [submitted.popleft().get() for _ in range(num_chunks)]
+            # keep the workers busy with the next chunks while this sublog is merged
+            submit(jobs - len(submitted))
+            chunks = [load_chunk(chunk_filename) for chunk_filename in chunk_files]
+            for entry in heapq.merge(*chunks, key=lambda x: (int(x['uuid']))):
+                entry.kernel = kernel
+                yield entry
 
 def main():
-    global configs
+    global configs, trace_filter
     args = parse_args()
-    configs = load_config(args.log)
-    sublogs = split_log_file(args.log)
-    write_csv(sublogs, args.csv, args.type)
+    if args.core or args.warp or args.pc_range or args.uuid_range or args.opcode:
+        trace_filter = TraceFilter(args.core, args.warp, args.pc_range, args.uuid_range, args.opcode)
+    live = args.follow or args.log == '-'
+    if live:
+        # live logs are converted in completion order, their CONFIGS header
+        # is read from the stream itself
+        if args.log == '-':
+            lines = sys.stdin.buffer
+            compression, lines = log_compression(lines)
+            if compression is not None:
+                lines = open_compressed(lines, compression)
+        else:
+            lines = follow_log_lines(args.log, args.idle_timeout)
+        lines = wait_config(iter(lines), args.type)
+        if configs is None and args.type == "rtlsim":
+            print("Error: missing CONFIGS: header")
+            sys.exit(1)
+        entries = iter_live_entries(lines, args.type, args.max_pending)
+    else:
+        configs = load_config(args.log)
+        if args.jobs > 1 and is_compressed(args.log):
+            # compressed logs cannot be split into byte ranges
+            print("Warning: --jobs is ignored for compressed logs")
+            args.jobs = 1
+        if args.jobs > 1:
+            entries = iter_entries_parallel(args.log, args.type, args.jobs, sort_buffer=args.sort_buffer)
+        else:
+            entries = iter_entries(split_log_file(args.log), args.type, args.stream, args.sort_buffer)
+    if args.format == "npz":
+        write_npz(entries, args.csv)
+    elif args.format == "parquet":
+        write_parquet(entries, args.csv)
+    else:
+        write_csv(entries, args.csv, live)
 
 if __name__ == "__main__":
     main()
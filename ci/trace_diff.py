@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+import itertools
+import re
+import trace_csv
+
+reg_values_re = re.compile(r"([xf]\d+)=\{([^}]*)\}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Streaming trace log differ (merge-joins two logs on uuid).')
+    parser.add_argument('-a', '--type-a', default='rtlsim', help='first log type (rtlsim or simx)')
+    parser.add_argument('-b', '--type-b', default='simx', help='second log type (rtlsim or simx)')
+    parser.add_argument('-n', '--max-diffs', type=int, default=10, help='Stop after N diverging instructions (0 for no limit)')
+    parser.add_argument('-i', '--ignore', action='append', default=[], help='Field to leave out of the comparison (repeatable)')
+    parser.add_argument('log_a', help='First log file')
+    parser.add_argument('log_b', help='Second log file')
+    return parser.parse_args()
+
+def diff_lanes(value_a, value_b):
+    # per-register lane mismatches of two "x1={..}, f2={..}" operand strings
+    regs_a = reg_values_re.findall(value_a)
+    regs_b = reg_values_re.findall(value_b)
+    if len(regs_a) != len(regs_b):
+        return None
+    details = []
+    for (reg_a, lanes_a), (reg_b, lanes_b) in zip(regs_a, regs_b):
+        if reg_a != reg_b:
+            details.append("register {} != {}".format(reg_a, reg_b))
+            continue
+        lanes_a = lanes_a.split(', ')
+        lanes_b = lanes_b.split(', ')
+        for lane, (lane_a, lane_b) in enumerate(itertools.zip_longest(lanes_a, lanes_b)):
+            if lane_a != lane_b:
+                details.append("{}[{}]: {} != {}".format(reg_a, lane, lane_a, lane_b))
+    return details
+
+def diff_entry(entry_a, entry_b, fields):
+    mismatches = []
+    for field in fields:
+        value_a = str(entry_a.get(field, ''))
+        value_b = str(entry_b.get(field, ''))
+        if value_a != value_b:
+            mismatches.append((field, value_a, value_b))
+    return mismatches
+
+def merge_join(entries_a, entries_b):
+    # pair up two uuid-sorted entry streams, yielding (entry_a, entry_b)
+    # with None on the side missing an instruction
+    entry_a = next(entries_a, None)
+    entry_b = next(entries_b, None)
+    while entry_a is not None or entry_b is not None:
+        if entry_b is None or (entry_a is not None and entry_a['uuid'] < entry_b['uuid']):
+            yield entry_a, None
+            entry_a = next(entries_a, None)
+        elif entry_a is None or entry_b['uuid'] < entry_a['uuid']:
+            yield None, entry_b
+            entry_b = next(entries_b, None)
+        else:
+            yield entry_a, entry_b
+            entry_a = next(entries_a, None)
+            entry_b = next(entries_b, None)
+
+def describe(entry):
+    return "uuid={}, core={}, warp={}, PC={}, opcode={}".format(
+        entry['uuid'], entry['core_id'], entry['warp_id'], entry['PC'], entry.get('opcode', '?'))
+
+def report(sublog, entry_a, entry_b, mismatches):
+    if entry_b is None:
+        print("sublog {}: only in A: {}".format(sublog, describe(entry_a)))
+        return
+    if entry_a is None:
+        print("sublog {}: only in B: {}".format(sublog, describe(entry_b)))
+        return
+    print("sublog {}: mismatch: {}".format(sublog, describe(entry_a)))
+    for field, value_a, value_b in mismatches:
+        details = diff_lanes(value_a, value_b) if field in ["destination", "operands"] else None
+        if details:
+            print("  {}: {}".format(field, "; ".join(details)))
+        else:
+            print("  {}: A={} B={}".format(field, value_a, value_b))
+
+def diff_logs(log_a, type_a, log_b, type_b, fields, max_diffs):
+    sublogs_a = trace_csv.iter_sublog_entries(trace_csv.split_log_file(log_a), type_a)
+    sublogs_b = trace_csv.iter_sublog_entries(trace_csv.split_log_file(log_b), type_b)
+    num_compared = 0
+    num_diffs = 0
+    for sublog, (entries_a, entries_b) in enumerate(itertools.zip_longest(sublogs_a, sublogs_b, fillvalue=[])):
+        for entry_a, entry_b in merge_join(iter(entries_a), iter(entries_b)):
+            num_compared += 1
+            if entry_a is not None and entry_b is not None:
+                mismatches = diff_entry(entry_a, entry_b, fields)
+                if not mismatches:
+                    continue
+            else:
+                mismatches = []
+            report(sublog, entry_a, entry_b, mismatches)
+            num_diffs += 1
+            if num_diffs == max_diffs:
+                print("stopped after {} diverging instructions ({} compared)".format(num_diffs, num_compared))
+                return num_diffs
+    print("{} diverging instructions ({} compared)".format(num_diffs, num_compared))
+    return num_diffs
+
+def main():
+    args = parse_args()
+    for log_type in [args.type_a, args.type_b]:
+        if log_type not in ["rtlsim", "simx"]:
+            print('Error: invalid log type')
+            sys.exit(2)
+    # core ids of rtlsim traces are derived from the CONFIGS header
+    if args.type_a == "rtlsim":
+        trace_csv.configs = trace_csv.load_config(args.log_a)
+    elif args.type_b == "rtlsim":
+        trace_csv.configs = trace_csv.load_config(args.log_b)
+    fields = [field for field in trace_csv.csv_fields if field != "uuid" and field not in args.ignore]
+    num_diffs = diff_logs(args.log_a, args.type_a, args.log_b, args.type_b, fields, args.max_diffs)
+    sys.exit(1 if num_diffs else 0)
+
+if __name__ == "__main__":
+    main()
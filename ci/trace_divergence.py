@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import trace_csv
+import trace_profile
+from trace_profile import np
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Warp divergence and reconvergence analysis of instruction traces.')
+    parser.add_argument('-t', '--type', default='simx', help='log type (rtlsim or simx), ignored for npz/parquet traces')
+    parser.add_argument('-n', '--top', type=int, default=20, help='Number of rows of each report (0 for all)')
+    parser.add_argument('--threads', type=int, help='Number of lanes per warp (default: from the log CONFIGS or the widest tmask)')
+    parser.add_argument('trace', help='Input log file, or a trace converted with trace_csv.py --format npz/parquet')
+    return parser.parse_args()
+
+def warp_transitions(columns):
+    # each kernel is uuid sorted, so every warp's instructions are contiguous
+    # and in program order: compare each tmask with the warp's previous one
+    uuid = columns["uuid"]
+    tmask = columns["tmask"].astype(np.uint64)
+    kernels = trace_profile.kernel_ids(columns)
+    warps = uuid >> np.uint64(32)
+    same_warp = np.zeros(len(uuid), dtype=bool)
+    same_warp[1:] = (kernels[1:] == kernels[:-1]) & (warps[1:] == warps[:-1])
+    prev_tmask = np.zeros(len(uuid), dtype=np.uint64)
+    prev_tmask[1:] = tmask[:-1]
+    changed = same_warp & (tmask != prev_tmask)
+    shrink = changed & ((tmask & ~prev_tmask) == 0)
+    grow = changed & ((prev_tmask & ~tmask) == 0)
+    # masks that are neither a subset nor a superset switch to another path
+    switch = changed & ~shrink & ~grow
+    return same_warp, shrink | switch, grow
+
+def print_report(title, header, keys, weights, top, row_of):
+    # group rows by key, most frequent first, with the sums of each weight array
+    if len(keys) == 0:
+        return
+    values, first, counts, total = trace_profile.group_profile(keys, weights[0])
+    totals = [total] + [trace_profile.group_profile(keys, weight)[3] for weight in weights[1:]]
+    order = np.argsort(-counts, kind='stable')
+    if top:
+        order = order[:top]
+    rows = [row_of(values[i], first[i], counts[i], *[total[i] for total in totals]) for i in order]
+    trace_profile.print_table(title, header, rows)
+
+def analyze(columns, num_threads, top):
+    num_instrs = len(columns["uuid"])
+    if num_instrs == 0:
+        print("empty trace")
+        return
+    tmask = columns["tmask"].astype(np.uint64)
+    if num_threads is None:
+        num_threads = int(np.bitwise_or.reduce(tmask)).bit_length()
+    full_mask = np.uint64((1 << num_threads) - 1)
+    PC = columns["PC"].astype(np.int64)
+    opcode_names = columns["opcode_dict"]
+    opcodes = columns["opcode"]
+    active = trace_profile.popcount(tmask).astype(np.int64)
+    same_warp, diverge, grow = warp_transitions(columns)
+
+    # the divergent branch is the instruction preceding the narrower mask
+    rows = np.arange(num_instrs)
+    branch_rows = np.flatnonzero(diverge) - 1
+    reconverge_rows = np.flatnonzero(grow)
+
+    # attribute partial-mask instructions to the most recent divergent branch
+    # of their warp, up to the next full reconvergence or warp start (-1 when
+    # the warp ran a partial mask without diverging, e.g. after a TMC)
+    source_pc = np.full(num_instrs, -1, dtype=np.int64)
+    source_pc[diverge] = PC[branch_rows]
+    marks = diverge | ~same_warp | (grow & (tmask == full_mask))
+    last_mark = np.maximum.accumulate(np.where(marks, rows, 0))
+    source_pc = source_pc[last_mark]
+    partial = active < num_threads
+    num_partial = int(np.count_nonzero(partial))
+    lost_lanes = num_threads - active
+
+    print("instructions: {}".format(num_instrs))
+    print("threads per warp: {}".format(num_threads))
+    print("partial mask instructions: {} ({:.1f}%)".format(num_partial, 100.0 * num_partial / num_instrs))
+    print("idle lanes: {:.1f}%".format(100.0 * lost_lanes.sum() / (num_instrs * num_threads)))
+    print("divergence events: {}".format(len(branch_rows)))
+    print("reconvergence events: {}".format(len(reconverge_rows)))
+
+    def pc_name(pc):
+        return "<no divergence>" if pc < 0 else hex(int(pc))
+
+    print_report("Divergent branches:", ["PC        ", "opcode", "diverged", "avg lanes before", "avg lanes after"],
+                 PC[branch_rows], [active[branch_rows], active[branch_rows + 1]], top,
+                 lambda pc, first, count, before, after: (pc_name(pc), opcode_names[opcodes[branch_rows[first]]], count,
+                                                          "{:.2f}".format(before / count), "{:.2f}".format(after / count)))
+    print_report("Reconvergence points:", ["PC        ", "opcode", "reconverged", "avg lanes after"],
+                 PC[reconverge_rows], [active[reconverge_rows]], top,
+                 lambda pc, first, count, lanes: (pc_name(pc), opcode_names[opcodes[reconverge_rows[first]]], count, "{:.2f}".format(lanes / count)))
+    print_report("Partial mask instructions by divergent branch:", ["source PC      ", "  instrs", "  instrs%", "idle lanes"],
+                 source_pc[partial], [lost_lanes[partial]], top,
+                 lambda pc, first, count, lanes: (pc_name(pc), count, "{:.2f}%".format(100.0 * count / num_instrs), int(lanes)))
+
+def main():
+    args = parse_args()
+    columns = trace_profile.load_trace(args.trace, args.type)
+    num_threads = args.threads
+    if num_threads is None and trace_csv.configs is not None:
+        num_threads = trace_csv.configs['num_threads']
+    analyze(columns, num_threads, args.top)
+
+if __name__ == "__main__":
+    main()
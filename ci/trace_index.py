@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+import argparse
+import array
+import csv
+import struct
+import trace_csv
+
+def uint_typecode(size):
+    # array typecodes only have minimum sizes, pick the one of the exact width
+    return next(typecode for typecode in "BHILQ" if array.array(typecode).itemsize == size)
+
+# Index sidecar layout: a header followed by one native-endian column per
+# record field, then permutations sorting the records by uuid, PC and core/warp.
+index_magic = b"VXTRIDX2"
+index_header = struct.Struct("<8sB7xQQQ")
+index_columns = [("sublog", uint_typecode(4)), ("uuid", uint_typecode(8)), ("PC", uint_typecode(8)), ("core_id", uint_typecode(2)),
+                 ("warp_id", uint_typecode(2)), ("start", uint_typecode(8)), ("length", uint_typecode(8))]
+order_typecode = uint_typecode(4)
+index_orders = ["by_uuid", "by_pc", "by_core_warp"]
+log_types = ["simx", "rtlsim"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Random-access index for trace logs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Build the index sidecar of a log')
+    query_parser = subparsers.add_parser('query', help='Convert the log records matching a query to CSV')
+    for subparser in [build_parser, query_parser]:
+        subparser.add_argument('-t', '--type', default='simx', help='log type (rtlsim or simx)')
+        subparser.add_argument('-x', '--index', help='Index file (default: <log>.tidx)')
+        subparser.add_argument('log', help='Input log file')
+    query_parser.add_argument('--uuid', type=int, help='Instruction uuid')
+    query_parser.add_argument('--pc', type=lambda x: int(x, 0), help='Instruction PC')
+    query_parser.add_argument('--core', type=int, help='Core id')
+    query_parser.add_argument('--warp', type=int, help='Warp id')
+    query_parser.add_argument('-o', '--csv', default='-', help='Output CSV file (default: stdout)')
+    return parser.parse_args()
+
+def scan_records(log_filename, log_type, columns):
+    # append the location and key fields of each complete record of the log
+    num_cores = trace_csv.configs['num_cores']
+    socket_size = trace_csv.configs['socket_size']
+    num_sockets = (num_cores + socket_size - 1) // socket_size
+    sublog = 0
+    pending = {}
+    current = None
+    offset = 0
+
+    limits = [(1 << (8 * array.array(typecode).itemsize)) - 1 for _, typecode in index_columns]
+
+    def add_record(*values):
+        # every value is checked before any column grows, so that they stay aligned
+        for (name, _), limit, value in zip(index_columns, limits, values):
+            if not 0 <= value <= limit:
+                print("Error: {} {} of the record at offset {} does not fit the index".format(name, value, values[5]))
+                sys.exit(1)
+        for (name, _), value in zip(index_columns, values):
+            columns[name].append(value)
+
+    def close_record(end):
+        if current is not None:
+            columns["length"][current] = end - columns["start"][current]
+
+    with open(log_filename, 'rb') as log_file:
+        log_map = trace_csv.map_log_file(log_file)
+        if log_map is None:
+            return
+        with log_map:
+            for line in iter(log_map.readline, b""):
+                line_offset = offset
+                offset += len(line)
+                try:
+                    if line.startswith(b"[VXDRV] START"):
+                        close_record(line_offset)
+                        current = None
+                        pending.clear()
+                        sublog += 1
+                    elif log_type == "simx":
+                        if line.startswith(b"DEBUG Fetch:"):
+                            close_record(line_offset)
+                            current = None
+                            fields = trace_csv.parse_fields(line, 13, trace_csv.simx_fetch_re)
+                            add_record(sublog, int(fields["uuid"]), int(fields["PC"], 16), int(fields["cid"]), int(fields["wid"]), line_offset, 0)
+                            current = len(columns["start"]) - 1
+                    else:
+                        line_match = trace_csv.rtlsim_line_re.search(line)
+                        if line_match:
+                            stage = line_match.group("stage")
+                            fields = trace_csv.parse_fields(line, line_match.end(), trace_csv.rtlsim_fields_re[stage])
+                            uuid = int(fields["uuid"])
+                            if stage == b"decode":
+                                cluster_id = int(line_match.group("cluster"))
+                                socket_id = int(line_match.group("socket"))
+                                core_id = int(line_match.group("core"))
+                                core_id = (((cluster_id * num_sockets) + socket_id) * socket_size) + core_id
+                                pending[uuid] = (sublog, uuid, int(fields["PC"], 16), core_id, int(fields["wid"]), line_offset)
+                            elif stage == b"commit" and fields["eop"] == b"1" and uuid in pending:
+                                record = pending.pop(uuid)
+                                add_record(*record, offset - record[5])
+                except Exception as e:
+                    print("Error at offset {}: {}".format(line_offset, e))
+            close_record(offset)
+
+def argsort(keys):
+    try:
+        import numpy as np
+    except ImportError:
+        return array.array(order_typecode, sorted(range(len(keys)), key=keys.__getitem__))
+    order = array.array(order_typecode)
+    order.frombytes(np.argsort(np.frombuffer(keys, dtype=np.dtype(keys.typecode)), kind='stable').astype(np.uint32).tobytes())
+    return order
+
+def build_index(log_filename, log_type, index_filename):
+    columns = {name: array.array(typecode) for name, typecode in index_columns}
+    scan_records(log_filename, log_type, columns)
+    core_warp = array.array('Q', [(core_id << 16) | warp_id for core_id, warp_id in zip(columns["core_id"], columns["warp_id"])])
+    orders = [argsort(columns["uuid"]), argsort(columns["PC"]), argsort(core_warp)]
+    log_stat = os.stat(log_filename)
+    with open(index_filename, 'wb') as index_file:
+        index_file.write(index_header.pack(index_magic, log_types.index(log_type), log_stat.st_size, log_stat.st_mtime_ns, len(columns["start"])))
+        for name, _ in index_columns:
+            columns[name].tofile(index_file)
+        for order in orders:
+            order.tofile(index_file)
+    return len(columns["start"])
+
+def load_index(log_filename, log_type, index_filename):
+    with open(index_filename, 'rb') as index_file:
+        magic, type_id, log_size, log_mtime, num_records = index_header.unpack(index_file.read(index_header.size))
+        if magic != index_magic:
+            print("Error: invalid index file {}".format(index_filename))
+            sys.exit(1)
+        log_stat = os.stat(log_filename)
+        if log_types[type_id] != log_type or log_stat.st_size != log_size or log_stat.st_mtime_ns != log_mtime:
+            print("Error: stale index {}, rebuild it".format(index_filename))
+            sys.exit(1)
+        index = {}
+        for name, typecode in index_columns + [(order, order_typecode) for order in index_orders]:
+            index[name] = array.array(typecode)
+            index[name].fromfile(index_file, num_records)
+    return index
+
+def equal_range(order, keys, low, high):
+    # positions in order of the records whose key is within [low, high]
+    def lower_bound(value):
+        first, last = 0, len(order)
+        while first < last:
+            mid = (first + last) // 2
+            if keys(order[mid]) < value:
+                first = mid + 1
+            else:
+                last = mid
+        return first
+    return order[lower_bound(low):lower_bound(high + 1)]
+
+def query_index(index, uuid=None, PC=None, core_id=None, warp_id=None):
+    if uuid is not None:
+        candidates = equal_range(index["by_uuid"], index["uuid"].__getitem__, uuid, uuid)
+    elif PC is not None:
+        candidates = equal_range(index["by_pc"], index["PC"].__getitem__, PC, PC)
+    elif core_id is not None:
+        low = (core_id << 16) | (warp_id if warp_id is not None else 0)
+        high = (core_id << 16) | (warp_id if warp_id is not None else 0xffff)
+        candidates = equal_range(index["by_core_warp"], lambda i: (index["core_id"][i] << 16) | index["warp_id"][i], low, high)
+    else:
+        candidates = range(len(index["start"]))
+    matches = []
+    for i in candidates:
+        if uuid is not None and index["uuid"][i] != uuid:
+            continue
+        if PC is not None and index["PC"][i] != PC:
+            continue
+        if core_id is not None and index["core_id"][i] != core_id:
+            continue
+        if warp_id is not None and index["warp_id"][i] != warp_id:
+            continue
+        matches.append(i)
+    return matches
+
+def read_record(log_map, log_type, start, length, uuid):
+    # parse the record lines, rtlsim ranges are narrowed to the uuid's lines
+    log_map.seek(start)
+    lines = log_map.read(length).splitlines(keepends=True)
+    if log_type == "rtlsim":
+        suffix = b"(#%d)" % uuid
+        lines = [line for line in lines if line.rstrip().endswith(suffix)]
+    for entry in trace_csv.parse_log(lines, log_type):
+        if entry['uuid'] == uuid:
+            return entry
+    return None
+
+def main():
+    args = parse_args()
+    if args.type not in log_types:
+        print('Error: invalid log type')
+        sys.exit(1)
+    if trace_csv.is_compressed(args.log):
+        print('Error: compressed logs cannot be indexed, decompress {} first'.format(args.log))
+        sys.exit(1)
+    index_filename = args.index or args.log + ".tidx"
+    trace_csv.configs = trace_csv.load_config(args.log)
+
+    if args.command == 'build':
+        num_records = build_index(args.log, args.type, index_filename)
+        print("indexed {} records in {}".format(num_records, index_filename))
+        return
+
+    index = load_index(args.log, args.type, index_filename)
+    matches = query_index(index, args.uuid, args.pc, args.core, args.warp)
+    matches.sort(key=lambda i: (index["sublog"][i], index["uuid"][i]))
+    csv_file = sys.stdout if args.csv == '-' else open(args.csv, 'w', newline='')
+    writer = csv.DictWriter(csv_file, fieldnames=trace_csv.csv_fields, extrasaction='ignore')
+    writer.writeheader()
+    if matches:
+        with open(args.log, 'rb') as log_file, trace_csv.map_log_file(log_file) as log_map:
+            for i in matches:
+                entry = read_record(log_map, args.type, index["start"][i], index["length"][i], index["uuid"][i])
+                if entry is not None:
+                    writer.writerow(entry)
+    if csv_file is not sys.stdout:
+        csv_file.close()
+
+if __name__ == "__main__":
+    main()
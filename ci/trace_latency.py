@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+import array
+import trace_csv
+
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy is required for latency analysis")
+    sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pipeline stage latency and IPC analysis of rtlsim trace logs.')
+    parser.add_argument('-w', '--window', type=int, default=1000, help='IPC window size in cycles')
+    parser.add_argument('--ticks-per-cycle', type=int, default=2, help='Simulation timestamp ticks per clock cycle')
+    parser.add_argument('log', help='Input rtlsim log file')
+    return parser.parse_args()
+
+def load_timings(log_filename):
+    # stage timestamps of the instructions of each kernel, in completion order
+    opcodes = {}
+    columns = {name: array.array('q') for name in ["kernel", "opcode", "core_id", "warp_id", "decode_time", "issue_time", "commit_time"]}
+    kernels = trace_csv.iter_kernel_entries(trace_csv.split_log_file(log_filename), "rtlsim", stream=True)
+    for kernel, entries in kernels:
+        for entry in entries:
+            code = opcodes.get(entry.opcode)
+            if code is None:
+                code = opcodes[entry.opcode] = len(opcodes)
+            columns["kernel"].append(kernel)
+            columns["opcode"].append(code)
+            columns["core_id"].append(entry.core_id)
+            columns["warp_id"].append(entry.warp_id)
+            columns["decode_time"].append(entry.decode_time)
+            columns["issue_time"].append(entry.issue_time)
+            columns["commit_time"].append(entry.commit_time)
+    timings = {name: np.frombuffer(values, dtype=np.int64) for name, values in columns.items()}
+    timings["opcode_dict"] = list(opcodes)
+    return timings
+
+def latency_buckets(latency):
+    # log2 histogram buckets: 0, 1, 2-3, 4-7, ...
+    buckets = np.zeros(len(latency), dtype=np.int64)
+    positive = latency > 0
+    buckets[positive] = np.floor(np.log2(latency[positive])).astype(np.int64) + 1
+    return buckets
+
+def bucket_name(bucket):
+    if bucket < 2:
+        return str(bucket)
+    return "{}-{}".format(1 << (bucket - 1), (1 << bucket) - 1)
+
+def print_histograms(title, group_name, labels, groups, latency, by_count=False):
+    # one latency histogram row per group, optionally most frequent groups first
+    buckets = latency_buckets(latency)
+    num_buckets = int(buckets.max()) + 1
+    num_groups = len(labels)
+    histogram = np.bincount(groups * num_buckets + buckets, minlength=num_groups * num_buckets).reshape(num_groups, num_buckets)
+    counts = histogram.sum(axis=1)
+    totals = np.bincount(groups, weights=latency, minlength=num_groups)
+    maxima = np.zeros(num_groups, dtype=np.int64)
+    np.maximum.at(maxima, groups, latency)
+    header = [group_name.rjust(8), "   count", "   mean", "  max"] + [bucket_name(bucket).rjust(7) for bucket in range(num_buckets)]
+    print()
+    print(title)
+    print("  ".join(header))
+    order = np.argsort(-counts, kind='stable') if by_count else range(num_groups)
+    for group in order:
+        if counts[group] == 0:
+            continue
+        row = [labels[group], counts[group], "{:.1f}".format(totals[group] / counts[group]), maxima[group]] + list(histogram[group])
+        print("  ".join(str(value).rjust(len(name)) for name, value in zip(header, row)))
+
+def print_ipc(timings, ticks_per_cycle, window):
+    # per-core committed instructions per cycle over fixed cycle windows
+    commit_cycle = timings["commit_time"] // ticks_per_cycle
+    num_cores = int(timings["core_id"].max()) + 1
+    for kernel in np.unique(timings["kernel"]):
+        rows = timings["kernel"] == kernel
+        windows = commit_cycle[rows] // window
+        first_window = int(windows.min())
+        num_windows = int(windows.max()) - first_window + 1
+        commits = np.bincount((windows - first_window) * num_cores + timings["core_id"][rows], minlength=num_windows * num_cores).reshape(num_windows, num_cores)
+        header = ["   cycle"] + ["core{:<4}".format(core) for core in range(num_cores)]
+        print()
+        print("Commit IPC (kernel {}, {} cycle windows):".format(kernel, window))
+        print("  ".join(header))
+        for index in range(num_windows):
+            row = [(first_window + index) * window] + ["{:.3f}".format(count / window) for count in commits[index]]
+            print("  ".join(str(value).rjust(len(name)) for name, value in zip(header, row)))
+
+def main():
+    args = parse_args()
+    trace_csv.configs = trace_csv.load_config(args.log)
+    timings = load_timings(args.log)
+    if len(timings["opcode"]) == 0:
+        print("empty trace")
+        return
+    stages = [("decode->issue", timings["issue_time"] - timings["decode_time"]),
+              ("issue->commit", timings["commit_time"] - timings["issue_time"])]
+    num_warps = trace_csv.configs['num_warps']
+    num_cores = int(timings["core_id"].max()) + 1
+    core_warps = timings["core_id"] * num_warps + timings["warp_id"]
+    print("instructions: {}".format(len(timings["opcode"])))
+    for stage, ticks in stages:
+        latency = ticks // args.ticks_per_cycle
+        print_histograms("{} latency (cycles) by opcode:".format(stage), "opcode", timings["opcode_dict"], timings["opcode"], latency, True)
+        print_histograms("{} latency (cycles) by core:".format(stage), "core", [str(core) for core in range(num_cores)], timings["core_id"], latency)
+        print_histograms("{} latency (cycles) by warp:".format(stage), "core.warp", ["{}.{}".format(core, warp) for core in range(num_cores) for warp in range(num_warps)], core_warps, latency)
+    print_ipc(timings, args.ticks_per_cycle, args.window)
+
+if __name__ == "__main__":
+    main()
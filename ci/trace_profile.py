@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+import trace_csv
+
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy is required for trace profiling")
+    sys.exit(1)
+
+# instruction mix classes, opcodes not listed here are integer ALU operations
+opcode_classes = [
+    ("branch", ["BEQ", "BNE", "BLT", "BGE", "BLTU", "BGEU", "JAL", "JALR"]),
+    ("load", ["LB", "LH", "LW", "LD", "LBU", "LHU", "LWU", "FLW", "FLD", "LR.W", "LR.D", "VL"]),
+    ("store", ["SB", "SH", "SW", "SD", "FSW", "FSD", "SC.W", "SC.D", "VS"]),
+    ("atomic", ["AMO"]),
+    ("muldiv", ["MUL", "DIV", "REM"]),
+    ("fpu", ["F"]),
+    ("csr", ["CSRR"]),
+    ("warp control", ["TMC", "WSPAWN", "SPLIT", "SPLIT.N", "JOIN", "BAR", "PRED", "PRED.N"]),
+    ("graphics", ["TEX", "RASTER", "OM"]),
+    ("system", ["ECALL", "EBREAK", "MRET", "SRET", "URET", "FENCE"]),
+]
+prefix_classes = ["atomic", "muldiv", "fpu", "csr"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Instruction trace hotspot and SIMT utilization profiler.')
+    parser.add_argument('-t', '--type', default='simx', help='log type (rtlsim or simx), ignored for npz/parquet traces')
+    parser.add_argument('-n', '--top', type=int, default=20, help='Number of rows of the PC and opcode profiles (0 for all)')
+    parser.add_argument('--threads', type=int, help='Number of lanes per warp (default: from the log CONFIGS or the widest tmask)')
+    parser.add_argument('trace', help='Input log file, or a trace converted with trace_csv.py --format npz/parquet')
+    return parser.parse_args()
+
+def classify_opcode(opcode):
+    for name, opcodes in opcode_classes:
+        if opcode in opcodes:
+            return name
+    for name, opcodes in opcode_classes:
+        if name in prefix_classes and opcode.startswith(opcodes[0]):
+            return name
+    return "alu"
+
+def load_trace(filename, log_type):
+    # numpy columns of a columnar trace, or of a log parsed in uuid order
+    if filename.endswith(".npz") or filename.endswith(".parquet"):
+        return trace_csv.load_columns(filename)
+    if log_type not in ["rtlsim", "simx"]:
+        print('Error: invalid log type')
+        sys.exit(1)
+    trace_csv.configs = trace_csv.load_config(filename)
+    opcodes = {}
+    entries = trace_csv.iter_entries(trace_csv.split_log_file(filename), log_type)
+    buffers = trace_csv.collect_columns(entries, opcodes, strings=False)
+    columns = {name: np.frombuffer(buffers[name], dtype=np.dtype(typecode)) for name, typecode in trace_csv.int_columns}
+    columns["opcode"] = np.frombuffer(buffers["opcode"], dtype=np.int32)
+    columns["opcode_dict"] = np.array(list(opcodes), dtype=str)
+    return columns
+
+def popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+def kernel_ids(columns):
+    # kernel (sublog) index of each row, traces converted before the kernel
+    # column existed are reported as a single kernel
+    if "kernel" not in columns:
+        print("Warning: the trace has no kernel column, convert it again with trace_csv.py to split its kernels")
+        return np.zeros(len(columns["uuid"]), dtype=np.int64)
+    return columns["kernel"].astype(np.int64)
+
+def group_profile(keys, active):
+    # (unique keys, first row, instruction count, active lane sum) of each key
+    values, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    lanes = np.bincount(inverse.ravel(), weights=active, minlength=len(values))
+    return values, first, counts, lanes
+
+def print_table(title, header, rows):
+    print()
+    print(title)
+    print("  ".join(header))
+    for row in rows:
+        print("  ".join(str(value).rjust(len(name)) for name, value in zip(header, row)))
+
+def profile(columns, num_threads, top):
+    num_instrs = len(columns["uuid"])
+    if num_instrs == 0:
+        print("empty trace")
+        return
+    active = popcount(columns["tmask"].astype(np.uint64)).astype(np.int64)
+    if num_threads is None:
+        num_threads = int(np.bitwise_or.reduce(columns["tmask"].astype(np.uint64))).bit_length()
+    opcode_names = columns["opcode_dict"]
+    # kernels without instructions (e.g. filtered out) get no mix row
+    kernel_values, kernels = np.unique(kernel_ids(columns), return_inverse=True)
+    kernels = kernels.ravel()
+    num_kernels = len(kernel_values)
+
+    def stats(counts, lanes):
+        percent = "{:.2f}%".format(100.0 * counts / num_instrs)
+        util = "{:.1f}%".format(100.0 * lanes / (counts * num_threads))
+        return percent, counts, "{:.2f}".format(lanes / counts), util
+
+    total_lanes = int(active.sum())
+    print("instructions: {}".format(num_instrs))
+    print("kernels: {}".format(num_kernels))
+    print("threads per warp: {}".format(num_threads))
+    print("active lanes: {:.2f} ({:.1f}% SIMT utilization)".format(total_lanes / num_instrs, 100.0 * total_lanes / (num_instrs * num_threads)))
+
+    # instruction mix per kernel
+    classes = [name for name, _ in opcode_classes] + ["alu"]
+    opcode_class = np.array([classes.index(classify_opcode(str(name))) for name in opcode_names], dtype=np.int64)
+    mix = np.bincount(kernels * len(classes) + opcode_class[columns["opcode"]], minlength=num_kernels * len(classes)).reshape(num_kernels, len(classes))
+    header = ["kernel", "instrs"] + ["{:>8}".format(name) for name in classes]
+    rows = []
+    for kernel in range(num_kernels):
+        kernel_instrs = int(mix[kernel].sum())
+        rows.append([int(kernel_values[kernel]), kernel_instrs] + ["{:.1f}%".format(100.0 * count / kernel_instrs) for count in mix[kernel]])
+    print_table("Instruction mix:", header, rows)
+
+    # flat profile by PC, hottest first
+    PCs, first, counts, lanes = group_profile(columns["PC"], active)
+    order = np.argsort(-counts, kind='stable')
+    if top:
+        order = order[:top]
+    rows = [stats(counts[i], lanes[i]) + (hex(int(PCs[i])), opcode_names[columns["opcode"][first[i]]]) for i in order]
+    print_table("PC profile:", ["  instrs%", "   count", "lanes", "  util", "PC        ", "opcode"], rows)
+
+    codes, _, counts, lanes = group_profile(columns["opcode"], active)
+    order = np.argsort(-counts, kind='stable')
+    if top:
+        order = order[:top]
+    rows = [stats(counts[i], lanes[i]) + (opcode_names[codes[i]],) for i in order]
+    print_table("Opcode profile:", ["  instrs%", "   count", "lanes", "  util", "opcode"], rows)
+
+    num_warps = int(columns["warp_id"].max()) + 1
+    core_warps, _, counts, lanes = group_profile(columns["core_id"].astype(np.int64) * num_warps + columns["warp_id"], active)
+    rows = [(core_warps[i] // num_warps, core_warps[i] % num_warps) + stats(counts[i], lanes[i]) for i in range(len(core_warps))]
+    print_table("Core/warp profile:", ["core", "warp", "  instrs%", "   count", "lanes", "  util"], rows)
+
+def main():
+    args = parse_args()
+    columns = load_trace(args.trace, args.type)
+    num_threads = args.threads
+    if num_threads is None and trace_csv.configs is not None:
+        num_threads = trace_csv.configs['num_threads']
+    profile(columns, num_threads, args.top)
+
+if __name__ == "__main__":
+    main()
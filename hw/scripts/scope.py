@@ -18,6 +18,13 @@ import argparse
 import xml.etree.ElementTree as ET
 import re
 import json
+import collections
+import hashlib
+import os
+import fnmatch
+
+CACHE_VERSION = 2
+DEFAULT_DEPTH = 256
 
 vl_int_re = re.compile(r"\d+'s*h([\da-fA-F]+)")
 
@@ -25,21 +32,46 @@ def parse_vl_int(text):
     str_hex = re.sub(vl_int_re, r'\1', text)
     return int(str_hex, 16)
 
-def source_loc(xml_doc, xml_loc):
+class DesignIndex:
+    # indexes of the design XML: typetable ids, file ids and cell locations,
+    # with memoized dtype widths
+    def __init__(self):
+        self.dtypes = {}
+        self.files = {}
+        self.cells = {}
+        self.widths = {}
+
+    def add_typetable(self, xml_typetable):
+        for xml_type in xml_typetable:
+            self.dtypes.setdefault(xml_type.get("id"), xml_type)
+
+    def add_file(self, xml_file):
+        self.files.setdefault(xml_file.get("id"), xml_file.get("filename"))
+
+    def add_cell(self, xml_cell):
+        self.cells.setdefault(xml_cell.get("loc"), xml_cell.get("hier"))
+
+def source_loc(design, xml_loc):
     loc = xml_loc.split(",")
     file_id = loc[0]
     start_line = loc[1]
     start_col = loc[2]
     end_line = loc[3]
     end_col = loc[4]
-    file = xml_doc.find(".//file/[@id='" + file_id + "']").get("filename")
+    file = design.files[file_id]
     return f"{file} ({start_line}:{start_col}-{end_line}:{end_col})"
 
-def parse_dtype_width(xml_doc, dtype_id):
-    xml_type = xml_doc.find(".//typetable/*[@id='" + dtype_id + "']")
+def parse_dtype_width(design, dtype_id):
+    width = design.widths.get(dtype_id)
+    if width is None:
+        width = design.widths[dtype_id] = resolve_dtype_width(design, dtype_id)
+    return width
+
+def resolve_dtype_width(design, dtype_id):
+    xml_type = design.dtypes[dtype_id]
     if xml_type.tag in ["packarraydtype", "unpackarraydtype"]:
         sub_dtype_id = xml_type.get("sub_dtype_id")
-        base_width = parse_dtype_width(xml_doc, sub_dtype_id)
+        base_width = parse_dtype_width(design, sub_dtype_id)
         const_iter = xml_type.iter("const")
         first_const = next(const_iter)
         second_const = next(const_iter)
@@ -50,25 +82,25 @@ def parse_dtype_width(xml_doc, dtype_id):
         width = 0
         for member in xml_type.iter("memberdtype"):
             sub_dtype_id = member.get("sub_dtype_id")
-            width = width + parse_dtype_width(xml_doc, sub_dtype_id)
+            width = width + parse_dtype_width(design, sub_dtype_id)
         return width
     elif xml_type.tag == "uniondtype":
         width = 0
         for member in xml_type.iter("memberdtype"):
             sub_dtype_id = member.get("sub_dtype_id")
-            width = max(width, parse_dtype_width(xml_doc, sub_dtype_id))
+            width = max(width, parse_dtype_width(design, sub_dtype_id))
         return width
     else:
         sub_dtype_id = xml_type.get("sub_dtype_id")
         if sub_dtype_id != None:
-            return parse_dtype_width(xml_doc, sub_dtype_id)
+            return parse_dtype_width(design, sub_dtype_id)
         left = xml_type.get("left")
         right = xml_type.get("right")
         if left != None and right != None:
             return int(left) - int(right) + 1
         return 1
 
-def parse_var_name(xml_doc, xml_node):
+def parse_var_name(design, xml_node):
     if xml_node.tag == "varref":
         return xml_node.get("name")
     elif xml_node.tag == "varxref":
@@ -76,13 +108,13 @@ def parse_var_name(xml_doc, xml_node):
         dotted = xml_node.get("dotted")
         return f"{dotted}.{name}"
     elif xml_node.tag == "arraysel":
-        return parse_arraysel_name(xml_doc, xml_node)
+        return parse_arraysel_name(design, xml_node)
     else:
-        raise ET.ParseError("invalid probe entry: tag=" + xml_node.tag + ", " + source_loc(xml_doc, xml_node.get("loc")))
+        raise ET.ParseError("invalid probe entry: tag=" + xml_node.tag + ", " + source_loc(design, xml_node.get("loc")))
     return name
 
-def parse_sel_field(xml_doc, dtype_id, offset, width):
-    xml_type = xml_doc.find(".//typetable/*[@id='" + dtype_id + "']")
+def parse_sel_field(design, dtype_id, offset, width):
+    xml_type = design.dtypes[dtype_id]
     name = xml_type.get("name")
     if xml_type.tag == "structdtype":
         bit_offset = 0
@@ -91,24 +123,24 @@ def parse_sel_field(xml_doc, dtype_id, offset, width):
         for member in members:
             sub_dtype_id = member.get("sub_dtype_id")
             member_name = member.get("name")
-            member_width = parse_dtype_width(xml_doc, sub_dtype_id)
+            member_width = parse_dtype_width(design, sub_dtype_id)
             if bit_offset <= offset < bit_offset + member_width:
                 if width != member_width and sub_dtype_id:
-                    sub_field = parse_sel_field(xml_doc, sub_dtype_id, offset - bit_offset, width)
+                    sub_field = parse_sel_field(design, sub_dtype_id, offset - bit_offset, width)
                     return f".{member_name}{sub_field}"
                 else:
                     return f".{member_name}"
             bit_offset += member_width
-        raise ET.ParseError("invalid probe entry: " + source_loc(xml_doc, xml_type.get("loc")))
+        raise ET.ParseError("invalid probe entry: " + source_loc(design, xml_type.get("loc")))
     elif xml_type.tag in ["packarraydtype", "unpackarraydtype"]:
         sub_dtype_id = xml_type.get("sub_dtype_id")
-        base_width = parse_dtype_width(xml_doc, sub_dtype_id)
+        base_width = parse_dtype_width(design, sub_dtype_id)
         if width > base_width:
             return ""
         array_index = offset // base_width
         sub_offset = offset % base_width
         array_sel_name = f"_{array_index}" # array indexing is not supported in VCD
-        sub_field = parse_sel_field(xml_doc, sub_dtype_id, sub_offset, width)
+        sub_field = parse_sel_field(design, sub_dtype_id, sub_offset, width)
         return f"{array_sel_name}{sub_field}"
     elif xml_type.tag == "basicdtype":
         if width == 1:
@@ -116,129 +148,331 @@ def parse_sel_field(xml_doc, dtype_id, offset, width):
         end = width - 1 + offset
         return F"[{end}:{offset}]"
     else:
-        raise ET.ParseError("invalid probe entry: tag=" + xml_type.tag + ", " + source_loc(xml_doc, xml_type.get("loc")))
+        raise ET.ParseError("invalid probe entry: tag=" + xml_type.tag + ", " + source_loc(design, xml_type.get("loc")))
     return None
 
-def parse_sel_name(xml_doc, xml_node):
+def parse_sel_name(design, xml_node):
     first_child = xml_node.find("*")
-    name = parse_var_name(xml_doc, first_child)
+    name = parse_var_name(design, first_child)
     dtype_id = first_child.get("dtype_id")
     const_iter = xml_node.iter("const")
     first_const = next(const_iter)
     second_const = next(const_iter)
     offset = parse_vl_int(first_const.get("name"))
     width = parse_vl_int(second_const.get("name"))
-    return name + parse_sel_field(xml_doc, dtype_id, offset, width)
+    return name + parse_sel_field(design, dtype_id, offset, width)
 
-def parse_arraysel_name(xml_doc, xml_node):
+def parse_arraysel_name(design, xml_node):
     if xml_node.tag == "arraysel":
         first_child = xml_node.find("*")
-        name = parse_arraysel_name(xml_doc, first_child)
+        name = parse_arraysel_name(design, first_child)
         const_iter = xml_node.iter("const")
         first_const = next(const_iter)
         offset = parse_vl_int(first_const.get("name"))
         name = f"{name}_{offset}" # array indexing is not supported in VCD
     else:
-        name = parse_var_name(xml_doc, xml_node)
+        name = parse_var_name(design, xml_node)
     return name
 
-def parse_vl_port(xml_doc, xml_node, signals):
+def parse_vl_port(design, xml_node, signals):
     total_width = 0
     if xml_node.tag == "concat":
         child_nodes = xml_node.findall("*")
         for xml_child in child_nodes:
-            total_width = total_width + parse_vl_port(xml_doc, xml_child, signals)
+            total_width = total_width + parse_vl_port(design, xml_child, signals)
     elif xml_node.tag in ["varref", "varxref"]:
-        name = parse_var_name(xml_doc, xml_node)
+        name = parse_var_name(design, xml_node)
         dtype_id = xml_node.get("dtype_id")
-        signal_width = parse_dtype_width(xml_doc, dtype_id)
+        signal_width = parse_dtype_width(design, dtype_id)
         signals.append([name, signal_width])
         total_width = total_width + signal_width
     elif xml_node.tag == "sel":
-        name = parse_sel_name(xml_doc, xml_node)
+        name = parse_sel_name(design, xml_node)
         dtype_id = xml_node.get("dtype_id")
-        signal_width = parse_dtype_width(xml_doc, dtype_id)
+        signal_width = parse_dtype_width(design, dtype_id)
         signals.append([name, signal_width])
         total_width = total_width + signal_width
     elif xml_node.tag == "arraysel":
-        name = parse_arraysel_name(xml_doc, xml_node)
+        name = parse_arraysel_name(design, xml_node)
         dtype_id = xml_node.get("dtype_id")
-        signal_width = parse_dtype_width(xml_doc, dtype_id)
+        signal_width = parse_dtype_width(design, dtype_id)
         signals.append([name, signal_width])
         total_width = total_width + signal_width
     else:
-        raise ET.ParseError("invalid probe entry: tag=" + xml_node.tag + ", " + source_loc(xml_doc, xml_node.get("loc")))
+        raise ET.ParseError("invalid probe entry: tag=" + xml_node.tag + ", " + source_loc(design, xml_node.get("loc")))
     # Check for duplicate signal names
-    signal_names = [signal[0] for signal in signals]
-    duplicates = set([name for name in signal_names if signal_names.count(name) > 1])
+    signal_counts = collections.Counter(signal[0] for signal in signals)
+    duplicates = set([name for name, count in signal_counts.items() if count > 1])
     if len(duplicates) > 0:
         raise ET.ParseError("duplicate signal names: " + ", ".join(duplicates))
     return total_width
 
-def parse_xml(filename, max_taps):
+def parse_tap_module(xml_module):
+    scope_id = parse_vl_int(xml_module.find(".//var/[@name='SCOPE_ID']/const").get("name"))
+    xtriggerw = parse_vl_int(xml_module.find(".//var/[@name='XTRIGGERW']/const").get("name"))
+    htriggerw = parse_vl_int(xml_module.find(".//var/[@name='HTRIGGERW']/const").get("name"))
+    probew = parse_vl_int(xml_module.find(".//var/[@name='PROBEW']/const").get("name"))
+    xml_depth = xml_module.find(".//var/[@name='DEPTH']/const")
+    depth = parse_vl_int(xml_depth.get("name")) if xml_depth is not None else DEFAULT_DEPTH
+    return [scope_id, xtriggerw, htriggerw, probew, depth]
+
+def load_xml(filename):
     xml_doc = ET.parse(filename)
+    design = DesignIndex()
+    for xml_typetable in xml_doc.iter("typetable"):
+        design.add_typetable(xml_typetable)
+    for xml_file in xml_doc.iter("file"):
+        design.add_file(xml_file)
+    for xml_cell in xml_doc.iter("cell"):
+        design.add_cell(xml_cell)
     modules = {}
     xml_modules = xml_doc.findall(".//module/[@origName='VX_scope_tap']")
     for xml_module in xml_modules:
-        scope_id = parse_vl_int(xml_module.find(".//var/[@name='SCOPE_ID']/const").get("name"))
-        xtriggerw = parse_vl_int(xml_module.find(".//var/[@name='XTRIGGERW']/const").get("name"))
-        htriggerw = parse_vl_int(xml_module.find(".//var/[@name='HTRIGGERW']/const").get("name"))
-        probew = parse_vl_int(xml_module.find(".//var/[@name='PROBEW']/const").get("name"))
         module_name = xml_module.get("name")
-        modules[module_name] = [scope_id, xtriggerw, htriggerw, probew]
+        modules[module_name] = parse_tap_module(xml_module)
+    return design, modules, xml_doc.iter("instance")
+
+def is_tap_instance(xml_instance):
+    # Verilator names the specializations of VX_scope_tap "VX_scope_tap__<suffix>"
+    defName = xml_instance.get("defName", "")
+    return defName == "VX_scope_tap" or defName.startswith("VX_scope_tap__")
+
+def stream_xml(filename):
+    # iterparse the design XML, only keeping the typetable, the file and cell
+    # locations, the VX_scope_tap parameters and the tap instances
+    design = DesignIndex()
+    modules = {}
+    xml_instances = []
+    for _, xml_node in ET.iterparse(filename, events=("end",)):
+        tag = xml_node.tag
+        if tag == "instance":
+            if is_tap_instance(xml_node):
+                xml_instances.append(xml_node)
+        elif tag == "module":
+            if xml_node.get("origName") == "VX_scope_tap":
+                modules[xml_node.get("name")] = parse_tap_module(xml_node)
+            xml_node.clear()
+        elif tag == "typetable":
+            design.add_typetable(xml_node)
+        elif tag == "file":
+            design.add_file(xml_node)
+        elif tag == "cell":
+            design.add_cell(xml_node)
+            xml_node.clear()
+    return design, modules, xml_instances
+
+def xml_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_node(digest, xml_node):
+    # hash an XML subtree, leaving out the source locations
+    digest.update(xml_node.tag.encode())
+    for name, value in sorted(xml_node.attrib.items()):
+        if name != "loc":
+            digest.update(f"\0{name}={value}".encode())
+    digest.update(b"(")
+    for xml_child in xml_node:
+        hash_node(digest, xml_child)
+    digest.update(b")")
+
+def tap_key(design, module, path, xml_instance):
+    # content hash of a tap instance: its parameters, path, port expressions
+    # and the type definitions its signals resolve through
+    digest = hashlib.sha256()
+    digest.update(json.dumps([module, path]).encode())
+    hash_node(digest, xml_instance)
+    pending = [xml_node.get("dtype_id") for xml_node in xml_instance.iter() if xml_node.get("dtype_id")]
+    dtype_ids = set()
+    while pending:
+        dtype_id = pending.pop()
+        if dtype_id in dtype_ids or dtype_id not in design.dtypes:
+            continue
+        dtype_ids.add(dtype_id)
+        pending += [xml_node.get("sub_dtype_id") for xml_node in design.dtypes[dtype_id].iter() if xml_node.get("sub_dtype_id")]
+    for dtype_id in sorted(dtype_ids):
+        hash_node(digest, design.dtypes[dtype_id])
+    return digest.hexdigest()
+
+def load_cache(filename):
+    if os.path.exists(filename):
+        with open(filename, "r") as f:
+            cache = json.load(f)
+        if cache.get("version") == CACHE_VERSION:
+            return cache
+    return {"version":CACHE_VERSION, "xml":None, "taps":{}}
+
+def save_cache(filename, cache):
+    with open(filename, "w") as f:
+        json.dump(cache, f, ensure_ascii=False)
+
+def resolve_tap(design, module, xml_instance):
+    xtriggers = []
+    htriggers = []
+    probes = []
+
+    if module[1] > 0:
+        w = parse_vl_port(design, xml_instance.find(".//port/[@name='xtriggers']/*"), xtriggers)
+        if w != module[1]:
+            raise ET.ParseError("invalid xtriggers width: actual=" + str(w) + ", expected=" + str(module[1]))
+
+    if module[2] > 0:
+        w = parse_vl_port(design, xml_instance.find(".//port/[@name='htriggers']/*"), htriggers)
+        if w != module[2]:
+            raise ET.ParseError("invalid htriggers width: actual=" + str(w) + ", expected=" + str(module[2]))
+
+    w = parse_vl_port(design, xml_instance.find(".//port/[@name='probes']/*"), probes)
+    if w != module[3]:
+        raise ET.ParseError("invalid probes width: actual=" + str(w) + ", expected=" + str(module[3]))
+
+    signals = probes
+    for xtrigger in xtriggers:
+        signals.append(xtrigger)
+    for htrigger in htriggers:
+        signals.append(htrigger)
+
+    loc = xml_instance.get("loc")
+    hier = design.cells[loc]
+    path = hier.rsplit(".", 1)[0]
+    return {"id":module[0],
+            "width":module[1] + module[2] + module[3],
+            "signals":signals,
+            "path":path,
+            "depth":module[4]}
+
+def parse_xml(filename, max_taps, stream=False, cache=None):
+    # with a cache, an unchanged XML reuses the full tap list of the last
+    # complete run, otherwise taps are looked up by content hash
+    if cache is not None:
+        digest = xml_digest(filename)
+        if cache["xml"] is not None and cache["xml"]["sha256"] == digest:
+            taps = [cache["taps"][key] for key in cache["xml"]["keys"]]
+            return {"version":"0.1.0", "taps":taps if max_taps == -1 else taps[:max_taps]}
+
+    if stream:
+        design, modules, xml_instances = stream_xml(filename)
+    else:
+        design, modules, xml_instances = load_xml(filename)
 
     taps = []
-    xml_instances = xml_doc.iter("instance")
+    keys = []
+    cached_taps = {}
+    complete = True
     for xml_instance in xml_instances:
         if (max_taps != -1 and len(taps) >= max_taps):
+            complete = False
             break
         defName = xml_instance.get("defName")
         module = modules.get(defName)
         if module is None:
             continue
 
-        xtriggers = []
-        htriggers = []
-        probes = []
-
-        if module[1] > 0:
-            w = parse_vl_port(xml_doc, xml_instance.find(".//port/[@name='xtriggers']/*"), xtriggers)
-            if w != module[1]:
-                raise ET.ParseError("invalid xtriggers width: actual=" + str(w) + ", expected=" + str(module[1]))
-
-        if module[2] > 0:
-            w = parse_vl_port(xml_doc, xml_instance.find(".//port/[@name='htriggers']/*"), htriggers)
-            if w != module[2]:
-                raise ET.ParseError("invalid htriggers width: actual=" + str(w) + ", expected=" + str(module[2]))
-
-        w = parse_vl_port(xml_doc, xml_instance.find(".//port/[@name='probes']/*"), probes)
-        if w != module[3]:
-            raise ET.ParseError("invalid probes width: actual=" + str(w) + ", expected=" + str(module[3]))
-
-        signals = probes
-        for xtrigger in xtriggers:
-            signals.append(xtrigger)
-        for htrigger in htriggers:
-            signals.append(htrigger)
-
-        loc = xml_instance.get("loc")
-        hier = xml_doc.find(".//cell/[@loc='" + loc + "']").get("hier")
-        path = hier.rsplit(".", 1)[0]
-        taps.append({"id":module[0],
-                     "width":module[1] + module[2] + module[3],
-                     "signals":signals,
-                     "path":path})
+        if cache is not None:
+            path = design.cells[xml_instance.get("loc")].rsplit(".", 1)[0]
+            key = tap_key(design, module, path, xml_instance)
+            tap = cache["taps"].get(key)
+            if tap is None:
+                tap = resolve_tap(design, module, xml_instance)
+            cached_taps[key] = tap
+            keys.append(key)
+            taps.append(tap)
+        else:
+            taps.append(resolve_tap(design, module, xml_instance))
+
+    if cache is not None:
+        if complete:
+            cache["xml"] = {"sha256":digest, "keys":keys}
+            cache["taps"] = cached_taps
+        else:
+            cache["xml"] = None
+            cache["taps"].update(cached_taps)
 
     return {"version":"0.1.0", "taps":taps}
 
+def match_pattern(patterns, name, regex):
+    # index of the first pattern matching the name, or -1
+    for i, pattern in enumerate(patterns):
+        if re.fullmatch(pattern, name) if regex else fnmatch.fnmatchcase(name, pattern):
+            return i
+    return -1
+
+def select_signals(scope_taps, args):
+    # the taps layout is fixed by the RTL, so signals outside the selection are
+    # only marked unselected, and taps left without any selected signal dropped
+    taps = []
+    candidates = []
+    for tap in scope_taps["taps"]:
+        if args.tap and match_pattern(args.tap, tap["path"], args.regex) == -1:
+            continue
+        if match_pattern(args.exclude_tap, tap["path"], args.regex) != -1:
+            continue
+        for index, signal in enumerate(tap["signals"]):
+            if match_pattern(args.exclude_signal, signal[0], args.regex) != -1:
+                continue
+            priority = match_pattern(args.signal, signal[0], args.regex)
+            if args.signal and priority == -1:
+                continue
+            candidates.append((priority, len(taps), index))
+        taps.append(tap)
+
+    # the highest priority signals first, in manifest order, within the budget
+    selected = set()
+    total_width = 0
+    for priority, tap_index, index in sorted(candidates):
+        width = taps[tap_index]["signals"][index][1]
+        if args.max_width is not None and total_width + width > args.max_width:
+            continue
+        selected.add((tap_index, index))
+        total_width += width
+
+    result = []
+    for tap_index, tap in enumerate(taps):
+        signals = [[signal[0], signal[1], (tap_index, index) in selected] for index, signal in enumerate(tap["signals"])]
+        if any(signal[2] for signal in signals):
+            result.append(dict(tap, signals=signals))
+    return {"version":scope_taps["version"], "taps":result}
+
+def capture_depth(tap):
+    # the deepest power of two buffer of the selected signals fitting the tap's
+    # trace buffer memory, i.e. the depth a tap probing only them would get
+    selected_width = sum(signal[1] for signal in tap["signals"] if len(signal) < 3 or signal[2])
+    depth = tap["depth"] * tap["width"] // selected_width
+    return selected_width, 1 << (depth.bit_length() - 1)
+
+def print_depths(scope_taps):
+    total_width = 0
+    print("   id  selected   width   depth  capture depth  path")
+    for tap in scope_taps["taps"]:
+        selected_width, depth = capture_depth(tap)
+        total_width += selected_width
+        print("{:>5}  {:>8}  {:>6}  {:>6}  {:>13}  {}".format(tap["id"], selected_width, tap["width"], tap["depth"], depth, tap["path"]))
+    print("selected {} bits in {} taps".format(total_width, len(scope_taps["taps"])))
+
 def main():
     parser = argparse.ArgumentParser(description='Scope headers generator.')
     parser.add_argument('-o', nargs='?', default='scope.json', metavar='o', help='Output JSON manifest')
     parser.add_argument('-n', nargs='?', default=-1, metavar='n', type=int, help='Maximum number of taps to read')
+    parser.add_argument('-s', '--stream', action='store_true', help='Stream the design XML, only keeping the scope taps in memory')
+    parser.add_argument('-c', '--cache', help='Cache file of the resolved taps, reused across runs')
+    parser.add_argument('--tap', action='append', default=[], metavar='PATTERN', help='Only export the taps whose path matches')
+    parser.add_argument('--exclude-tap', action='append', default=[], metavar='PATTERN', help='Drop the taps whose path matches')
+    parser.add_argument('--signal', action='append', default=[], metavar='PATTERN', help='Only select the matching signals, by decreasing priority')
+    parser.add_argument('--exclude-signal', action='append', default=[], metavar='PATTERN', help='Do not select the matching signals')
+    parser.add_argument('-E', '--regex', action='store_true', help='Patterns are regular expressions instead of globs')
+    parser.add_argument('--max-width', type=int, help='Budget of the total selected signals width in bits')
     parser.add_argument('xml', help='Design XML descriptor file')
     args = parser.parse_args()
     #print("args=", args)
-    scope_taps = parse_xml(args.xml, args.n)
+    cache = load_cache(args.cache) if args.cache else None
+    scope_taps = parse_xml(args.xml, args.n, args.stream, cache)
+    if cache is not None:
+        save_cache(args.cache, cache)
+    if args.tap or args.exclude_tap or args.signal or args.exclude_signal or args.max_width is not None:
+        scope_taps = select_signals(scope_taps, args)
+        print_depths(scope_taps)
     with open(args.o, "w") as f:
         json.dump(scope_taps, f, ensure_ascii=False, indent=4)
 
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import argparse
+import json
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy is required for decoding scope captures")
+    sys.exit(1)
+
+# must match runtime/common/scope.cpp
+RAW_MAGIC = b"VXSCOPE1"
+MAX_DELAY_CYCLES = 10000
+
+raw_header = struct.Struct("<8sII")
+raw_tap_header = struct.Struct("<IIQ")
+
+# samples and clock cycles per block of VCD output
+BLOCK_SIZE = 1 << 16
+
+# ASCII digits of 0000-9999
+DIGITS4 = np.array([list(b"%04d" % i) for i in range(10000)], dtype=np.uint8)
+
+def load_raw(filename):
+    # {tap id: (width, sample cycle times, sample data words)}
+    taps = {}
+    with open(filename, 'rb') as f:
+        magic, num_taps, _ = raw_header.unpack(f.read(raw_header.size))
+        if magic != RAW_MAGIC:
+            raise ValueError("invalid raw capture file: " + filename)
+        for _ in range(num_taps):
+            id, width, samples = raw_tap_header.unpack(f.read(raw_tap_header.size))
+            num_words = (width + 63) // 64
+            times = np.fromfile(f, dtype='<u8', count=samples)
+            words = np.fromfile(f, dtype='<u8', count=samples * num_words).reshape(samples, num_words)
+            taps[id] = (width, times, words)
+    return taps
+
+def signal_layout(tap):
+    # (name, width, bit offset, selected) of each signal, the runtime fills
+    # the signals from the last one up, starting at the sample's bit 0
+    layout = []
+    offset = tap["width"]
+    for signal in tap["signals"]:
+        offset -= signal[1]
+        layout.append((signal[0], signal[1], offset, len(signal) < 3 or signal[2]))
+    return layout
+
+def sample_bits(words):
+    # [samples, bits] array of the sample bits, LSB first
+    return np.unpackbits(words.astype('<u8').view(np.uint8).reshape(len(words), words.shape[1] * 8), axis=1, bitorder='little')
+
+def join_rows(parts, num_rows):
+    # concatenate, row by row, the bytes of each (bytes, mask) part: bytes is a
+    # constant string or a [rows, N] array, and mask a [rows, N] array of the
+    # bytes to keep, or the number of leading bytes to keep (scalar or per row)
+    arrays = []
+    masks = []
+    for data, mask in parts:
+        if isinstance(data, bytes):
+            data = np.broadcast_to(np.frombuffer(data, dtype=np.uint8), (num_rows, len(data)))
+        if np.ndim(mask) < 2:
+            mask = np.arange(data.shape[1]) < np.broadcast_to(np.asarray(mask), (num_rows,))[:, None]
+        arrays.append(data)
+        masks.append(mask)
+    mask = np.hstack(masks)
+    blob = np.hstack(arrays)[mask]
+    offsets = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(mask.sum(axis=1), out=offsets[1:])
+    return blob, offsets
+
+def decimal_digits(values, num_digits):
+    # [n, num_digits] ASCII digit array of the values, 4 digits at a time
+    chunks = []
+    for _ in range((num_digits + 3) // 4):
+        chunks.insert(0, DIGITS4[values % 10000])
+        values = values // 10000
+    return np.hstack(chunks)[:, -num_digits:]
+
+def clock_text(cycles, value_lo, value_hi):
+    # "#<2t>\nb<lo> 0\n#<2t+1>\nb<hi> 0\n" for each cycle t of a sorted array:
+    # fixed size rows for each run of times with the same number of digits
+    times = cycles.astype(np.int64) * 2
+    bounds = np.searchsorted(times, 10 ** np.arange(1, 19, dtype=np.int64))
+    blobs = []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    for num_digits, (first, last) in enumerate(zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(times)]))), 1):
+        if first == last:
+            continue
+        even = decimal_digits(times[first:last], num_digits)
+        # 2t is even, so 2t+1 only differs in its last digit
+        odd = even.copy()
+        odd[:, -1] += 1
+        num_rows = last - first
+        rows = np.hstack([np.broadcast_to(np.frombuffer(b"#", dtype=np.uint8), (num_rows, 1)), even,
+                          np.broadcast_to(np.frombuffer(b"\nb" + value_lo + b" 0\n#", dtype=np.uint8), (num_rows, 7)), odd,
+                          np.broadcast_to(np.frombuffer(b"\nb" + value_hi + b" 0\n", dtype=np.uint8), (num_rows, 6))])
+        blobs.append(rows.ravel())
+        offsets.append(offsets[-1][-1] + (np.arange(1, last - first + 1, dtype=np.int64) * (2 * num_digits + 14)))
+    if not blobs:
+        return np.zeros(0, dtype=np.uint8), offsets[0]
+    return np.concatenate(blobs), np.concatenate(offsets)
+
+def tap_text(tap, layout, first_id, bits):
+    # value change lines of each sample of a tap, the first sample lists all
+    # signals, written from the last signal up like the runtime does
+    num_samples = len(bits)
+    parts = []
+    for index, (name, width, offset, selected) in reversed(list(enumerate(layout))):
+        if not selected:
+            continue
+        values = bits[:, offset:offset + width][:, ::-1]
+        changed = np.ones(num_samples, dtype=bool)
+        changed[1:] = np.any(values[1:] != values[:-1], axis=1)
+        suffix = " {}\n".format(first_id + index).encode()
+        parts += [(b"b", changed), (values + ord('0'), changed * width), (suffix, changed * len(suffix))]
+    if not parts:
+        return np.zeros(0, dtype=np.uint8), np.zeros(num_samples + 1, dtype=np.int64)
+    return join_rows(parts, num_samples)
+
+def gather(blob, starts, lengths):
+    # concatenate the blob segments [start, start + length)
+    ends = np.cumsum(lengths)
+    index = np.arange(ends[-1] if len(ends) else 0, dtype=np.int64)
+    index += np.repeat(starts - (ends - lengths), lengths)
+    return blob[index]
+
+def write_header(f, manifest, signal_ids):
+    f.write(b"$version Generated by Vortex Scope Analyzer $end\n")
+    f.write(b"$timescale 1 ns $end\n")
+    f.write(b"$scope module TOP $end\n")
+    f.write(b" $var wire 1 0 clk $end\n")
+    # module tree of the tap paths, in manifest order
+    tree = {}
+    for tap in manifest["taps"]:
+        node = tree
+        for token in tap["path"].split('.'):
+            node = node.setdefault(token, {})
+        node.setdefault(None, []).append(tap)
+
+    def dump_module(name, node, indentation):
+        indent = ' ' * indentation
+        f.write("{}$scope module {} $end\n".format(indent, name).encode())
+        for tap in node.get(None, []):
+            first_id = signal_ids[tap["id"]]
+            for index, (signal, width, _, selected) in enumerate(signal_layout(tap)):
+                if selected:
+                    f.write("{} $var wire {} {} {} $end\n".format(indent, width, first_id + index, signal).encode())
+        for child, child_node in node.items():
+            if child is not None:
+                dump_module(child, child_node, indentation + 1)
+        f.write("{}$upscope $end\n".format(indent).encode())
+
+    for name, node in tree.items():
+        dump_module(name, node, 1)
+    f.write(b"$upscope $end\n")
+    f.write(b"enddefinitions $end\n")
+
+def write_vcd(filename, manifest, capture):
+    # signal ids are numbered from 1 across all taps of the manifest
+    signal_ids = {}
+    next_id = 1
+    for tap in manifest["taps"]:
+        signal_ids[tap["id"]] = next_id
+        next_id += len(tap["signals"])
+
+    # value change text of all samples, and their time and position in it
+    blobs = []
+    times = []
+    tap_order = []
+    starts = []
+    lengths = []
+    base = 0
+    for index, tap in enumerate(manifest["taps"]):
+        if tap["id"] not in capture:
+            continue
+        width, tap_times, words = capture[tap["id"]]
+        if width != tap["width"]:
+            raise ValueError("invalid tap #{} width, actual={}, expected={}".format(tap["id"], width, tap["width"]))
+        if len(tap_times) == 0:
+            continue
+        blob, offsets = tap_text(tap, signal_layout(tap), signal_ids[tap["id"]], sample_bits(words))
+        blobs.append(blob)
+        times.append(tap_times)
+        tap_order.append(np.full(len(tap_times), index))
+        starts.append(offsets[:-1] + base)
+        lengths.append(np.diff(offsets))
+        base += len(blob)
+
+    with open(filename, 'wb') as f:
+        write_header(f, manifest, signal_ids)
+        if not times:
+            return 0
+        blob = np.concatenate(blobs)
+        times = np.concatenate(times)
+        # the earliest sample first, taps in manifest order on ties
+        order = np.lexsort((np.concatenate(tap_order), times))
+        times = times[order]
+        starts = np.concatenate(starts)[order]
+        lengths = np.concatenate(lengths)[order]
+
+        # clock cycles before each sample, long idle gaps are marked unknown
+        prev_times = np.concatenate(([0], times[:-1])).astype(np.uint64)
+        gaps = (times - prev_times) > MAX_DELAY_CYCLES
+        clock_starts = np.where(gaps, times - MAX_DELAY_CYCLES, prev_times)
+        costs = np.cumsum((times - clock_starts).astype(np.int64) + 1)
+        bounds = np.unique(np.searchsorted(costs, np.arange(BLOCK_SIZE, costs[-1], BLOCK_SIZE)))
+        for first, last in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(times)]))):
+            rows = slice(first, last)
+            gap_text, gap_offsets = clock_text(prev_times[rows], b"x", b"x")
+            gap_lengths = np.diff(gap_offsets) * gaps[rows]
+            cycle_counts = (times[rows] - clock_starts[rows]).astype(np.int64)
+            cycle_ends = np.cumsum(cycle_counts)
+            cycles = np.arange(cycle_ends[-1], dtype=np.int64) + np.repeat(clock_starts[rows].astype(np.int64) - (cycle_ends - cycle_counts), cycle_counts)
+            cycle_text, cycle_offsets = clock_text(cycles, b"0", b"1")
+            cycle_starts = cycle_offsets[cycle_ends - cycle_counts]
+            cycle_lengths = cycle_offsets[cycle_ends] - cycle_starts
+            # interleave the gap, clock and sample segments of each row
+            segments = np.concatenate((gap_text, cycle_text, blob))
+            seg_starts = np.stack((gap_offsets[:-1], cycle_starts + len(gap_text), starts[rows] + len(gap_text) + len(cycle_text)), axis=1).ravel()
+            seg_lengths = np.stack((gap_lengths, cycle_lengths, lengths[rows]), axis=1).ravel()
+            f.write(gather(segments, seg_starts, seg_lengths).tobytes())
+        last_text, _ = clock_text(times[-1:], b"0", b"1")
+        f.write(last_text.tobytes())
+        return int(times[-1]) + 1
+
+def write_npz(filename, manifest, capture):
+    # per tap sample times, and per signal values: uint64 up to 64 bits,
+    # little-endian bytes rows for wider signals
+    columns = {}
+    for tap in manifest["taps"]:
+        if tap["id"] not in capture:
+            continue
+        _, tap_times, words = capture[tap["id"]]
+        prefix = "tap{}.".format(tap["id"])
+        columns[prefix + "time"] = tap_times
+        bits = sample_bits(words)
+        for name, width, offset, selected in signal_layout(tap):
+            if not selected:
+                continue
+            packed = np.packbits(bits[:, offset:offset + width], axis=1, bitorder='little')
+            if width <= 64:
+                packed = np.pad(packed, ((0, 0), (0, 8 - packed.shape[1]))).view('<u8').ravel()
+            columns[prefix + name] = packed
+    np.savez(filename, **columns)
+
+def main():
+    parser = argparse.ArgumentParser(description='Scope raw capture decoder.')
+    parser.add_argument('-j', '--json', default='scope.json', help='Scope JSON manifest')
+    parser.add_argument('-o', '--output', default='scope.vcd', help='Output VCD trace, or .npz columnar trace')
+    parser.add_argument('raw', help='Raw capture file dumped with SCOPE_RAW_PATH')
+    args = parser.parse_args()
+    with open(args.json, "r") as f:
+        manifest = json.load(f)
+    capture = load_raw(args.raw)
+    if args.output.endswith(".npz"):
+        write_npz(args.output, manifest, capture)
+    else:
+        cycles = write_vcd(args.output, manifest, capture)
+        print("trace dump done! - {} cycles".format(cycles))
+
+if __name__ == '__main__':
+    main()
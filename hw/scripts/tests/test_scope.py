@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Regression tests of scope.py. data/design.xml is a small synthetic Verilator
+# design with six scope taps, data/design.json the manifest the original
+# scope.py generated for it.
+
+import fnmatch
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DESIGN_XML = os.path.join(DATA_DIR, "design.xml")
+
+sys.path.insert(0, SCRIPTS_DIR)
+import scope
+
+def load_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def without_depth(manifest):
+    # the tap depths were added after the baseline manifest
+    return dict(manifest, taps=[{key: value for key, value in tap.items() if key != "depth"} for tap in manifest["taps"]])
+
+class ScopeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def tmp_file(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def run_scope(self, *args, xml=DESIGN_XML):
+        output = self.tmp_file("scope.json")
+        command = [sys.executable, os.path.join(SCRIPTS_DIR, "scope.py"), "-o", output, *args, xml]
+        stdout = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode()
+        return load_json(output), stdout
+
+    def test_matches_baseline(self):
+        manifest, _ = self.run_scope()
+        self.assertEqual(without_depth(manifest), load_json(os.path.join(DATA_DIR, "design.json")))
+        self.assertEqual({tap["depth"] for tap in manifest["taps"]}, {scope.DEFAULT_DEPTH})
+
+    def test_stream(self):
+        expected, _ = self.run_scope()
+        for args in (["--stream"], ["--stream", "-n", "2"]):
+            with self.subTest(args=args):
+                manifest, _ = self.run_scope(*args)
+                self.assertEqual(manifest["taps"], expected["taps"][:2] if "-n" in args else expected["taps"])
+
+    def test_cache(self):
+        expected, _ = self.run_scope()
+        cache_file = self.tmp_file("scope.cache")
+        for run in ("cold", "warm"):
+            with self.subTest(run=run):
+                manifest, _ = self.run_scope("--cache", cache_file)
+                self.assertEqual(manifest, expected)
+                self.assertEqual(len(scope.load_cache(cache_file)["taps"]), len(expected["taps"]))
+        manifest, _ = self.run_scope("--cache", cache_file, "-n", "2")
+        self.assertEqual(manifest["taps"], expected["taps"][:2])
+
+    def test_cache_invalidation(self):
+        # only the edited tap is resolved again, the others come from the cache
+        with open(DESIGN_XML) as f:
+            xml_text = f.read()
+        self.assertEqual(xml_text.count('name="sig_0p_0"'), 1)
+        xml = self.tmp_file("design.xml")
+        with open(xml, "w") as f:
+            f.write(xml_text.replace('name="sig_0p_0"', 'name="sig_0p_renamed"'))
+        expected, _ = self.run_scope(xml=xml)
+        self.assertNotEqual(expected, load_json(os.path.join(DATA_DIR, "design.json")))
+
+        cache = scope.load_cache(self.tmp_file("scope.cache"))
+        scope.parse_xml(DESIGN_XML, 3, cache=cache)
+        self.assertIsNone(cache["xml"])
+        scope.parse_xml(DESIGN_XML, -1, cache=cache)
+        self.assertIsNotNone(cache["xml"])
+        with mock.patch.object(scope, "resolve_tap", wraps=scope.resolve_tap) as resolve_tap:
+            self.assertEqual(scope.parse_xml(xml, -1, cache=cache), expected)
+            self.assertEqual(resolve_tap.call_count, 1)
+            self.assertEqual(scope.parse_xml(xml, -1, stream=True, cache=cache), expected)
+            self.assertEqual(resolve_tap.call_count, 1)
+        cache["version"] = scope.CACHE_VERSION - 1
+        scope.save_cache(self.tmp_file("scope.cache"), cache)
+        self.assertEqual(scope.load_cache(self.tmp_file("scope.cache"))["taps"], {})
+
+    def test_tap_filter(self):
+        expected, _ = self.run_scope()
+        manifest, stdout = self.run_scope("--tap", "*.core1.*", "--tap", "*.core4.*")
+        taps = [tap for tap in expected["taps"] if tap["path"] in ("TOP.top.core1.unit", "TOP.top.core4.unit")]
+        self.assertEqual(len(taps), 2)
+        self.assertEqual(manifest["taps"], [dict(tap, signals=[signal + [True] for signal in tap["signals"]]) for tap in taps])
+        self.assertIn("selected {} bits in 2 taps".format(sum(tap["width"] for tap in taps)), stdout)
+
+    def test_signal_budget(self):
+        # selected signals match the patterns and fit the budget, and every
+        # matching signal left out would overflow it
+        manifest, stdout = self.run_scope("--signal", "sig_*", "--signal", "ar_*", "--exclude-signal", "sig_1*", "--max-width", "100")
+        signals = [signal for tap in manifest["taps"] for signal in tap["signals"]]
+        selected = [signal for signal in signals if signal[2]]
+        total_width = sum(signal[1] for signal in selected)
+        self.assertTrue(selected)
+        self.assertLessEqual(total_width, 100)
+        for name, width, is_selected in signals:
+            matched = (fnmatch.fnmatchcase(name, "sig_*") or fnmatch.fnmatchcase(name, "ar_*")) and not fnmatch.fnmatchcase(name, "sig_1*")
+            self.assertTrue(matched or not is_selected, name)
+            if matched and not is_selected:
+                self.assertGreater(total_width + width, 100, name)
+        self.assertIn("selected {} bits in {} taps".format(total_width, len(manifest["taps"])), stdout)
+        for tap in manifest["taps"]:
+            selected_width, depth = scope.capture_depth(tap)
+            self.assertLessEqual(depth * selected_width, tap["depth"] * tap["width"])
+            self.assertGreater(2 * depth * selected_width, tap["depth"] * tap["width"])
+
+if __name__ == "__main__":
+    unittest.main()
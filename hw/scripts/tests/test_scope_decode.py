@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Copyright © 2019-2023
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Regression tests of scope_decode.py against a per-bit port of the VCD dump
+# of runtime/common/scope.cpp, on a synthetic raw capture of the taps of
+# data/design.json.
+
+import importlib.util
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+MAX_DELAY_CYCLES = 10000
+
+def load_manifest():
+    # the first tap keeps every signal, the others only their even ones, plus
+    # a tap of signals wider than a sample word
+    with open(os.path.join(DATA_DIR, "design.json")) as f:
+        manifest = json.load(f)
+    for tap in manifest["taps"][1:]:
+        tap["signals"] = [signal + [index % 2 == 0] for index, signal in enumerate(tap["signals"])]
+    wide_tap = {"id": len(manifest["taps"]), "width": 200, "signals": [["wide", 100], ["narrow", 30], ["wider", 70]], "path": "TOP.top.wide"}
+    manifest["taps"].insert(2, wide_tap)
+    return manifest
+
+def make_capture(manifest, seed):
+    # {tap id: (width, times, values)}: empty and single sample taps, bursts,
+    # idle gaps longer than MAX_DELAY_CYCLES, and the last tap left out
+    rng = random.Random(seed)
+    capture = {}
+    for index, tap in enumerate(manifest["taps"][:-1]):
+        num_samples = [0, 1, 40, 200, 7][index % 5]
+        time = rng.choice([rng.randint(0, 50), rng.randint(20000, 30000)])
+        times = []
+        values = []
+        for _ in range(num_samples):
+            times.append(time)
+            values.append(rng.getrandbits(tap["width"]) if rng.random() < 0.5 else rng.getrandbits(3))
+            time += 1 + (rng.randint(0, 3) if rng.random() < 0.9 else rng.randint(9000, 25000))
+        capture[tap["id"]] = (tap["width"], times, values)
+    return capture
+
+def write_raw(filename, capture):
+    with open(filename, 'wb') as f:
+        f.write(struct.pack("<8sII", b"VXSCOPE1", len(capture), 0))
+        for id, (width, times, values) in capture.items():
+            num_words = (width + 63) // 64
+            f.write(struct.pack("<IIQ", id, width, len(times)))
+            f.write(struct.pack("<%dQ" % len(times), *times))
+            for value in values:
+                f.write(struct.pack("<%dQ" % num_words, *[(value >> (64 * i)) & ((1 << 64) - 1) for i in range(num_words)]))
+
+def reference_vcd_body(manifest, capture):
+    # value changes after the VCD header: the samples of all taps in time
+    # order, each one clocked in, with each selected signal dumped when changed
+    lines = []
+    taps = []
+    signal_id = 1
+    for tap in manifest["taps"]:
+        signals = []
+        for signal in tap["signals"]:
+            signals.append((signal_id, signal[1], len(signal) < 3 or signal[2]))
+            signal_id += 1
+        _, times, values = capture.get(tap["id"], (0, [], []))
+        taps.append({"signals": signals, "times": times, "values": values, "next": 0, "last": {}})
+
+    def advance_clock(cycle, target):
+        if target - cycle > MAX_DELAY_CYCLES:
+            lines.extend(["#%d" % (cycle * 2), "bx 0", "#%d" % (cycle * 2 + 1), "bx 0"])
+            cycle = target - MAX_DELAY_CYCLES
+        while cycle < target:
+            lines.extend(["#%d" % (cycle * 2), "b0 0", "#%d" % (cycle * 2 + 1), "b1 0"])
+            cycle += 1
+        return cycle
+
+    cycle = 0
+    while True:
+        pending = [tap for tap in taps if tap["next"] < len(tap["times"])]
+        if not pending:
+            break
+        tap = min(pending, key=lambda tap: tap["times"][tap["next"]])
+        cycle = advance_clock(cycle, tap["times"][tap["next"]])
+        value = tap["values"][tap["next"]]
+        offset = 0
+        for signal_id, width, selected in reversed(tap["signals"]):
+            bits = format((value >> offset) & ((1 << width) - 1), "0%db" % width)
+            offset += width
+            if selected and tap["last"].get(signal_id) != bits:
+                lines.append("b%s %d" % (bits, signal_id))
+            tap["last"][signal_id] = bits
+        tap["next"] += 1
+    if any(tap["times"] for tap in taps):
+        advance_clock(cycle, cycle + 1)
+    return "".join(line + "\n" for line in lines)
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class ScopeDecodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.manifest = load_manifest()
+        self.manifest_file = self.tmp_file("scope.json")
+        with open(self.manifest_file, "w") as f:
+            json.dump(self.manifest, f)
+
+    def tmp_file(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def decode(self, capture, output):
+        raw_file = self.tmp_file("scope.raw")
+        write_raw(raw_file, capture)
+        output = self.tmp_file(output)
+        command = [sys.executable, os.path.join(SCRIPTS_DIR, "scope_decode.py"), "-j", self.manifest_file, "-o", output, raw_file]
+        stdout = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode()
+        return output, stdout
+
+    def test_vcd(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                capture = make_capture(self.manifest, seed)
+                output, stdout = self.decode(capture, "scope.vcd")
+                with open(output) as f:
+                    header, sep, body = f.read().partition("enddefinitions $end\n")
+                self.assertTrue(sep)
+                self.assertEqual(body, reference_vcd_body(self.manifest, capture))
+                declared = [line.split()[4] for line in header.splitlines() if line.lstrip().startswith("$var") and line.split()[3] != "0"]
+                expected = [signal[0] for tap in self.manifest["taps"] for signal in tap["signals"] if len(signal) < 3 or signal[2]]
+                self.assertEqual(sorted(declared), sorted(expected))
+                last_cycle = int(body.rsplit("#", 1)[1].split()[0]) // 2 + 1
+                self.assertEqual(stdout, "trace dump done! - {} cycles\n".format(last_cycle))
+
+    def test_npz(self):
+        import numpy as np
+        capture = make_capture(self.manifest, 0)
+        output, _ = self.decode(capture, "scope.npz")
+        with np.load(output) as npz:
+            columns = {name: npz[name] for name in npz.files}
+        expected_names = set()
+        for tap in self.manifest["taps"]:
+            if tap["id"] not in capture:
+                continue
+            _, times, values = capture[tap["id"]]
+            prefix = "tap{}.".format(tap["id"])
+            expected_names.add(prefix + "time")
+            self.assertEqual(columns[prefix + "time"].tolist(), times)
+            offset = tap["width"]
+            for signal in tap["signals"]:
+                name, width = signal[:2]
+                offset -= width
+                if len(signal) == 3 and not signal[2]:
+                    continue
+                expected_names.add(prefix + name)
+                signal_values = [(value >> offset) & ((1 << width) - 1) for value in values]
+                column = columns[prefix + name]
+                if width <= 64:
+                    self.assertEqual(column.tolist(), signal_values, name)
+                else:
+                    self.assertEqual([int.from_bytes(row.tobytes(), "little") for row in column], signal_values, name)
+        self.assertEqual(set(columns), expected_names)
+
+if __name__ == "__main__":
+    unittest.main()
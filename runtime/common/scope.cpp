@@ -34,6 +34,8 @@
 
 #define MAX_DELAY_CYCLES 10000
 
+#define RAW_MAGIC "VXSCOPE1"
+
 #define MMIO_SCOPE_READ  (AFU_IMAGE_MMIO_SCOPE_READ * 4)
 #define MMIO_SCOPE_WRITE (AFU_IMAGE_MMIO_SCOPE_WRITE * 4)
 
@@ -58,6 +60,7 @@ struct tap_signal_t {
   uint32_t id;
   std::string name;
   uint32_t width;
+  bool selected;
 };
 
 struct tap_t {
@@ -99,6 +102,8 @@ static void dump_module(std::ofstream& ofs,
   auto itt = tails.find(name);
   if (itt != tails.end()) {
     for (auto& signal : itt->second->signals) {
+      if (!signal.selected)
+        continue; // filtered out by scope.py
       ofs << indent << " $var wire " << signal.width << " " << signal.id << " " << signal.name << " $end" << std::endl;
     }
   }
@@ -202,7 +207,9 @@ static int dump_tap(std::ofstream& ofs, tap_t* tap, vx_device_h hdevice) {
       ++sample_offset;
       if (signal_offset == signal_width) {
         signal_data[signal_width] = 0; // string null termination
-        ofs << 'b' << signal_data.data() << ' ' << signal_it->id << std::endl;
+        if (signal_it->selected) {
+          ofs << 'b' << signal_data.data() << ' ' << signal_it->id << std::endl;
+        }
         if (sample_offset == tap->width) {
           // end-of-sample
           ++tap->cur_sample;
@@ -228,6 +235,54 @@ static int dump_tap(std::ofstream& ofs, tap_t* tap, vx_device_h hdevice) {
   return 0;
 }
 
+// raw capture layout, decoded offline by hw/scripts/scope_decode.py:
+// magic, num_taps (u32), reserved (u32), then for each tap:
+// id (u32), width (u32), samples (u64), sample cycle times (u64 x samples),
+// sample data (u64 x samples x ceil(width/64), LSB first)
+static int dump_raw(const char* raw_path, std::vector<tap_t>& taps, vx_device_h hdevice) {
+  std::ofstream ofs(raw_path, std::ios::binary);
+  if (!ofs) {
+    std::cerr << "[SCOPE] error: cannot create raw capture file: " << raw_path << std::endl;
+    return -1;
+  }
+
+  uint32_t num_taps = taps.size();
+  uint32_t reserved = 0;
+  ofs.write(RAW_MAGIC, 8);
+  ofs.write((const char*)&num_taps, sizeof(num_taps));
+  ofs.write((const char*)&reserved, sizeof(reserved));
+
+  for (auto& tap : taps) {
+    uint64_t samples = tap.samples;
+    uint32_t num_words = (tap.width + 63) / 64;
+    std::vector<uint64_t> times(samples);
+    std::vector<uint64_t> words(samples * num_words);
+    uint64_t cmd_data = (tap.id << 3) | CMD_GET_DATA;
+    for (uint64_t i = 0; i < samples; ++i) {
+      times[i] = tap.cycle_time;
+      for (uint32_t j = 0; j < num_words; ++j) {
+        CHECK_ERR(g_callback.registerWrite(hdevice, cmd_data));
+        CHECK_ERR(g_callback.registerRead(hdevice, &words[i * num_words + j]));
+      }
+      if (i + 1 != samples) {
+        // read next delta
+        uint64_t delta;
+        CHECK_ERR(g_callback.registerWrite(hdevice, cmd_data));
+        CHECK_ERR(g_callback.registerRead(hdevice, &delta));
+        tap.cycle_time += 1 + delta;
+      }
+    }
+    ofs.write((const char*)&tap.id, sizeof(tap.id));
+    ofs.write((const char*)&tap.width, sizeof(tap.width));
+    ofs.write((const char*)&samples, sizeof(samples));
+    ofs.write((const char*)times.data(), times.size() * sizeof(uint64_t));
+    ofs.write((const char*)words.data(), words.size() * sizeof(uint64_t));
+    std::cout << std::dec << "[SCOPE] raw tap #" << tap.id << ": " << samples << " samples" << std::endl;
+  }
+
+  return 0;
+}
+
 int vx_scope_start(scope_callback_t* callback, vx_device_h hdevice, uint64_t start_time, uint64_t stop_time) {
   if (nullptr == hdevice || nullptr == callback)
     return -1;
@@ -351,7 +406,8 @@ int vx_scope_stop(vx_device_h hdevice) {
       for (auto& signal : tap["signals"]) {
         auto name  = signal[0].get<std::string>();
         auto width = signal[1].get<uint32_t>();
-        _tap.signals.push_back({signal_id, name, width});
+        auto selected = (signal.size() < 3) || signal[2].get<bool>();
+        _tap.signals.push_back({signal_id, name, width, selected});
         ++signal_id;
       }
 
@@ -398,6 +454,14 @@ int vx_scope_stop(vx_device_h hdevice) {
               << ", path=" << tap.path << std::endl;
   }
 
+  const char* raw_path = getenv("SCOPE_RAW_PATH");
+  if (raw_path != nullptr) {
+    std::cout << "[SCOPE] dump raw capture..." << std::endl;
+    CHECK_ERR(dump_raw(raw_path, taps, hdevice));
+    std::cout << "[SCOPE] raw capture dump done!" << std::endl;
+    return 0;
+  }
+
   std::cout << "[SCOPE] dump header..." << std::endl;
 
   std::ofstream ofs("scope.vcd");
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Instantiation hierarchy index of the RTL modules for Skybox/Vortex.
+
+`build` scans the RTL like scripts/rtl_inventory.py and stores the module
+instantiation graph with its precomputed transitive closure, depth and
+fan-in/fan-out counts in a compact binary file. The query commands then
+answer from that file without rescanning the RTL:
+
+  below MODULE     modules instantiated under MODULE, at any level
+  above MODULE     modules instantiating MODULE, at any level (--tops: roots only)
+  path SRC DST     an instantiation path from SRC down to DST
+  info MODULE...   depth, fan-in, fan-out and closure sizes
+  roots            modules not instantiated by any other module
+
+The index is not updated automatically, rebuild it after RTL changes
+(with --cache, only the changed files are scanned again).
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import sys
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from rtl_inventory import collect_instantiations, collect_rtl_files, load_cache, parse_modules, save_cache, scan_files, scan_files_cached
+
+
+INDEX_MAGIC = b"RTLHIER1"
+INDEX_HEADER = struct.Struct("<8sII")
+
+
+@dataclass
+class HierarchyIndex:
+    """Module graph in CSR form, with one closure bitset row per module.
+
+    Bit j of descendants[i] is set if module j is instantiated under module i,
+    and bit j of ancestors[i] if module i is instantiated under module j.
+    depth is the longest instantiation chain from a root module.
+    """
+
+    names: List[str]
+    child_offsets: array
+    children: array
+    parent_offsets: array
+    parents: array
+    depth: array
+    descendants: List[int]
+    ancestors: List[int]
+
+    def __post_init__(self) -> None:
+        self.ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    def module_id(self, name: str) -> int:
+        module = self.ids.get(name)
+        if module is None:
+            raise KeyError(f"unknown module: {name}")
+        return module
+
+    def direct_children(self, module: int) -> List[int]:
+        return list(self.children[self.child_offsets[module] : self.child_offsets[module + 1]])
+
+    def direct_parents(self, module: int) -> List[int]:
+        return list(self.parents[self.parent_offsets[module] : self.parent_offsets[module + 1]])
+
+    def modules_of(self, bits: int) -> List[str]:
+        return [self.names[i] for i in range(bits.bit_length()) if (bits >> i) & 1]
+
+
+def strongly_connected_components(num_nodes: int, successors: List[List[int]]) -> List[List[int]]:
+    """Iterative Tarjan, components come out in reverse topological order."""
+    index = [-1] * num_nodes
+    lowlink = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge = work.pop()
+            if edge == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            recurse = False
+            for i in range(edge, len(successors[node])):
+                succ = successors[node][i]
+                if index[succ] == -1:
+                    work.append((node, i + 1))
+                    work.append((succ, 0))
+                    recurse = True
+                    break
+                if on_stack[succ]:
+                    lowlink[node] = min(lowlink[node], index[succ])
+            if recurse:
+                continue
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+    return components
+
+
+def closure(num_nodes: int, successors: List[List[int]]) -> List[int]:
+    """Bitset of the nodes reachable from each node, recursive instantiation
+    cycles included."""
+    reach = [0] * num_nodes
+    for component in strongly_connected_components(num_nodes, successors):
+        bits = 0
+        for node in component:
+            for succ in successors[node]:
+                bits |= (1 << succ) | reach[succ]
+        for node in component:
+            reach[node] = bits
+    return reach
+
+
+def build_index(instantiations: Dict[str, Set[str]]) -> HierarchyIndex:
+    names = sorted(set(instantiations) | {p for parents in instantiations.values() for p in parents})
+    ids = {name: i for i, name in enumerate(names)}
+    successors: List[List[int]] = [[] for _ in names]
+    predecessors: List[List[int]] = [[] for _ in names]
+    for child, parents in instantiations.items():
+        for parent in parents:
+            successors[ids[parent]].append(ids[child])
+            predecessors[ids[child]].append(ids[parent])
+    for edges in successors + predecessors:
+        edges.sort()
+
+    # longest chain from a root, over the components in topological order
+    depth = array("I", [0] * len(names))
+    for component in reversed(strongly_connected_components(len(names), successors)):
+        members = set(component)
+        level = max((depth[p] + 1 for node in component for p in predecessors[node] if p not in members), default=0)
+        for node in component:
+            depth[node] = level
+
+    def csr(edges: List[List[int]]):
+        offsets = array("I", [0])
+        flat = array("I")
+        for node_edges in edges:
+            flat.extend(node_edges)
+            offsets.append(len(flat))
+        return offsets, flat
+
+    child_offsets, children = csr(successors)
+    parent_offsets, parents = csr(predecessors)
+    return HierarchyIndex(
+        names=names,
+        child_offsets=child_offsets,
+        children=children,
+        parent_offsets=parent_offsets,
+        parents=parents,
+        depth=depth,
+        descendants=closure(len(names), successors),
+        ancestors=closure(len(names), predecessors),
+    )
+
+
+def write_index(index: HierarchyIndex, index_path: Path) -> None:
+    row_bytes = (len(index.names) + 7) // 8
+    names_blob = "\n".join(index.names).encode("utf-8")
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with index_path.open("wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(index.names), len(index.children)))
+        f.write(struct.pack("<I", len(names_blob)))
+        f.write(names_blob)
+        for values in (index.child_offsets, index.children, index.parent_offsets, index.parents, index.depth):
+            f.write(values.tobytes())
+        for rows in (index.descendants, index.ancestors):
+            f.write(b"".join(bits.to_bytes(row_bytes, "little") for bits in rows))
+
+
+def read_index(index_path: Path) -> HierarchyIndex:
+    data = index_path.read_bytes()
+    magic, num_modules, num_edges = INDEX_HEADER.unpack_from(data, 0)
+    if magic != INDEX_MAGIC:
+        raise ValueError(f"invalid hierarchy index: {index_path}")
+    pos = INDEX_HEADER.size
+    (names_size,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    names = data[pos : pos + names_size].decode("utf-8").split("\n") if num_modules else []
+    pos += names_size
+
+    def take(count: int) -> array:
+        nonlocal pos
+        values = array("I")
+        values.frombytes(data[pos : pos + 4 * count])
+        pos += 4 * count
+        return values
+
+    child_offsets = take(num_modules + 1)
+    children = take(num_edges)
+    parent_offsets = take(num_modules + 1)
+    parents = take(num_edges)
+    depth = take(num_modules)
+    row_bytes = (num_modules + 7) // 8
+
+    def rows() -> List[int]:
+        nonlocal pos
+        bitsets = [int.from_bytes(data[pos + i * row_bytes : pos + (i + 1) * row_bytes], "little") for i in range(num_modules)]
+        pos += num_modules * row_bytes
+        return bitsets
+
+    descendants = rows()
+    ancestors = rows()
+    return HierarchyIndex(names, child_offsets, children, parent_offsets, parents, depth, descendants, ancestors)
+
+
+def find_path(index: HierarchyIndex, src: int, dst: int) -> Optional[List[int]]:
+    """Shortest instantiation path, only exploring the modules that reach dst."""
+    if src != dst and not (index.descendants[src] >> dst) & 1:
+        return None
+    previous = {src: src}
+    queue = deque([src])
+    while queue:
+        node = queue.popleft()
+        for child in index.direct_children(node):
+            # checked before the visited modules, a recursive src reaches itself back
+            if child == dst:
+                path = [node]
+                while path[-1] != src:
+                    path.append(previous[path[-1]])
+                return path[::-1] + [dst]
+            if child in previous or not (index.descendants[child] >> dst) & 1:
+                continue
+            previous[child] = node
+            queue.append(child)
+    return [src] if src == dst else None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build and query the RTL module instantiation hierarchy index")
+    parser.add_argument("--repo-root", default=".", help="Repository root path")
+    parser.add_argument("-x", "--index", default=".rtl_hierarchy.idx", help="Hierarchy index path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Scan the RTL and write the index")
+    build.add_argument("--hw-dir", default="hw/rtl", help="RTL root directory")
+    build.add_argument("-j", "--jobs", type=int, default=0, help="Number of scanner processes (default: one per CPU, 1 to disable)")
+    build.add_argument("--cache", help="Per-file scan cache path, shared with rtl_inventory.py --cache")
+
+    below = subparsers.add_parser("below", help="Modules instantiated under a module")
+    below.add_argument("module")
+    below.add_argument("--direct", action="store_true", help="Only the directly instantiated modules")
+    above = subparsers.add_parser("above", help="Modules instantiating a module")
+    above.add_argument("module")
+    above.add_argument("--direct", action="store_true", help="Only the direct parents")
+    above.add_argument("--tops", action="store_true", help="Only the root modules")
+    path = subparsers.add_parser("path", help="An instantiation path between two modules")
+    path.add_argument("src")
+    path.add_argument("dst")
+    info = subparsers.add_parser("info", help="Depth, fan-in, fan-out and closure sizes")
+    info.add_argument("modules", nargs="+")
+    subparsers.add_parser("roots", help="Modules not instantiated by any other module")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    root = Path(args.repo_root).resolve()
+    index_path = (root / args.index).resolve()
+
+    if args.command == "build":
+        files = collect_rtl_files(root, (root / args.hw_dir).resolve())
+        if args.cache:
+            cache_path = (root / args.cache).resolve()
+            scans, entries, _ = scan_files_cached(files, root, args.jobs, load_cache(cache_path))
+            save_cache(cache_path, entries)
+        else:
+            scans = scan_files(files, root, args.jobs)
+        _, by_name = parse_modules(scans)
+        index = build_index(collect_instantiations(scans, set(by_name.keys())))
+        write_index(index, index_path)
+        print(f"modules={len(index.names)}")
+        print(f"instantiations={len(index.children)}")
+        print(f"index={index_path}")
+        return 0
+
+    if not index_path.is_file():
+        print(f"missing hierarchy index {index_path}, run the build command first", file=sys.stderr)
+        return 1
+    index = read_index(index_path)
+    try:
+        if args.command == "below":
+            module = index.module_id(args.module)
+            if args.direct:
+                names = [index.names[i] for i in index.direct_children(module)]
+            else:
+                names = index.modules_of(index.descendants[module])
+        elif args.command == "above":
+            module = index.module_id(args.module)
+            if args.direct:
+                names = [index.names[i] for i in index.direct_parents(module)]
+            else:
+                names = index.modules_of(index.ancestors[module])
+            if args.tops:
+                names = [name for name in names if index.parent_offsets[index.ids[name]] == index.parent_offsets[index.ids[name] + 1]]
+        elif args.command == "path":
+            found = find_path(index, index.module_id(args.src), index.module_id(args.dst))
+            if found is None:
+                print(f"{args.dst} is not instantiated under {args.src}", file=sys.stderr)
+                return 1
+            names = [" -> ".join(index.names[i] for i in found)]
+        elif args.command == "info":
+            names = ["module,depth,fan_in,fan_out,descendants,ancestors"]
+            for name in args.modules:
+                module = index.module_id(name)
+                names.append(
+                    f"{name},{index.depth[module]},{len(index.direct_parents(module))},{len(index.direct_children(module))},"
+                    f"{bin(index.descendants[module]).count('1')},{bin(index.ancestors[module]).count('1')}"
+                )
+        else:
+            names = [name for i, name in enumerate(index.names) if index.parent_offsets[i] == index.parent_offsets[i + 1]]
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return 1
+
+    for name in names:
+        print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
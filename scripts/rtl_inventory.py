@@ -3,17 +3,31 @@
 Generate a raw RTL module inventory for Skybox/Vortex.
 
 Outputs:
-  - CSV index with module declarations and basic metadata
+  - CSV index with module declarations, basic metadata and size metrics
   - JSON index with the same records for machine diffing
+
+With --elaborate, the inventory is not written: the ifdef guards are instead
+evaluated for the defines of a CONFIGS string (as passed to blackbox.sh),
+following the `define/`undef/`include directives of the RTL headers, and the
+modules instantiated from --top in that configuration are reported.
+
+With --cache, the per-file scan results are kept between runs and only the
+files whose size, mtime and content hash changed are scanned again.
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
 import json
+import os
 import re
-from dataclasses import dataclass
+import shlex
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Set, Tuple
 
@@ -22,6 +36,27 @@ MODULE_RE = re.compile(r"^\s*module\s+([A-Za-z_][A-Za-z0-9_]*)\b")
 PARAM_RE = re.compile(r"\bparameter\b(?:\s+\w+\s+)?\s*([A-Za-z_][A-Za-z0-9_]*)")
 IFDEF_RE = re.compile(r"^\s*`(ifdef|ifndef|elsif|else|endif)\b(?:\s+([A-Za-z_][A-Za-z0-9_]*))?")
 ENDMODULE_RE = re.compile(r"^\s*endmodule\b")
+DEFINE_RE = re.compile(r"^\s*`(define|undef|include)\s+(?:\"([^\"]+)\"|([A-Za-z_][A-Za-z0-9_]*))")
+
+# Example patterns:
+#   VX_cluster #(... ) cluster_i (
+#   VX_cluster cluster_i (
+INST_RE = re.compile(
+    r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(?:#\s*\([^;]*\))?\s+([A-Za-z_][A-Za-z0-9_]*)\s*\("
+)
+# Parameter list continued on the next lines, closed by ") cluster (":
+#   VX_cluster #(
+#       .CLUSTER_ID (cluster_id)
+#   ) cluster (
+INST_OPEN_RE = re.compile(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*#\s*\(")
+INST_NAME_RE = re.compile(r"^\s*[A-Za-z_][A-Za-z0-9_]*\s*(?:\[[^\]]*\]\s*)*\(")
+PAREN_RE = re.compile(r"[()]")
+GENERATE_FOR_RE = re.compile(r"for\s*\(\s*genvar\b")
+NON_INST_PREFIXES = ("if ", "for ", "while ", "case ", "assign ", "always", "initial", "wire ", "logic ", "reg ", "input ", "output ", "inout ", "localparam ", "parameter ")
+PARAM_WINDOW = 80
+CACHE_VERSION = 4
+# rtlsim adds these to the CONFIGS of the Verilator command line
+RTLSIM_CONFIGS = "-DSIMULATION -DSV_DPI -DNDEBUG"
 
 
 @dataclass
@@ -33,6 +68,12 @@ class ModuleDecl:
     guarded_by_ifdef: str
     parameters: List[str]
     instantiated_by: Set[str]
+    # size metrics: lines from module to endmodule, always blocks, generate
+    # for loops and instances of each module in the body
+    lines: int = 0
+    always_blocks: int = 0
+    generate_loops: int = 0
+    instantiates: Dict[str, int] = field(default_factory=dict)
 
     def to_csv_row(self) -> Dict[str, str]:
         return {
@@ -43,6 +84,10 @@ class ModuleDecl:
             "guarded_by_ifdef": self.guarded_by_ifdef,
             "parameters": "|".join(self.parameters),
             "instantiated_by": "|".join(sorted(self.instantiated_by)),
+            "lines": str(self.lines),
+            "always_blocks": str(self.always_blocks),
+            "generate_loops": str(self.generate_loops),
+            "instantiates": "|".join(f"{name}:{count}" for name, count in sorted(self.instantiates.items())),
         }
 
     def to_json_obj(self) -> Dict[str, object]:
@@ -54,11 +99,20 @@ class ModuleDecl:
             "guarded_by_ifdef": self.guarded_by_ifdef,
             "parameters": self.parameters,
             "instantiated_by": sorted(self.instantiated_by),
+            "lines": self.lines,
+            "always_blocks": self.always_blocks,
+            "generate_loops": self.generate_loops,
+            "instantiates": dict(sorted(self.instantiates.items())),
         }
 
 
+@lru_cache(maxsize=None)
+def resolved_root(root: Path) -> Path:
+    return root.resolve()
+
+
 def relpath(path: Path, root: Path) -> str:
-    return str(path.resolve().relative_to(root.resolve()))
+    return str(path.resolve().relative_to(resolved_root(root)))
 
 
 def collect_rtl_files(root: Path, hw_dir: Path) -> List[Path]:
@@ -68,21 +122,137 @@ def collect_rtl_files(root: Path, hw_dir: Path) -> List[Path]:
     return sorted(p for p in files if p.is_file())
 
 
-def parse_modules(files: List[Path], root: Path) -> Tuple[List[ModuleDecl], Dict[str, List[ModuleDecl]]]:
-    modules: List[ModuleDecl] = []
-    by_name: Dict[str, List[ModuleDecl]] = {}
+def collect_header_files(hw_dir: Path) -> List[Path]:
+    return sorted(p for p in hw_dir.rglob("*.vh") if p.is_file())
 
-    for path in files:
-        guard_stack: List[str] = []
-        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
-        rel = relpath(path, root)
-        lang = "sv" if path.suffix == ".sv" else "v"
 
-        for idx, line in enumerate(lines, start=1):
+@dataclass
+class FileScan:
+    """Module declarations, (instantiated, parent, line) instantiations and
+    (line, kind, name) preprocessor directives of one file."""
+
+    decls: List[ModuleDecl]
+    instantiations: List[Tuple[str, str, int]]
+    directives: List[Tuple[int, str, str]]
+
+    def to_cache_obj(self) -> Dict[str, object]:
+        return {
+            "decls": [
+                {
+                    "module_name": d.module_name,
+                    "file_path": d.file_path,
+                    "language": d.language,
+                    "line": d.line,
+                    "guarded_by_ifdef": d.guarded_by_ifdef,
+                    "parameters": d.parameters,
+                    "lines": d.lines,
+                    "always_blocks": d.always_blocks,
+                    "generate_loops": d.generate_loops,
+                }
+                for d in self.decls
+            ],
+            "instantiations": [list(inst) for inst in self.instantiations],
+            "directives": [list(directive) for directive in self.directives],
+        }
+
+    @classmethod
+    def from_cache_obj(cls, obj: Dict[str, object]) -> "FileScan":
+        decls = [ModuleDecl(instantiated_by=set(), **d) for d in obj["decls"]]
+        return cls(decls, [tuple(inst) for inst in obj["instantiations"]], [tuple(directive) for directive in obj["directives"]])
+
+
+def dedup(values: List[str]) -> List[str]:
+    # Preserve order, remove duplicates.
+    return list(dict.fromkeys(values))
+
+
+def scan_file(path: Path, root: Path) -> FileScan:
+    """Single pass over the lines of a file: ifdef guards, module declarations
+    with the parameters of their first lines, and candidate instantiations.
+    Lines are dispatched on their first character and on substrings, so that
+    the regular expressions only run on the lines that can match them."""
+    lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+    rel = relpath(path, root)
+    lang = "sv" if path.suffix == ".sv" else "v"
+    decls: List[ModuleDecl] = []
+    instantiations: List[Tuple[str, str, int]] = []
+    directives: List[Tuple[int, str, str]] = []
+    guard_stack: List[str] = []
+    # (declaration, parameters, last line index) of the parameter windows in progress
+    windows: List[Tuple[ModuleDecl, List[str], int]] = []
+    current_module = None
+    current_decl = None
+    # instantiated module of a parameter list spanning several lines, its line,
+    # the depth of its parentheses, and whether the instance name is still expected
+    open_inst = None
+    open_line = 0
+    open_depth = 0
+    open_closed = False
+
+    def follow_inst(code: str) -> None:
+        nonlocal open_inst, open_depth, open_closed
+        if not open_closed:
+            for paren in PAREN_RE.finditer(code):
+                open_depth += 1 if paren.group() == "(" else -1
+                if open_depth == 0:
+                    code = code[paren.end():]
+                    open_closed = True
+                    break
+            if not open_closed or not code.strip():
+                return
+        if INST_NAME_RE.match(code):
+            instantiations.append((open_inst, current_module, open_line))
+        open_inst = None
+
+    for idx, line in enumerate(lines):
+        stripped = line.lstrip()
+        if not stripped:
+            continue
+
+        if stripped[0] == "e" and ENDMODULE_RE.match(line):
+            for decl, params, _ in windows:
+                decl.parameters = dedup(params)
+            windows = []
+            if current_decl is not None:
+                current_decl.lines = idx + 2 - current_decl.line
+            current_module = None
+            current_decl = None
+            open_inst = None
+            continue
+
+        mod_match = MODULE_RE.match(line) if stripped[0] == "m" else None
+        if mod_match:
+            current_module = mod_match.group(1)
+            decl = ModuleDecl(
+                module_name=current_module,
+                file_path=rel,
+                language=lang,
+                line=idx + 1,
+                guarded_by_ifdef=" && ".join(guard_stack) if guard_stack else "",
+                parameters=[],
+                instantiated_by=set(),
+            )
+            decls.append(decl)
+            current_decl = decl
+            windows.append((decl, [], idx + PARAM_WINDOW))
+
+        while windows and windows[0][2] < idx:
+            decl, params, _ = windows.pop(0)
+            decl.parameters = dedup(params)
+        if windows and "parameter" in line:
+            found = PARAM_RE.findall(line)
+            for _, params, _ in windows:
+                params.extend(found)
+
+        if mod_match:
+            continue
+
+        if stripped[0] == "`":
             ifdef_match = IFDEF_RE.match(line)
             if ifdef_match:
                 kind = ifdef_match.group(1)
                 token = ifdef_match.group(2) or ""
+                directives.append((idx + 1, kind, token))
                 if kind == "ifdef":
                     guard_stack.append(token)
                 elif kind == "ifndef":
@@ -96,84 +266,235 @@ def parse_modules(files: List[Path], root: Path) -> Tuple[List[ModuleDecl], Dict
                 elif kind == "endif":
                     if guard_stack:
                         guard_stack.pop()
-                continue
-
-            mod_match = MODULE_RE.match(line)
-            if not mod_match:
-                continue
-
-            module_name = mod_match.group(1)
-            params: List[str] = []
-            for probe in lines[idx - 1 : min(len(lines), idx + 80)]:
-                if ENDMODULE_RE.match(probe):
-                    break
-                params.extend(PARAM_RE.findall(probe))
-
-            # Preserve order, remove duplicates.
-            dedup_params: List[str] = []
-            seen = set()
-            for p in params:
-                if p not in seen:
-                    dedup_params.append(p)
-                    seen.add(p)
-
-            decl = ModuleDecl(
-                module_name=module_name,
-                file_path=rel,
-                language=lang,
-                line=idx,
-                guarded_by_ifdef=" && ".join(guard_stack) if guard_stack else "",
-                parameters=dedup_params,
-                instantiated_by=set(),
-            )
+            else:
+                define_match = DEFINE_RE.match(line)
+                if define_match:
+                    directives.append((idx + 1, define_match.group(1), define_match.group(2) or define_match.group(3)))
+            continue
+
+        if open_inst is not None:
+            follow_inst(line.split("//", 1)[0])
+            continue
+
+        if current_decl is not None:
+            if stripped[0] == "a" and stripped.startswith("always"):
+                current_decl.always_blocks += 1
+            elif stripped[0] == "f" and GENERATE_FOR_RE.match(stripped):
+                current_decl.generate_loops += 1
+
+        if current_module is None or "(" not in stripped or stripped.startswith(NON_INST_PREFIXES):
+            continue
+
+        inst_match = INST_RE.match(line)
+        if inst_match:
+            instantiations.append((inst_match.group(1), current_module, idx + 1))
+            continue
+
+        open_match = INST_OPEN_RE.match(line)
+        if open_match:
+            open_inst = open_match.group(1)
+            open_line = idx + 1
+            open_depth = 1
+            open_closed = False
+            follow_inst(line[open_match.end():].split("//", 1)[0])
+
+    for decl, params, _ in windows:
+        decl.parameters = dedup(params)
+    if current_decl is not None:
+        current_decl.lines = len(lines) + 1 - current_decl.line
+    return FileScan(decls, instantiations, directives)
+
+
+def scan_files(files: List[Path], root: Path, jobs: int = 0) -> List[FileScan]:
+    """Scan the files in a pool of jobs processes (default: one per CPU), results are in the files order."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2:
+        return [scan_file(path, root) for path in files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(files) // (4 * jobs))
+        return list(pool.map(scan_file, files, [root] * len(files), chunksize=chunksize))
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def load_cache(cache_path: Path) -> Dict[str, Dict[str, object]]:
+    """Cache entries by file path, empty if missing or from another version."""
+    try:
+        payload = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if payload.get("version") != CACHE_VERSION:
+        return {}
+    return payload.get("files", {})
+
+
+def save_cache(cache_path: Path, entries: Dict[str, Dict[str, object]]) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"version": CACHE_VERSION, "files": entries}
+    cache_path.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+
+
+def scan_files_cached(
+    files: List[Path], root: Path, jobs: int, cache: Dict[str, Dict[str, object]]
+) -> Tuple[List[FileScan], Dict[str, Dict[str, object]], int]:
+    """Reuse the cached scans of the unchanged files, scan the others.
+
+    A file is unchanged if its size and mtime match its cache entry, or else
+    if its content hash does. Returns the scans in the files order, the new
+    cache entries (without the deleted files) and the number of files scanned.
+    """
+    scans: List[FileScan] = [None] * len(files)
+    entries: Dict[str, Dict[str, object]] = {}
+    stale: List[int] = []
+    for i, path in enumerate(files):
+        rel = relpath(path, root)
+        stat = path.stat()
+        entry = cache.get(rel)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            digest = file_digest(path)
+            if entry is None or entry["sha256"] != digest:
+                entry = {"sha256": digest}
+                stale.append(i)
+            entry = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        if "scan" in entry:
+            scans[i] = FileScan.from_cache_obj(entry["scan"])
+        entries[rel] = entry
+
+    for i, scan in zip(stale, scan_files([files[i] for i in stale], root, jobs)):
+        scans[i] = scan
+        entries[relpath(files[i], root)]["scan"] = scan.to_cache_obj()
+    return scans, entries, len(stale)
+
+
+def parse_modules(scans: List[FileScan]) -> Tuple[List[ModuleDecl], Dict[str, List[ModuleDecl]]]:
+    modules: List[ModuleDecl] = []
+    by_name: Dict[str, List[ModuleDecl]] = {}
+    for scan in scans:
+        for decl in scan.decls:
             modules.append(decl)
-            by_name.setdefault(module_name, []).append(decl)
-
+            by_name.setdefault(decl.module_name, []).append(decl)
     return modules, by_name
 
 
-def collect_instantiations(files: List[Path], root: Path, module_names: Set[str]) -> Dict[str, Set[str]]:
+def collect_instantiations(scans: List[FileScan], module_names: Set[str]) -> Dict[str, Set[str]]:
     inst_by: Dict[str, Set[str]] = {name: set() for name in module_names}
+    for scan in scans:
+        for mod_name, parent, _ in scan.instantiations:
+            if mod_name in module_names:
+                inst_by[mod_name].add(parent)
+    return inst_by
 
-    # Example patterns:
-    #   VX_cluster #(... ) cluster_i (
-    #   VX_cluster cluster_i (
-    inst_re = re.compile(
-        r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(?:#\s*\([^;]*\))?\s+([A-Za-z_][A-Za-z0-9_]*)\s*\("
-    )
-
-    for path in files:
-        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
-        current_module = None
-
-        for line in lines:
-            mod_match = MODULE_RE.match(line)
-            if mod_match:
-                current_module = mod_match.group(1)
-                continue
-
-            if ENDMODULE_RE.match(line):
-                current_module = None
-                continue
-
-            if current_module is None:
-                continue
-
-            stripped = line.strip()
-            if not stripped or stripped.startswith("`"):
-                continue
-            if stripped.startswith(("if ", "for ", "while ", "case ", "assign ", "always", "initial", "wire ", "logic ", "reg ", "input ", "output ", "inout ", "localparam ", "parameter ")):
-                continue
 
-            inst_match = inst_re.match(line)
-            if not inst_match:
-                continue
+def parse_configs(configs: str) -> Set[str]:
+    """Macro names defined by a CONFIGS string, e.g. "-DEXT_GFX_ENABLE -DNUM_CORES=2"."""
+    return {token[2:].split("=", 1)[0] for token in shlex.split(configs) if token.startswith("-D") and len(token) > 2}
+
+
+def run_directives(
+    scan: FileScan,
+    defines: Set[str],
+    headers: Dict[str, FileScan],
+    include_memo: Dict[Tuple[str, frozenset], frozenset],
+) -> List[bool]:
+    """Preprocess the directives of a file, updating defines and following the
+    includes found in headers. Returns whether the code after each directive
+    is active."""
+    # (enclosing code active, a branch of the block was taken) of the open ifdef blocks
+    stack: List[Tuple[bool, bool]] = []
+    active = True
+    states: List[bool] = []
+    for _, kind, name in scan.directives:
+        if kind in ("ifdef", "ifndef"):
+            taken = active and (name in defines) == (kind == "ifdef")
+            stack.append((active, taken))
+            active = taken
+        elif kind == "elsif":
+            if stack:
+                outer, taken = stack[-1]
+                active = outer and not taken and name in defines
+                stack[-1] = (outer, taken or active)
+        elif kind == "else":
+            if stack:
+                outer, taken = stack[-1]
+                active = outer and not taken
+                stack[-1] = (outer, True)
+        elif kind == "endif":
+            if stack:
+                active = stack.pop()[0]
+        elif active:
+            if kind == "define":
+                defines.add(name)
+            elif kind == "undef":
+                defines.discard(name)
+            else:
+                header = Path(name).name
+                if header in headers:
+                    # headers are pure functions of the defines they are included with
+                    key = (header, frozenset(defines))
+                    if key not in include_memo:
+                        include_memo[key] = key[1]  # recursive includes are no-ops
+                        included = set(defines)
+                        run_directives(headers[header], included, headers, include_memo)
+                        include_memo[key] = frozenset(included)
+                    defines.clear()
+                    defines.update(include_memo[key])
+        states.append(active)
+    return states
+
+
+def elaborate(scans: List[FileScan], headers: Dict[str, FileScan], defines: Set[str], tops: List[str]) -> Set[str]:
+    """Modules instantiated from tops once the files are preprocessed with defines.
+
+    Each file starts from defines, so that its result does not depend on the
+    file order. Modules only instantiated in inactive code are pruned.
+    """
+    include_memo: Dict[Tuple[str, frozenset], frozenset] = {}
+    declared: Set[str] = set()
+    children: Dict[str, Set[str]] = {}
+    for scan in scans:
+        states = run_directives(scan, set(defines), headers, include_memo)
+        lines = [line for line, _, _ in scan.directives]
+
+        def is_active(line: int) -> bool:
+            i = bisect_left(lines, line)
+            return states[i - 1] if i else True
+
+        for decl in scan.decls:
+            if is_active(decl.line):
+                declared.add(decl.module_name)
+        for mod_name, parent, line in scan.instantiations:
+            if is_active(line):
+                children.setdefault(parent, set()).add(mod_name)
+
+    elaborated: Set[str] = set()
+    pending = [name for name in tops if name in declared]
+    while pending:
+        name = pending.pop()
+        if name in elaborated:
+            continue
+        elaborated.add(name)
+        pending.extend(child for child in children.get(name, ()) if child in declared and child not in elaborated)
+    return elaborated
+
+
+def write_elaborated(results: List[Dict[str, object]], json_path: Path) -> None:
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"configs_total": len(results), "configs": results}
+    json_path.write_text(json.dumps(payload, indent=2, sort_keys=False) + "\n", encoding="utf-8")
 
-            mod_name = inst_match.group(1)
-            if mod_name in module_names:
-                inst_by[mod_name].add(current_module)
 
-    return inst_by
+def count_instances(scans: List[FileScan], module_names: Set[str]) -> None:
+    """Set the instantiates counts of each declaration from the instantiations
+    between its line and the next declaration of its file."""
+    for scan in scans:
+        decl_lines = [decl.line for decl in scan.decls]
+        for mod_name, _, line in scan.instantiations:
+            i = bisect_left(decl_lines, line + 1) - 1
+            if i >= 0 and mod_name in module_names:
+                instantiates = scan.decls[i].instantiates
+                instantiates[mod_name] = instantiates.get(mod_name, 0) + 1
 
 
 def write_outputs(modules: List[ModuleDecl], csv_path: Path, json_path: Path) -> None:
@@ -193,6 +514,10 @@ def write_outputs(modules: List[ModuleDecl], csv_path: Path, json_path: Path) ->
                 "guarded_by_ifdef",
                 "parameters",
                 "instantiated_by",
+                "lines",
+                "always_blocks",
+                "generate_loops",
+                "instantiates",
             ],
         )
         writer.writeheader()
@@ -212,6 +537,17 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--hw-dir", default="hw/rtl", help="RTL root directory")
     parser.add_argument("--csv-out", default="docs/skybox_rtl_modules_index.csv", help="CSV output path")
     parser.add_argument("--json-out", default="docs/skybox_rtl_modules_index.json", help="JSON output path")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Number of scanner processes (default: one per CPU, 1 to disable)")
+    parser.add_argument("--cache", help="Per-file scan cache path, to only rescan the changed files")
+    parser.add_argument(
+        "--elaborate",
+        action="append",
+        metavar="CONFIGS",
+        help='Report the modules elaborated with the defines of a CONFIGS string, e.g. --elaborate="-DEXT_GFX_ENABLE -DL2_ENABLE" (repeat to sweep configurations)',
+    )
+    parser.add_argument("--base-configs", default=RTLSIM_CONFIGS, help="Defines added to each --elaborate configuration (default: the rtlsim ones)")
+    parser.add_argument("--top", action="append", help="Top module of --elaborate (default: Vortex, may be repeated)")
+    parser.add_argument("--elaborated-out", default="docs/skybox_rtl_elaborated_modules.json", help="--elaborate JSON output path")
     return parser.parse_args()
 
 
@@ -221,8 +557,33 @@ def main() -> int:
     hw_dir = (root / args.hw_dir).resolve()
 
     files = collect_rtl_files(root, hw_dir)
-    modules, by_name = parse_modules(files, root)
-    instantiations = collect_instantiations(files, root, set(by_name.keys()))
+    header_files = collect_header_files(hw_dir) if args.elaborate else []
+    if args.cache:
+        cache_path = (root / args.cache).resolve()
+        scans, entries, scanned = scan_files_cached(files + header_files, root, args.jobs, load_cache(cache_path))
+        save_cache(cache_path, entries)
+    else:
+        scans = scan_files(files + header_files, root, args.jobs)
+        scanned = len(files) + len(header_files)
+    scans, header_scans = scans[: len(files)], scans[len(files) :]
+
+    if args.elaborate:
+        headers = {path.name: scan for path, scan in zip(header_files, header_scans)}
+        tops = args.top or ["Vortex"]
+        results = []
+        for configs in args.elaborate:
+            elaborated = elaborate(scans, headers, parse_configs(f"{args.base_configs} {configs}"), tops)
+            results.append({"configs": configs, "top": tops, "modules_total": len(elaborated), "modules": sorted(elaborated)})
+            print(f"modules={len(elaborated)} configs={configs}")
+        json_path = (root / args.elaborated_out).resolve()
+        write_elaborated(results, json_path)
+        print(f"scanned_files={scanned}")
+        print(f"json={json_path}")
+        return 0
+
+    modules, by_name = parse_modules(scans)
+    instantiations = collect_instantiations(scans, set(by_name.keys()))
+    count_instances(scans, set(by_name.keys()))
 
     for name, decls in by_name.items():
         inst_set = instantiations.get(name, set())
@@ -234,6 +595,7 @@ def main() -> int:
     write_outputs(modules, csv_path, json_path)
 
     print(f"rtl_files={len(files)}")
+    print(f"scanned_files={scanned}")
     print(f"modules={len(modules)}")
     print(f"csv={csv_path}")
     print(f"json={json_path}")
@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
-"""Generate subsystem-oriented RTL inventory reports from Stage09 module index."""
+"""Generate subsystem-oriented RTL inventory reports from Stage09 module index.
+
+The build cost report estimates where Verilator elaboration time goes: each
+module costs its lines plus weighted always blocks and generate loops, times
+the number of its instances below the top module. The instances of library
+and interface modules are charged to the subsystem instantiating them.
+"""
 
 from __future__ import annotations
 
@@ -8,9 +14,10 @@ import csv
 import json
 import re
 import subprocess
+import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Set
 
 
 SUBSYSTEM_ORDER = [
@@ -28,6 +35,12 @@ SUBSYSTEM_ORDER = [
     "other",
 ]
 
+# Heuristic weights of the build cost model, in lines
+ALWAYS_WEIGHT = 8.0
+GENERATE_WEIGHT = 16.0
+# Subsystems whose modules are charged to the subsystem instantiating them
+SHARED_SUBSYSTEMS = ("libs", "interfaces")
+
 TOP_CANDIDATE_RE = re.compile(
     r"^(Vortex(_axi)?|VX_(cluster|socket|core|core_top|graphics|.*_top|.*_unit|.*_wrap|.*_afu))$"
 )
@@ -42,6 +55,14 @@ class ModuleRecord:
     parameters: List[str]
     instantiated_by: List[str]
     subsystem: str
+    # size metrics, None when the index predates them
+    lines: Optional[int] = None
+    always_blocks: Optional[int] = None
+    generate_loops: Optional[int] = None
+    instantiates: Optional[Dict[str, int]] = None
+
+    def unit_cost(self, always_weight: float, generate_weight: float) -> float:
+        return self.lines + always_weight * self.always_blocks + generate_weight * self.generate_loops
 
 
 def run_cmd(args: List[str], cwd: Path) -> str:
@@ -87,6 +108,10 @@ def load_records(index_json: Path) -> List[ModuleRecord]:
             parameters=list(mod.get("parameters", [])),
             instantiated_by=list(mod.get("instantiated_by", [])),
             subsystem=classify_subsystem(file_path),
+            lines=mod.get("lines"),
+            always_blocks=mod.get("always_blocks"),
+            generate_loops=mod.get("generate_loops"),
+            instantiates=mod.get("instantiates"),
         )
         records.append(rec)
     return sorted(records, key=lambda r: (r.subsystem, r.module_name, r.file_path, r.line))
@@ -105,6 +130,177 @@ def format_list(values: Iterable[str], default: str = "-") -> str:
     return ", ".join(items) if items else default
 
 
+def modules_by_name(records: List[ModuleRecord], always_weight: float, generate_weight: float) -> Dict[str, ModuleRecord]:
+    # Of the declarations sharing a name (ifdef variants), keep the costliest.
+    by_name: Dict[str, ModuleRecord] = {}
+    for rec in records:
+        prev = by_name.get(rec.module_name)
+        if prev is None or rec.unit_cost(always_weight, generate_weight) > prev.unit_cost(always_weight, generate_weight):
+            by_name[rec.module_name] = rec
+    return by_name
+
+
+def instance_counts(
+    by_name: Dict[str, ModuleRecord], tops: List[str], allowed: Optional[Set[str]] = None
+) -> Dict[str, Dict[str, int]]:
+    """Instances of each module below tops (restricted to allowed) by owning
+    subsystem, multiplying the instance counts of each level.
+
+    Every instantiation statement counts, including alternative generate
+    branches, so the counts are upper bounds. Generate loop trip counts depend
+    on parameters and are ignored, recursive instantiations are counted once.
+    """
+
+    def children_of(name: str) -> List[str]:
+        return sorted(c for c in by_name[name].instantiates or {} if c in by_name and (allowed is None or c in allowed))
+
+    # iterative post-order from the tops, reversed into a topological order
+    order: List[str] = []
+    visited: Set[str] = set()
+    for top in tops:
+        if top not in by_name or (allowed is not None and top not in allowed) or top in visited:
+            continue
+        visited.add(top)
+        stack = [(top, iter(children_of(top)))]
+        while stack:
+            name, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                order.append(name)
+            elif child not in visited:
+                visited.add(child)
+                stack.append((child, iter(children_of(child))))
+    order.reverse()
+
+    position = {name: i for i, name in enumerate(order)}
+    counts: Dict[str, Dict[str, int]] = {name: {} for name in order}
+    for top in tops:
+        if top in counts:
+            counts[top][by_name[top].subsystem] = 1
+    for name in order:
+        for child in children_of(name):
+            if position[child] <= position[name]:
+                continue
+            multiplier = (by_name[name].instantiates or {})[child]
+            subsystem = by_name[child].subsystem
+            for owner, count in counts[name].items():
+                key = owner if subsystem in SHARED_SUBSYSTEMS else subsystem
+                counts[child][key] = counts[child].get(key, 0) + count * multiplier
+    return counts
+
+
+def subsystem_costs(
+    by_name: Dict[str, ModuleRecord], counts: Dict[str, Dict[str, int]], always_weight: float, generate_weight: float
+) -> Dict[str, float]:
+    costs: Dict[str, float] = {}
+    for name, owners in counts.items():
+        unit_cost = by_name[name].unit_cost(always_weight, generate_weight)
+        for owner, count in owners.items():
+            costs[owner] = costs.get(owner, 0.0) + count * unit_cost
+    return costs
+
+
+def load_elaborated(elaborated_json: Path) -> List[Dict[str, object]]:
+    payload = json.loads(elaborated_json.read_text(encoding="utf-8"))
+    return list(payload.get("configs", []))
+
+
+def write_cost_md(
+    records: List[ModuleRecord],
+    md_out: Path,
+    repo_root: Path,
+    index_json: Path,
+    tops: List[str],
+    elaborated: List[Dict[str, object]],
+    always_weight: float,
+    generate_weight: float,
+) -> None:
+    source = display_path(index_json, repo_root)
+    missing = [
+        rec.module_name
+        for rec in records
+        if None in (rec.lines, rec.always_blocks, rec.generate_loops, rec.instantiates)
+    ]
+    if missing:
+        raise ValueError(
+            f"{source} lacks size metrics ({len(missing)} modules, e.g. {missing[0]}); "
+            "rerun scripts/rtl_inventory.py to regenerate it"
+        )
+
+    md_out.parent.mkdir(parents=True, exist_ok=True)
+    sha = run_cmd(["git", "rev-parse", "HEAD"], repo_root)
+    by_name = modules_by_name(records, always_weight, generate_weight)
+    counts = instance_counts(by_name, tops)
+    costs = subsystem_costs(by_name, counts, always_weight, generate_weight)
+    total = sum(costs.values()) or 1.0
+
+    def module_cost(name: str, owner: str) -> float:
+        return counts[name].get(owner, 0) * by_name[name].unit_cost(always_weight, generate_weight)
+
+    lines: List[str] = []
+    lines.append("# Skybox RTL estimated Verilator build cost")
+    lines.append("")
+    lines.append(f"- Skybox git SHA: `{sha}`")
+    lines.append(f"- Source index: `{source}`")
+    lines.append(f"- Top modules: `{', '.join(tops)}`")
+    lines.append(
+        f"- Cost model: instances x (lines + {always_weight:g} x always blocks + {generate_weight:g} x generate loops), "
+        "in lines; libs and interfaces modules are charged to the subsystem instantiating them"
+    )
+    lines.append(
+        "- Instance counts are upper bounds: every instantiation statement counts, including alternative ifdef "
+        "and generate branches; generate loop trip counts are ignored"
+    )
+    lines.append("")
+
+    lines.append("## Subsystems by estimated cost")
+    lines.append("")
+    lines.append("| Subsystem | Est. cost | Share | Own modules cost | Modules | Instances | Costliest modules |")
+    lines.append("|---|---:|---:|---:|---:|---:|---|")
+    for subsystem in sorted(costs, key=lambda k: -costs[k]):
+        names = sorted((name for name in counts if subsystem in counts[name]), key=lambda name: -module_cost(name, subsystem))
+        own_cost = sum(module_cost(name, subsystem) for name in names if by_name[name].subsystem == subsystem)
+        preview = ", ".join(f"{name} x{counts[name][subsystem]}" for name in names[:3])
+        lines.append(
+            f"| `{subsystem}` | {costs[subsystem]:.0f} | {100.0 * costs[subsystem] / total:.1f}% | {own_cost:.0f} | {len(names)} | "
+            f"{sum(counts[name][subsystem] for name in names)} | {escape_md(preview)} |"
+        )
+    lines.append("")
+
+    if elaborated:
+        # Configurations elaborating the same module set only differ by their
+        # parameters, the module set column groups them.
+        module_sets: Dict[tuple, int] = {}
+        base_cost = None
+        lines.append("## Configurations by estimated cost")
+        lines.append("")
+        lines.append("| CONFIGS | Modules | Est. cost | vs first | Module set | Costliest subsystems |")
+        lines.append("|---|---:|---:|---:|---:|---|")
+        for config in elaborated:
+            allowed = set(config.get("modules", []))
+            config_costs = subsystem_costs(by_name, instance_counts(by_name, list(config.get("top", tops)), allowed), always_weight, generate_weight)
+            config_total = sum(config_costs.values())
+            if base_cost is None:
+                base_cost = config_total
+            module_set = module_sets.setdefault(tuple(sorted(allowed)), len(module_sets) + 1)
+            ranked = ", ".join(f"{k} {config_costs[k]:.0f}" for k in sorted(config_costs, key=lambda k: -config_costs[k])[:3])
+            lines.append(
+                f"| `{escape_md(str(config.get('configs', '')) or '-')}` | {len(allowed)} | {config_total:.0f} | "
+                f"{config_total - base_cost:+.0f} | {module_set} | {ranked} |"
+            )
+        lines.append("")
+
+    md_out.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def display_path(path: Path, repo_root: Path) -> str:
+    try:
+        return str(path.relative_to(repo_root))
+    except ValueError:
+        return str(path)
+
+
 def write_csv(records: List[ModuleRecord], csv_out: Path) -> None:
     csv_out.parent.mkdir(parents=True, exist_ok=True)
     with csv_out.open("w", newline="", encoding="utf-8") as f:
@@ -119,6 +315,9 @@ def write_csv(records: List[ModuleRecord], csv_out: Path) -> None:
                 "parameters",
                 "instantiated_by",
                 "top_candidate",
+                "lines",
+                "always_blocks",
+                "generate_loops",
             ],
         )
         writer.writeheader()
@@ -133,6 +332,9 @@ def write_csv(records: List[ModuleRecord], csv_out: Path) -> None:
                     "parameters": "|".join(rec.parameters),
                     "instantiated_by": "|".join(rec.instantiated_by),
                     "top_candidate": "1" if is_top_candidate(rec) else "0",
+                    "lines": rec.lines,
+                    "always_blocks": rec.always_blocks,
+                    "generate_loops": rec.generate_loops,
                 }
             )
 
@@ -211,6 +413,18 @@ def parse_args() -> argparse.Namespace:
         default="docs/skybox_rtl_modules_by_subsystem.csv",
         help="CSV output",
     )
+    parser.add_argument(
+        "--cost-md-out",
+        default="docs/skybox_rtl_build_cost.md",
+        help="Estimated build cost report output",
+    )
+    parser.add_argument(
+        "--elaborated-json",
+        help="Modules elaborated per configuration, from scripts/rtl_inventory.py --elaborate, to rank the configurations",
+    )
+    parser.add_argument("--top", action="append", help="Top module of the cost report (default: Vortex, may be repeated)")
+    parser.add_argument("--always-weight", type=float, default=ALWAYS_WEIGHT, help="Cost of an always block, in lines")
+    parser.add_argument("--generate-weight", type=float, default=GENERATE_WEIGHT, help="Cost of a generate loop, in lines")
     return parser.parse_args()
 
 
@@ -220,14 +434,22 @@ def main() -> int:
     index_json = (repo_root / args.index_json).resolve()
     md_out = (repo_root / args.md_out).resolve()
     csv_out = (repo_root / args.csv_out).resolve()
+    cost_md_out = (repo_root / args.cost_md_out).resolve()
+    elaborated = load_elaborated((repo_root / args.elaborated_json).resolve()) if args.elaborated_json else []
 
     records = load_records(index_json)
+    try:
+        write_cost_md(records, cost_md_out, repo_root, index_json, args.top or ["Vortex"], elaborated, args.always_weight, args.generate_weight)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
     write_csv(records, csv_out)
     write_md(records, md_out, repo_root)
 
     print(f"records={len(records)}")
     print(f"csv={csv_out}")
     print(f"md={md_out}")
+    print(f"cost_md={cost_md_out}")
     return 0
 
 
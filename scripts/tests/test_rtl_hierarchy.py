@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Regression tests of scripts/rtl_hierarchy.py: the closures and depths of the
+index against plain graph searches, on instantiation graphs with cycles and
+on the repository RTL.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Set
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = SCRIPTS_DIR.parent
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+import rtl_hierarchy
+import rtl_inventory
+
+# child -> parents: b and c instantiate each other, d instantiates itself
+CYCLIC_GRAPH = {
+    "a": {"f"},
+    "b": {"a", "c"},
+    "c": {"b"},
+    "d": {"c", "d", "f"},
+    "e": set(),
+    "f": set(),
+}
+
+RECURSIVE_SV = """\
+module tree_node #(parameter LEVEL = 0) (input wire clk);
+    if (LEVEL > 0) begin : g_children
+        tree_node #(.LEVEL(LEVEL - 1)) child_l (.clk(clk));
+        tree_node #(.LEVEL(LEVEL - 1)) child_r (.clk(clk));
+    end
+    tree_leaf leaf (.clk(clk));
+endmodule
+
+module tree_leaf (input wire clk);
+endmodule
+
+module tree_top (input wire clk);
+    tree_node #(.LEVEL(2)) root (.clk(clk));
+endmodule
+"""
+
+
+def reachable(edges: Dict[str, Set[str]], name: str) -> Set[str]:
+    seen: Set[str] = set()
+    queue = deque(edges.get(name, ()))
+    while queue:
+        node = queue.popleft()
+        if node not in seen:
+            seen.add(node)
+            queue.extend(edges.get(node, ()))
+    return seen
+
+
+def check_index(test: unittest.TestCase, instantiations: Dict[str, Set[str]], index: rtl_hierarchy.HierarchyIndex) -> None:
+    children: Dict[str, Set[str]] = {}
+    for child, parents in instantiations.items():
+        for parent in parents:
+            children.setdefault(parent, set()).add(child)
+    for name in index.names:
+        module = index.module_id(name)
+        test.assertEqual(set(index.modules_of(index.descendants[module])), reachable(children, name), name)
+        test.assertEqual(set(index.modules_of(index.ancestors[module])), reachable(instantiations, name), name)
+        test.assertEqual({index.names[i] for i in index.direct_children(module)}, children.get(name, set()), name)
+        test.assertEqual({index.names[i] for i in index.direct_parents(module)}, instantiations.get(name, set()), name)
+
+
+def check_path(test: unittest.TestCase, index: rtl_hierarchy.HierarchyIndex, path: List[int], src: int, dst: int) -> None:
+    test.assertEqual((path[0], path[-1]), (src, dst))
+    for parent, child in zip(path, path[1:]):
+        test.assertIn(child, index.direct_children(parent))
+
+
+class RtlHierarchyTest(unittest.TestCase):
+    def test_cyclic_graph(self) -> None:
+        index = rtl_hierarchy.build_index(CYCLIC_GRAPH)
+        check_index(self, CYCLIC_GRAPH, index)
+        # the longest chain from a root, a cycle counting as one level
+        self.assertEqual(dict(zip(index.names, index.depth)), {"a": 1, "b": 2, "c": 2, "d": 3, "e": 0, "f": 0})
+
+    def test_paths(self) -> None:
+        index = rtl_hierarchy.build_index(CYCLIC_GRAPH)
+        paths = {
+            ("f", "d"): ["f", "d"],
+            ("a", "d"): ["a", "b", "c", "d"],
+            ("b", "b"): ["b", "c", "b"],
+            ("d", "d"): ["d", "d"],
+            ("e", "e"): ["e"],
+            ("d", "a"): None,
+            ("e", "a"): None,
+        }
+        for (src, dst), expected in paths.items():
+            with self.subTest(src=src, dst=dst):
+                found = rtl_hierarchy.find_path(index, index.module_id(src), index.module_id(dst))
+                self.assertEqual(None if found is None else [index.names[i] for i in found], expected)
+
+    def test_repository_rtl(self) -> None:
+        files = rtl_inventory.collect_rtl_files(REPO_ROOT, REPO_ROOT / "hw/rtl")
+        scans = rtl_inventory.scan_files(files, REPO_ROOT, 1)
+        _, by_name = rtl_inventory.parse_modules(scans)
+        instantiations = rtl_inventory.collect_instantiations(scans, set(by_name.keys()))
+        index = rtl_hierarchy.build_index(instantiations)
+        check_index(self, instantiations, index)
+        for src in range(len(index.names)):
+            for dst in range(len(index.names)):
+                if (index.descendants[src] >> dst) & 1:
+                    check_path(self, index, rtl_hierarchy.find_path(index, src, dst), src, dst)
+
+    def test_index_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            (root / "hw/rtl").mkdir(parents=True)
+            (root / "hw/rtl/tree.sv").write_text(RECURSIVE_SV, encoding="utf-8")
+
+            def run(*args: str) -> List[str]:
+                command = [sys.executable, str(SCRIPTS_DIR / "rtl_hierarchy.py"), "--repo-root", str(root), "-x", "tree.idx", *args]
+                return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode().splitlines()
+
+            self.assertEqual(run("build")[:2], ["modules=3", "instantiations=3"])
+            index = rtl_hierarchy.read_index(root / "tree.idx")
+            instantiations = {"tree_node": {"tree_node", "tree_top"}, "tree_leaf": {"tree_node"}, "tree_top": set()}
+            check_index(self, instantiations, index)
+            self.assertEqual(run("below", "tree_top"), ["tree_leaf", "tree_node"])
+            self.assertEqual(run("above", "--tops", "tree_leaf"), ["tree_top"])
+            self.assertEqual(run("path", "tree_top", "tree_leaf"), ["tree_top -> tree_node -> tree_leaf"])
+            self.assertEqual(run("roots"), ["tree_top"])
+            self.assertEqual(run("info", "tree_node"), ["module,depth,fan_in,fan_out,descendants,ancestors", "tree_node,1,2,2,2,2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Regression tests of scripts/rtl_inventory.py, on a small synthetic RTL tree
+and on the repository RTL.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+REPO_ROOT = SCRIPTS_DIR.parent
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+import rtl_inventory
+
+CORE_SV = """\
+`include "defs.vh"
+
+module leaf #(
+    parameter W = 8
+) (
+    input wire clk
+);
+    always @(posedge clk) begin
+    end
+endmodule
+
+`ifdef USE_MID
+module mid #(parameter N = 2) (
+    input wire clk
+);
+    for (genvar i = 0; i < N; ++i) begin : g_leaf
+        leaf #(.W(4)) leaf_i (.clk(clk));
+    end
+endmodule
+`endif
+
+module top (
+    input wire clk
+);
+    mid #(
+        .N (4)
+    ) mid_i (
+        .clk (clk)
+    );
+    leaf leaf_a (.clk(clk));
+    leaf leaf_b (.clk(clk));
+endmodule
+"""
+
+
+OTHER_SV = """\
+module wrapper (
+    input wire clk
+);
+    top top_i (.clk(clk));
+endmodule
+"""
+
+
+# elaboration: defs.vh picks USE_A, USE_B or USE_C from the configuration and
+# includes more.vh, which derives USE_B2 and may undefine USE_C again
+ELABORATE_FILES = {
+    "include/defs.vh": """\
+`ifndef DEFS_VH
+`define DEFS_VH
+`ifdef EXT_A_ENABLE
+`define USE_A
+`elsif EXT_B_ENABLE
+`define USE_B
+`else
+`define USE_C
+`endif
+`include "more.vh"
+`endif
+""",
+    "include/more.vh": """\
+`ifdef USE_B
+`define USE_B2
+`endif
+`ifdef NO_C
+`undef USE_C
+`endif
+""",
+    "top.sv": """\
+`include "defs.vh"
+module top (input wire clk);
+`ifdef USE_A
+    unit_a a (.clk(clk));
+`elsif USE_B
+    unit_b b (.clk(clk));
+`ifdef USE_B2
+    unit_b2 b2 (.clk(clk));
+`endif
+`else
+    unit_c c (.clk(clk));
+`endif
+`ifndef USE_C
+    unit_d d (.clk(clk));
+`endif
+endmodule
+""",
+    "units.sv": """\
+module unit_a (input wire clk);
+    leaf l (.clk(clk));
+endmodule
+module unit_b (input wire clk);
+endmodule
+module unit_b2 (input wire clk);
+endmodule
+module unit_c (input wire clk);
+endmodule
+module unit_d (input wire clk);
+endmodule
+module leaf (input wire clk);
+endmodule
+""",
+}
+
+
+def write_tree(root: Path, files: Dict[str, str]) -> None:
+    for name, text in files.items():
+        path = root / "hw/rtl" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def run_inventory(root: Path, *args: str) -> str:
+    command = [sys.executable, str(SCRIPTS_DIR / "rtl_inventory.py"), "--repo-root", str(root), *args]
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode()
+
+
+class RtlInventoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name)
+
+    def inventory(self, *args: str) -> Dict[str, object]:
+        run_inventory(self.root, "--csv-out", "index.csv", "--json-out", "index.json", *args)
+        return json.loads((self.root / "index.json").read_text(encoding="utf-8"))
+
+    def test_scan(self) -> None:
+        write_tree(self.root, {"core.sv": CORE_SV})
+        modules = {module.pop("module_name"): module for module in self.inventory("-j", "1")["modules"]}
+        common = {"file_path": "hw/rtl/core.sv", "language": "sv"}
+        self.assertEqual(
+            modules,
+            {
+                "leaf": dict(common, line=3, guarded_by_ifdef="", parameters=["W"], instantiated_by=["mid", "top"],
+                             lines=8, always_blocks=1, generate_loops=0, instantiates={}),
+                "mid": dict(common, line=13, guarded_by_ifdef="USE_MID", parameters=["N"], instantiated_by=["top"],
+                            lines=7, always_blocks=0, generate_loops=1, instantiates={"leaf": 1}),
+                "top": dict(common, line=22, guarded_by_ifdef="", parameters=[], instantiated_by=[],
+                            lines=11, always_blocks=0, generate_loops=0, instantiates={"leaf": 2, "mid": 1}),
+            },
+        )
+
+    def test_cache(self) -> None:
+        # each cached run matches a full scan, only rescanning the changed files
+        write_tree(self.root, {"core.sv": CORE_SV, "other.sv": OTHER_SV})
+        rtl_dir = self.root / "hw/rtl"
+
+        def check(scanned: int) -> None:
+            expected = self.inventory("-j", "1")
+            output = run_inventory(self.root, "--csv-out", "index.csv", "--json-out", "index.json", "-j", "1", "--cache", "scan.cache")
+            self.assertIn(f"scanned_files={scanned}\n", output)
+            self.assertEqual(json.loads((self.root / "index.json").read_text(encoding="utf-8")), expected)
+
+        with self.subTest(run="cold"):
+            check(2)
+        with self.subTest(run="warm"):
+            check(0)
+        with self.subTest(run="touched"):
+            stat = (rtl_dir / "other.sv").stat()
+            os.utime(rtl_dir / "other.sv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            check(0)
+            entries = rtl_inventory.load_cache(self.root / "scan.cache")
+            self.assertEqual(entries["hw/rtl/other.sv"]["mtime_ns"], stat.st_mtime_ns + 10**9)
+        with self.subTest(run="edited"):
+            (rtl_dir / "other.sv").write_text(OTHER_SV.replace("wrapper", "shell"), encoding="utf-8")
+            check(1)
+        with self.subTest(run="deleted"):
+            (rtl_dir / "other.sv").unlink()
+            check(0)
+            self.assertEqual(list(rtl_inventory.load_cache(self.root / "scan.cache")), ["hw/rtl/core.sv"])
+        with self.subTest(run="version"):
+            payload = json.loads((self.root / "scan.cache").read_text(encoding="utf-8"))
+            payload["version"] -= 1
+            (self.root / "scan.cache").write_text(json.dumps(payload), encoding="utf-8")
+            check(1)
+
+    def test_elaborate(self) -> None:
+        write_tree(self.root, ELABORATE_FILES)
+        expected = {
+            "": ["top", "unit_c"],
+            "-DEXT_A_ENABLE": ["leaf", "top", "unit_a", "unit_d"],
+            "-DEXT_B_ENABLE": ["top", "unit_b", "unit_b2", "unit_d"],
+            "-DEXT_A_ENABLE -DEXT_B_ENABLE": ["leaf", "top", "unit_a", "unit_d"],
+            "-DNO_C -DNUM_CORES=2": ["top", "unit_c", "unit_d"],
+        }
+        args = [f"--elaborate={configs}" for configs in expected]
+        output = run_inventory(self.root, "--top", "top", "--base-configs", "", "--elaborated-out", "elaborated.json", *args)
+        self.assertIn("scanned_files=4\n", output)
+        results = json.loads((self.root / "elaborated.json").read_text(encoding="utf-8"))
+        self.assertEqual(results["configs_total"], len(expected))
+        self.assertEqual({result["configs"]: result["modules"] for result in results["configs"]}, expected)
+        self.assertFalse((self.root / "index.json").exists())
+
+    def test_parallel_scan(self) -> None:
+        files = rtl_inventory.collect_rtl_files(REPO_ROOT, REPO_ROOT / "hw/rtl")
+        self.assertEqual(rtl_inventory.scan_files(files, REPO_ROOT, 2), rtl_inventory.scan_files(files, REPO_ROOT, 1))
+
+    def test_docs_index_current(self) -> None:
+        # the committed index is regenerated with each scanner change
+        run_inventory(REPO_ROOT, "-j", "1", "--csv-out", str(self.root / "index.csv"), "--json-out", str(self.root / "index.json"))
+        for name in ("index.csv", "index.json"):
+            with self.subTest(name=name):
+                expected = (REPO_ROOT / "docs" / f"skybox_rtl_modules_{name}").read_bytes()
+                self.assertEqual((self.root / name).read_bytes(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Regression tests of the build cost report of scripts/rtl_inventory_report.py,
+on a small synthetic module index with hand-computed costs.
+"""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, List
+from unittest import mock
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+import rtl_inventory_report
+
+# unit costs with the default weights: Vortex 10, VX_core 20 + 8 + 16 = 44,
+# VX_cache 30 + 2 x 8 = 46 (its smaller ifdef variant is ignored), VX_fifo
+# 5 + 8 = 13; VX_tex is not instantiated
+MODULES = [
+    ("Vortex", "hw/rtl/Vortex.sv", 10, 0, 0, {"VX_core": 2, "VX_fifo": 1}),
+    ("VX_core", "hw/rtl/core/VX_core.sv", 20, 1, 1, {"VX_cache": 1, "VX_fifo": 3}),
+    ("VX_cache", "hw/rtl/cache/VX_cache.sv", 30, 2, 0, {"VX_fifo": 2}),
+    ("VX_cache", "hw/rtl/cache/VX_cache_lite.sv", 4, 0, 0, {}),
+    ("VX_fifo", "hw/rtl/libs/VX_fifo.sv", 5, 1, 0, {}),
+    ("VX_tex", "hw/rtl/tex/VX_tex.sv", 50, 0, 0, {"VX_fifo": 1}),
+]
+
+
+def write_index(path: Path, with_metrics: bool = True) -> None:
+    modules: List[Dict[str, object]] = []
+    for name, file_path, lines, always_blocks, generate_loops, instantiates in MODULES:
+        module: Dict[str, object] = {"module_name": name, "file_path": file_path, "line": 1, "parameters": [], "instantiated_by": []}
+        if with_metrics or name != "VX_fifo":
+            module.update(lines=lines, always_blocks=always_blocks, generate_loops=generate_loops, instantiates=instantiates)
+        modules.append(module)
+    path.write_text(json.dumps({"modules": modules}), encoding="utf-8")
+
+
+class RtlInventoryReportTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = Path(tmp_dir.name)
+
+    def test_costs(self) -> None:
+        write_index(self.root / "index.json")
+        records = rtl_inventory_report.load_records(self.root / "index.json")
+        weights = (rtl_inventory_report.ALWAYS_WEIGHT, rtl_inventory_report.GENERATE_WEIGHT)
+        by_name = rtl_inventory_report.modules_by_name(records, *weights)
+        self.assertEqual(by_name["VX_cache"].file_path, "hw/rtl/cache/VX_cache.sv")
+
+        # VX_fifo is charged to its owners: 1 from Vortex, 2 x 3 from VX_core
+        # and 2 x 2 from VX_cache
+        counts = rtl_inventory_report.instance_counts(by_name, ["Vortex"])
+        self.assertEqual(
+            counts,
+            {"Vortex": {"top": 1}, "VX_core": {"core": 2}, "VX_cache": {"cache": 2}, "VX_fifo": {"top": 1, "core": 6, "cache": 4}},
+        )
+        self.assertEqual(rtl_inventory_report.subsystem_costs(by_name, counts, *weights), {"top": 23, "core": 166, "cache": 144})
+
+        allowed = {"Vortex", "VX_core", "VX_fifo"}
+        counts = rtl_inventory_report.instance_counts(by_name, ["Vortex"], allowed)
+        self.assertEqual(counts, {"Vortex": {"top": 1}, "VX_core": {"core": 2}, "VX_fifo": {"top": 1, "core": 6}})
+        self.assertEqual(rtl_inventory_report.subsystem_costs(by_name, counts, *weights), {"top": 23, "core": 166})
+
+    def test_cost_report(self) -> None:
+        index_json = self.root / "docs/index.json"
+        index_json.parent.mkdir()
+        write_index(index_json)
+        elaborated = [
+            {"configs": "", "modules": [name for name, *_ in MODULES]},
+            {"configs": "-DNO_CACHE", "modules": ["Vortex", "VX_core", "VX_fifo"]},
+        ]
+        md_out = self.root / "docs/cost.md"
+        records = rtl_inventory_report.load_records(index_json)
+        with mock.patch.object(rtl_inventory_report, "run_cmd", return_value="0" * 40):
+            rtl_inventory_report.write_cost_md(records, md_out, self.root, index_json, ["Vortex"], elaborated, 8.0, 16.0)
+        lines = md_out.read_text(encoding="utf-8").splitlines()
+        self.assertIn("- Source index: `docs/index.json`", lines)
+        subsystems = lines.index("| Subsystem | Est. cost | Share | Own modules cost | Modules | Instances | Costliest modules |")
+        self.assertEqual(
+            lines[subsystems + 2 : subsystems + 5],
+            [
+                "| `core` | 166 | 49.8% | 88 | 2 | 8 | VX_core x2, VX_fifo x6 |",
+                "| `cache` | 144 | 43.2% | 92 | 2 | 6 | VX_cache x2, VX_fifo x4 |",
+                "| `top` | 23 | 6.9% | 10 | 2 | 2 | VX_fifo x1, Vortex x1 |",
+            ],
+        )
+        configs = lines.index("| CONFIGS | Modules | Est. cost | vs first | Module set | Costliest subsystems |")
+        self.assertEqual(
+            lines[configs + 2 : configs + 4],
+            [
+                "| `-` | 5 | 333 | +0 | 1 | core 166, cache 144, top 23 |",
+                "| `-DNO_CACHE` | 3 | 189 | -144 | 2 | core 166, top 23 |",
+            ],
+        )
+
+    def test_missing_metrics(self) -> None:
+        # an index predating the size metrics is rejected, nothing is written
+        write_index(self.root / "index.json", with_metrics=False)
+        records = rtl_inventory_report.load_records(self.root / "index.json")
+        with self.assertRaisesRegex(ValueError, r"^index\.json lacks size metrics \(1 modules, e\.g\. VX_fifo\)"):
+            rtl_inventory_report.write_cost_md(records, self.root / "cost.md", self.root, self.root / "index.json", ["Vortex"], [], 8.0, 16.0)
+
+        command = [sys.executable, str(SCRIPTS_DIR / "rtl_inventory_report.py"), "--repo-root", str(self.root), "--index-json", "index.json",
+                   "--md-out", "out.md", "--csv-out", "out.csv", "--cost-md-out", "cost.md"]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(result.returncode, 1)
+        self.assertTrue(result.stderr.decode().startswith("error: index.json lacks size metrics"))
+        self.assertEqual(sorted(path.name for path in self.root.iterdir()), ["index.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()